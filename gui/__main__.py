@@ -1,16 +1,80 @@
+from time import perf_counter
+TIME_START = perf_counter()
+
 import pygame
+import argparse
+import cProfile
 from pathlib import Path
-from gui.game import Game
 from gui.timer import Timer
-from gui import suggester
+from gui import suggester, metrics, capture
+from gui.journal import DEFAULT_DIR
 
 DISPLAY_SIZE = (960,720)
 MAX_FPS = 30
 FRAME_PERIOD = 1.0 / MAX_FPS
 
 def main():
-    # Initialize word suggester first
-    suggester.init()
+    parser = argparse.ArgumentParser(prog="python -m gui", description="Crossword maker")
+    parser.add_argument("--metrics", nargs="?", const="crossword-metrics.json", metavar="PATH",
+                        help="record latency metrics and write them as JSON to PATH on exit")
+    parser.add_argument("--autosave", default=str(DEFAULT_DIR), metavar="DIR",
+                        help="directory for the autosave journal (default: %(default)s)")
+    parser.add_argument("--no-autosave", action="store_true", help="disable autosave")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="log every suggestion request to PATH for `python -m gui.bench.replay` "
+                             "(gzip-compressed if PATH ends in .gz)")
+    parser.add_argument("--profile", nargs="?", const="crossword.prof", metavar="PATH",
+                        help="run the session under cProfile and write the profile to PATH")
+    parser.add_argument("--service", nargs="?", const="", metavar="ADDR",
+                        help="get suggestions from a running `python -m gui.service` at ADDR "
+                             "(a Unix socket path or host:port; default: the service's socket)")
+    parser.add_argument("--dict", action="append", metavar="[NAME=]PATH",
+                        help="dictionary to load; repeat to load several (default: american.txt)")
+    parser.add_argument("--hedge-after", type=float, metavar="SECONDS",
+                        help="when suggesting through a subprocess or service, also send requests still "
+                             "unanswered after SECONDS to a second one")
+    parser.add_argument("--collab", metavar="ADDR",
+                        help="co-edit the grid shared by a `python -m gui.collab` server at ADDR "
+                             "(host:port or a Unix socket path)")
+    parser.add_argument("--use", metavar="STACK",
+                        help="dictionaries to suggest from, e.g. \"+american +house -blocked\"")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+    if args.capture:
+        capture.start(args.capture)
+
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        run(None if args.no_autosave else args.autosave, args.service, args.dict,
+            args.use.split() if args.use else [], args.hedge_after, args.collab)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile}")
+        if args.metrics:
+            metrics.dump(args.metrics)
+            print(f"Metrics written to {args.metrics}")
+        if args.capture:
+            print(f"Captured {capture.stop()} requests to {args.capture}")
+
+def report_startup(name: str, time: float):
+    ms = (time - TIME_START) * 1000
+    metrics.record(f"startup.{name}_ms", ms)
+    print(f"Startup: {name.replace('_', ' ')} after {ms:.0f} ms")
+
+def run(autosave_dir: str, service: str = None, dictionaries: list[str] = None, stack: list[str] = None,
+        hedge_after: float = None, collab_address: str = None):
+    # Start loading the dictionary first. This returns immediately, and the
+    # suggester reports when it is ready.
+    suggester.init(service, dictionaries, hedge_after=hedge_after)
+    suggester.set_stack(stack or [])
 
     # Load resources
     this_dir = Path(__file__).parent
@@ -22,30 +86,62 @@ def main():
     pygame.display.set_icon(logo)
     pygame.display.set_caption("Crosswords")
     screen = pygame.display.set_mode(DISPLAY_SIZE)
-    
-    # Game initialization
-    game = Game(DISPLAY_SIZE, screen)
+    pygame.display.flip()
+    report_startup("first_frame", perf_counter())
+
+    # Game initialization. The game pulls in NumPy, so it is imported only
+    # once the window is up.
+    from gui.game import Game
+    from gui.journal import Journal
+    from gui.collab import CollabClient
+    collab_client = None
+    if collab_address:
+        try:
+            collab_client = CollabClient.connect(collab_address)
+            print(f"Co-editing the grid shared at {collab_address}")
+        except OSError as e:
+            print(f"[WARNING] Could not connect to the collaboration server at {collab_address}\n -> Reason: {e}")
+    game = Game(DISPLAY_SIZE, screen, journal=Journal(autosave_dir), collab_client=collab_client)
     timer = Timer(FRAME_PERIOD)
+    ready_reported = False
+    first_result_reported = False
 
     # Main loop
     running = True
     init_time = pygame.time.get_ticks()
     iters = 0
+    time_last_frame = perf_counter()
     while running:
         # Pause to keep FPS below limit
         timer.wait()
         iters += 1
+
+        time_frame = perf_counter()
+        metrics.record("game.frame_ms", (time_frame - time_last_frame) * 1000)
+        time_last_frame = time_frame
         
         # Should I quit?
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            else:
+                game.recv_event(event)
         
         game.tick()
         pygame.display.flip()
 
+        if not first_result_reported:
+            time_ready, time_first_result = suggester.get_startup_times()
+            if time_ready is not None and not ready_reported:
+                report_startup("suggester_ready", time_ready)
+                ready_reported = True
+            if time_first_result is not None:
+                report_startup("first_suggestion", time_first_result)
+                first_result_reported = True
+
     fps = iters / ((pygame.time.get_ticks() - init_time) / 1000)
     print(f"Average FPS: {fps:.2f}")
+    game.shutdown()
     suggester.shutdown()
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+"""
+Backtracking autofill for `uint8` grids (see gui.grid_io), using a
+`WordIndex` for candidate lookups.
+"""
+from typing import Union
+
+import numpy
+
+from gui.slots import Slot, extract_slots
+from gui.wordlist import WordIndex
+
+# Candidates tried per slot before backtracking further up
+MAX_CANDIDATES = 64
+
+def autofill(grid: numpy.ndarray, index: WordIndex, max_steps: int = 1000,
+             slots: list[Slot] = None) -> Union[numpy.ndarray, None]:
+    """
+    Fills every blank tile of `grid` so that all slots are distinct words in
+    `index`. Always fills the slot with the fewest candidates next. Gives up
+    after trying `max_steps` words in total. Returns the filled grid, or None
+    if no fill was found; `grid` itself is not modified.
+    """
+    grid = grid.copy()
+    if slots is None:
+        slots = extract_slots(grid)
+    used = set(slot.pattern(grid) for slot in slots if slot.is_complete(grid))
+    steps = [0]
+
+    def fill() -> bool:
+        # Pick the open slot with the fewest candidates
+        best = None
+        best_words = None
+        for slot in slots:
+            pattern = slot.pattern(grid)
+            if "*" not in pattern:
+                continue
+            mask = index.match_mask(pattern)
+            count = int(numpy.count_nonzero(mask))
+            if count == 0:
+                return False
+            if best is None or count < len(best_words):
+                best = slot
+                best_words = index.bucket(slot.length)[mask]
+                if count == 1:
+                    break
+        if best is None:
+            return True
+
+        cells = best.cells(grid)
+        saved = cells.copy()
+        for row in best_words[:MAX_CANDIDATES]:
+            word = row.tobytes().decode("ascii")
+            if word in used:
+                continue
+            steps[0] += 1
+            if steps[0] > max_steps:
+                break
+            cells[:] = row
+            used.add(word)
+            if fill():
+                return True
+            used.discard(word)
+            cells[:] = saved
+        return False
+
+    return grid if fill() else None
@@ -0,0 +1,210 @@
+"""
+Load test and convergence check for the collaboration server.
+
+Starts a gui.collab server on a loopback port and connects many simulated
+clients to it. Each one types seeded random edits at a steady rate, mostly
+into a small shared corner of the grid so that edits to the same tile
+conflict often. Half of the clients join late and start from a snapshot,
+one client loads a new grid while the others type, and at the end every
+client writes to the same tile at once.
+Once every client's edits are acknowledged and every client has caught up
+with the server's sequence number, each client's grid is compared with the
+server's. The process exits with status 1 if any of them differ.
+
+    python -m gui.bench.collab
+    python -m gui.bench.collab --clients 200 --edits 100 --rate 20
+
+Reported are the edits per second the server relayed, the round trip from
+sending an edit to its acknowledgement, and the bytes each client sent per
+edit it made and received per edit made by anyone, snapshots included. The
+clients run in the server's process and event loop, so with hundreds of
+them the figures are bounded by the simulation as much as by the server.
+"""
+import sys
+import json
+import random
+import asyncio
+import argparse
+from time import perf_counter
+
+import numpy
+
+from gui import grid_io
+from gui.collab import (CollabServer, Replica, KIND_EDIT, KIND_ACK, KIND_SNAPSHOT,
+                        RELAY, ACK, SNAPSHOT, UPDATE_EDIT, start_server)
+
+# Share of edits made in the contested corner of the grid
+CONTESTED_SHARE = 0.5
+CONTESTED_SIZE = 3
+CATCH_UP_TIMEOUT = 30.0
+CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ*#"
+
+class SimClient:
+    """A client that applies updates to its own copy of the grid, as the editor does."""
+    def __init__(self, name: str, rng: random.Random):
+        self.name = name
+        self.rng = rng
+        self.replica = Replica()
+        self.grid = None
+        self.sent_at = []
+        self.round_trips = []
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+
+    async def connect(self, address: tuple[str, int]):
+        self.reader, self.writer = await asyncio.open_connection(*address)
+        self.read_task = asyncio.create_task(self.read_main())
+
+    async def read_main(self):
+        acked = 0
+        try:
+            while True:
+                kind = await self.reader.readexactly(1)
+                tiles = b""
+                if kind == KIND_EDIT:
+                    header = RELAY.unpack(kind + await self.reader.readexactly(RELAY.size - 1))
+                    size = RELAY.size
+                elif kind == KIND_ACK:
+                    header = ACK.unpack(kind + await self.reader.readexactly(ACK.size - 1))
+                    self.round_trips.append((perf_counter() - self.sent_at[acked]) * 1000)
+                    acked += 1
+                    size = ACK.size
+                elif kind == KIND_SNAPSHOT:
+                    header = SNAPSHOT.unpack(kind + await self.reader.readexactly(SNAPSHOT.size - 1))
+                    tiles = await self.reader.readexactly(header[2] * header[3])
+                    size = SNAPSHOT.size + len(tiles)
+                else:
+                    raise RuntimeError(f"{self.name} received an unknown message {kind!r}")
+                self.bytes_received += size
+                for update in self.replica.receive(kind, header, tiles):
+                    if update[0] == UPDATE_EDIT:
+                        _, x, y, char = update
+                        self.grid[x, y] = ord(char)
+                    else:
+                        self.grid = update[1].copy()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def edit(self, x: int, y: int, char: str):
+        self.grid[x, y] = ord(char)
+        data = self.replica.edit(x, y, char)
+        self.sent_at.append(perf_counter())
+        self.bytes_sent += len(data)
+        self.writer.write(data)
+
+    def replace_grid(self, grid: numpy.ndarray):
+        self.grid = grid.copy()
+        data = self.replica.replace_grid(grid)
+        self.sent_at.append(perf_counter())
+        self.bytes_sent += len(data)
+        self.writer.write(data)
+
+    async def type_edits(self, edits: int, rate: float):
+        # Wait for the snapshot before typing, as the editor would
+        while self.grid is None:
+            await asyncio.sleep(0.001)
+        width, height = self.grid.shape
+        for _ in range(edits):
+            if self.rng.random() < CONTESTED_SHARE:
+                x, y = self.rng.randrange(CONTESTED_SIZE), self.rng.randrange(CONTESTED_SIZE)
+            else:
+                x, y = self.rng.randrange(width), self.rng.randrange(height)
+            self.edit(x, y, self.rng.choice(CHARS))
+            await asyncio.sleep(self.rng.expovariate(rate))
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        await self.read_task
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+async def run_bench(num_clients: int, edits: int, rate: float, seed: int) -> dict:
+    grid = numpy.full(grid_io.MAX_DIM, grid_io.BLANK, dtype=numpy.uint8)
+    server = CollabServer(grid)
+    listener = await start_server(server, "127.0.0.1:0")
+    address = listener.sockets[0].getsockname()[:2]
+
+    rng = random.Random(seed)
+    clients = [SimClient(f"sim-{i}", random.Random(rng.random())) for i in range(num_clients)]
+    early, late = clients[:(num_clients + 1) // 2], clients[(num_clients + 1) // 2:]
+
+    time_start = perf_counter()
+    await asyncio.gather(*(client.connect(address) for client in early))
+    typing = [asyncio.create_task(client.type_edits(edits, rate)) for client in early]
+    # The rest join once the grid has filled in a little
+    await asyncio.sleep(edits / rate / 2)
+    await asyncio.gather(*(client.connect(address) for client in late))
+    typing += [asyncio.create_task(client.type_edits(edits, rate)) for client in late]
+    # One client loads a grid of letters, as if from a file
+    await asyncio.sleep(edits / rate / 4)
+    loaded = numpy.frombuffer(bytes(rng.choice(CHARS.encode("ascii")) for _ in range(grid.size)),
+                              dtype=numpy.uint8).reshape(grid.shape)
+    early[0].replace_grid(loaded)
+    await asyncio.gather(*typing)
+    # Every client's edit is in flight while the others' arrive
+    for client in clients:
+        client.edit(0, 0, client.rng.choice(CHARS))
+
+    deadline = perf_counter() + CATCH_UP_TIMEOUT
+    while any(client.replica.in_flight or client.replica.seq != server.seq for client in clients):
+        if perf_counter() > deadline:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = perf_counter() - time_start
+
+    expected = server.get_grid()
+    diverged = [client.name for client in clients
+                if client.grid is None or not numpy.array_equal(client.grid, expected)]
+    for client in clients:
+        await client.close()
+    listener.close()
+    await listener.wait_closed()
+
+    round_trips = [ms for client in clients for ms in client.round_trips]
+    total_edits = num_clients * edits
+    return {
+        "clients": num_clients,
+        "edits": total_edits,
+        "seconds": round(elapsed, 3),
+        "edits_per_s": round(server.edits / elapsed, 1),
+        "round_trip_p50_ms": round(percentile(round_trips, 50), 3),
+        "round_trip_p99_ms": round(percentile(round_trips, 99), 3),
+        "sent_bytes_per_edit": round(sum(client.bytes_sent for client in clients) / total_edits, 2),
+        "received_bytes_per_edit": round(sum(client.bytes_received for client in clients)
+                                         / (total_edits * num_clients), 2),
+        "diverged": diverged,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.bench.collab",
+                                     description="Load-test the collaboration server over loopback.")
+    parser.add_argument("--clients", type=int, default=50, help="simulated clients (default: %(default)s)")
+    parser.add_argument("--edits", type=int, default=200, help="edits typed by each client (default: %(default)s)")
+    parser.add_argument("--rate", type=float, default=50.0, help="edits per second per client (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the edits")
+    parser.add_argument("--out", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_bench(args.clients, args.edits, args.rate, args.seed))
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if results["diverged"]:
+        print(f"{len(results['diverged'])} client(s) ended up with a different grid from the server")
+        sys.exit(1)
+    print("Every client converged on the server's grid")
+
+if __name__ == "__main__":
+    main()
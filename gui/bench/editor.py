@@ -0,0 +1,363 @@
+"""
+Headless benchmark harness for the crossword editor.
+
+Runs `Game` under the SDL dummy video driver and replays scripted input
+traces, recording the time spent in each `Game.tick()`, the number of tiles
+redrawn, and the round-trip latency of suggestion requests. Results are
+compared against a committed baseline, and the process exits with status 1
+when any trace regressed.
+
+Most of the noise in sub-millisecond timings is between processes: the
+same code runs up to twice as fast in one interpreter as in the next. So
+each of `--runs` processes runs every trace once to warm up and then
+RUNS_PER_PROCESS times, taking the median, and the best of the processes
+is reported, as `timeit` does. Seven processes make a false alarm at the
+default tolerance rare while catching a 1.5x slowdown nearly always.
+
+    python -m gui.bench.editor                      # all traces in gui/bench/traces
+    python -m gui.bench.editor typing.json --no-suggester
+    python -m gui.bench.editor --update-baseline
+
+Trace files are JSON objects with an optional `load` path (relative to the
+repository root) and a list of `steps`. Each step is an object with one of
+the following keys:
+
+    {"click": [x, y]}           left-click the tile at (x, y)
+    {"rclick": [x, y]}          right-click the tile at (x, y), toggling darks
+    {"type": "WORD"}            type letters into the crossword
+    {"key": "tab"}              press and release a key, by pygame key name
+    {"suggest": true}           click the suggest button
+    {"wait_suggestion": true}   idle until the pending suggestion has arrived
+    {"scroll": n}               scroll the suggestion list by n wheel steps
+    {"idle": n}                 idle for n frames
+    {"repeat": n, "steps": []}  run the nested steps n times
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Callable
+from time import perf_counter, sleep
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from gui import suggester
+from gui.vec import Vec
+from gui.game import Game, REPEATABLE_KEYS, SUG_BTN_MIN, BTN_SIZE, SUG_LIST_MIN
+from gui.game_input import InputHandler, LMB, MMB, RMB
+
+DISPLAY_SIZE = (960, 720)
+FRAME_MS = 33
+SUGGESTION_TIMEOUT = 10.0
+
+BENCH_DIR = Path(__file__).parent
+ROOT_DIR = BENCH_DIR.parent.parent
+TRACES_DIR = BENCH_DIR.joinpath("traces")
+BASELINE_PATH = BENCH_DIR.joinpath("baseline.json")
+
+# Metrics compared against the baseline. Timings may grow by the tolerance
+# before they count as a regression; counts must not grow at all.
+TIMING_METRICS = ("tick_p50_ms", "tick_p95_ms", "suggest_p50_ms")
+COUNT_METRICS = ("redraws",)
+DEFAULT_TOLERANCE = 0.3
+DEFAULT_RUNS = 7
+RUNS_PER_PROCESS = 5
+
+class HeldKeys(set):
+    """A set of key codes that can be indexed like `pygame.key.get_pressed()`."""
+    def __getitem__(self, key: int) -> bool:
+        return key in self
+
+class ScriptedInput(InputHandler):
+    """
+    Input handler fed from a script instead of the keyboard and mouse.
+    Call `push()` before each `Game.tick()` to set the input for that frame.
+    """
+    def __init__(self, repeatable_keys: set[int] = set()):
+        super().__init__(repeatable_keys)
+        self.time = 0
+        self.next_mpos = (0, 0)
+        self.next_held = HeldKeys()
+
+    def push(self, mpos: Vec, held: set[int] = set(), wheel: int = 0):
+        self.next_mpos = mpos.tp()
+        self.next_held = HeldKeys(held)
+        self.wheel_accum += wheel
+
+    def update(self):
+        self.time += FRAME_MS
+        held = self.next_held
+        mbs = tuple(mb in held for mb in (LMB, MMB, RMB))
+        self.apply(self.time, self.next_mpos, mbs, held)
+
+    def is_focused(self) -> bool:
+        return True
+
+class TraceStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.tick_ms = []
+        self.redraws = 0
+        self.suggest_ms = []
+        self.timeouts = 0
+
+    def summary(self) -> dict:
+        return {
+            "frames": len(self.tick_ms),
+            "tick_p50_ms": round(percentile(self.tick_ms, 50), 4),
+            "tick_p95_ms": round(percentile(self.tick_ms, 95), 4),
+            "tick_max_ms": round(max(self.tick_ms, default=0.0), 4),
+            "redraws": self.redraws,
+            "suggest_p50_ms": round(percentile(self.suggest_ms, 50), 4),
+            "suggest_max_ms": round(max(self.suggest_ms, default=0.0), 4),
+            "suggest_timeouts": self.timeouts,
+        }
+
+class TraceRunner:
+    def __init__(self, screen: pygame.Surface, use_suggester: bool):
+        self.screen = screen
+        self.use_suggester = use_suggester
+        self.inp = None
+        self.game = None
+        self.stats = None
+        self.mpos = Vec(0, 0)
+        self.suggest_start = None
+
+    def run(self, name: str, trace: dict) -> TraceStats:
+        self.inp = ScriptedInput(REPEATABLE_KEYS)
+        # The words for validation would load in a thread competing with the ticks
+        self.game = Game(DISPLAY_SIZE, self.screen, self.inp, load_words=False)
+        self.stats = TraceStats(name)
+        self.suggest_start = None
+        if self.use_suggester:
+            suggester.clear_cache()
+
+        if trace.get("load"):
+            success, reason = self.game.cw.load(str(ROOT_DIR.joinpath(trace["load"])))
+            if not success:
+                raise RuntimeError(f"Could not load {trace['load']}: {reason}")
+            self.game.begin_mode_crossword()
+
+        # Count tile redraws from here on
+        redraw_at = self.game.cw.redraw_at
+        def counting_redraw_at(at: Vec):
+            self.stats.redraws += 1
+            redraw_at(at)
+        self.game.cw.redraw_at = counting_redraw_at
+
+        self.run_steps(trace["steps"])
+        return self.stats
+
+    def run_steps(self, steps: list[dict]):
+        for step in steps:
+            if "click" in step:
+                self.press(self.tile_pos(step["click"]), {LMB})
+            elif "rclick" in step:
+                self.press(self.tile_pos(step["rclick"]), {RMB})
+            elif "type" in step:
+                for letter in step["type"].lower():
+                    self.press(self.mpos, {pygame.key.key_code(letter)})
+            elif "key" in step:
+                self.press(self.mpos, {pygame.key.key_code(step["key"])})
+            elif "suggest" in step:
+                if self.use_suggester:
+                    self.press(SUG_BTN_MIN + BTN_SIZE // 2, {LMB})
+            elif "wait_suggestion" in step:
+                deadline = perf_counter() + SUGGESTION_TIMEOUT
+                while self.game.awaiting_suggestion and perf_counter() < deadline:
+                    self.frame(self.mpos)
+                    sleep(0.001)
+                if self.game.awaiting_suggestion:
+                    self.stats.timeouts += 1
+            elif "scroll" in step:
+                self.frame(SUG_LIST_MIN + 8, wheel=-step["scroll"])
+            elif "idle" in step:
+                for _ in range(step["idle"]):
+                    self.frame(self.mpos)
+            elif "repeat" in step:
+                for _ in range(step["repeat"]):
+                    self.run_steps(step["steps"])
+            else:
+                raise ValueError(f"Unrecognized trace step: {step}")
+
+    def press(self, mpos: Vec, held: set[int]):
+        """Holds `held` for one frame, then releases everything for one frame."""
+        self.frame(mpos, held)
+        self.frame(mpos)
+
+    def frame(self, mpos: Vec, held: set[int] = set(), wheel: int = 0):
+        self.mpos = mpos
+        self.inp.push(mpos, held, wheel)
+
+        awaiting = self.game.awaiting_suggestion
+        time_start = perf_counter()
+        self.game.tick()
+        time_end = perf_counter()
+        pygame.display.flip()
+
+        self.stats.tick_ms.append((time_end - time_start) * 1000)
+        if not awaiting and self.game.awaiting_suggestion:
+            self.suggest_start = time_start
+        elif awaiting and not self.game.awaiting_suggestion:
+            self.stats.suggest_ms.append((time_end - self.suggest_start) * 1000)
+
+    def tile_pos(self, tile: list[int]) -> Vec:
+        return self.game.get_screen_coord(Vec(tile)) + 16
+
+def warm_up_suggester():
+    """Waits until the suggester has loaded its dictionary and answered once."""
+    if not suggester.wait_ready(SUGGESTION_TIMEOUT):
+        raise RuntimeError("Word suggester did not load its dictionary")
+    suggester.send_request("A")
+    deadline = perf_counter() + SUGGESTION_TIMEOUT
+    while suggester.get_result() is None:
+        if perf_counter() > deadline:
+            raise RuntimeError("Word suggester did not respond")
+        sleep(0.01)
+    suggester.get_page()
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+def combine(summaries: list[dict], timing: Callable[[list[float]], float]) -> dict:
+    """
+    Combines summaries of several runs of a trace, with `timing` for the
+    timings. Counts take the largest value and timeouts add up.
+    """
+    combined = {}
+    for key in summaries[0]:
+        values = [summary[key] for summary in summaries]
+        if key == "suggest_timeouts":
+            combined[key] = sum(values)
+        elif key.endswith("_ms"):
+            combined[key] = round(timing(values), 4)
+        else:
+            combined[key] = max(values)
+    return combined
+
+def measure(trace_paths: list[Path], use_suggester: bool) -> dict:
+    """Runs each trace RUNS_PER_PROCESS times after a warm-up, and returns the medians by trace."""
+    if use_suggester:
+        suggester.init()
+        warm_up_suggester()
+
+    pygame.init()
+    screen = pygame.display.set_mode(DISPLAY_SIZE)
+    runner = TraceRunner(screen, use_suggester)
+
+    results = dict()
+    try:
+        for path in trace_paths:
+            with open(path) as f:
+                trace = json.load(f)
+            runner.run(path.stem, trace)
+            summaries = [runner.run(path.stem, trace).summary() for _ in range(RUNS_PER_PROCESS)]
+            results[path.stem] = combine(summaries, lambda values: percentile(values, 50))
+    finally:
+        if use_suggester:
+            suggester.shutdown()
+        pygame.quit()
+    return results
+
+def measure_in_processes(trace_paths: list[Path], use_suggester: bool, runs: int) -> dict:
+    """Measures the traces in `runs` fresh processes, and returns the best of them by trace."""
+    with tempfile.TemporaryDirectory(prefix="editor-bench-") as tmp_dir:
+        outputs = []
+        for i in range(runs):
+            out = os.path.join(tmp_dir, f"run-{i}.json")
+            args = [sys.executable, "-m", "gui.bench.editor", *map(str, trace_paths),
+                    "--runs", "1", "--no-compare", "--out", out]
+            if not use_suggester:
+                args.append("--no-suggester")
+            proc = subprocess.run(args, cwd=ROOT_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if proc.returncode:
+                print(proc.stdout.decode("utf-8", errors="replace"))
+                raise RuntimeError(f"Benchmark process {i + 1} of {runs} failed")
+            with open(out) as f:
+                outputs.append(json.load(f))
+    return {name: combine([output[name] for output in outputs], min) for name in outputs[0]}
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, summary in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in TIMING_METRICS:
+            if base.get(metric) and summary[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {summary[metric]:.3f} > baseline {base[metric]:.3f}")
+        for metric in COUNT_METRICS:
+            if metric in base and summary[metric] > base[metric]:
+                regressions.append(f"{name}: {metric} {summary[metric]} > baseline {base[metric]}")
+        if summary["suggest_timeouts"]:
+            regressions.append(f"{name}: {summary['suggest_timeouts']} suggestion(s) timed out")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay scripted input traces against a headless editor.")
+    parser.add_argument("traces", nargs="*", help="trace files; defaults to every trace in gui/bench/traces")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="baseline to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="overwrite the baseline with these results")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative growth of timings (default: %(default)s)")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS,
+                        help="processes to measure in, taking the best (default: %(default)s)")
+    parser.add_argument("--no-compare", action="store_true", help="only measure, without comparing to the baseline")
+    parser.add_argument("--no-suggester", action="store_true", help="skip suggestion steps")
+    parser.add_argument("--out", help="also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.runs < 1:
+        parser.error("--runs must be positive")
+
+    trace_paths = [Path(p) if Path(p).exists() else TRACES_DIR.joinpath(p) for p in args.traces]
+    if not trace_paths:
+        trace_paths = sorted(TRACES_DIR.glob("*.json"))
+
+    use_suggester = not args.no_suggester
+    if args.runs == 1:
+        results = measure(trace_paths, use_suggester)
+    else:
+        results = measure_in_processes(trace_paths, use_suggester, args.runs)
+    for name, summary in results.items():
+        print(f"{name:>16}: {summary['frames']:5d} frames, "
+              f"tick p50 {summary['tick_p50_ms']:.3f} ms, p95 {summary['tick_p95_ms']:.3f} ms, "
+              f"{summary['redraws']} redraws, suggest p50 {summary['suggest_p50_ms']:.1f} ms")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.no_compare:
+        return
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"[WARNING] No baseline at {args.baseline}; nothing to compare against")
+        return
+
+    regressions = find_regressions(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"[REGRESSION] {regression}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
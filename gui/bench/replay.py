@@ -0,0 +1,286 @@
+"""
+Load generator that replays captured suggester requests against a backend.
+
+Requests captured with `python -m gui --capture` (see gui.capture) are sent
+to a running gui.service, to `suggester` programs started for the purpose,
+or to a Python stand-in service started for the purpose, which needs
+neither the program nor a display and so runs in CI:
+
+    python -m gui.bench.replay requests.jsonl.gz --service 127.0.0.1:7878 --speed 4 --clients 32
+    python -m gui.bench.replay requests.jsonl.gz --subprocess --clients 4 --speed 0
+    python -m gui.bench.replay requests.jsonl.gz --standin --repeat 10
+
+Requests are spread round-robin over `--clients` connections, each of which
+pipelines its requests. By default they are sent on the captured schedule,
+sped up `--speed` times, and each latency is measured from when the request
+was due, so a backend that falls behind is charged for the queueing it
+causes. With `--speed 0`, every connection sends its next request as soon
+as the last one is answered, which measures peak throughput instead.
+Requests the crossword maker answered from its own cache never reached a
+backend, so they are left out unless `--include-cache` is given.
+
+Throughput and latency percentiles are reported per request kind (pattern,
+near miss, range) and overall, and written as JSON. The number of results
+of each answer is checked against the capture, and differences are counted;
+expect some when the backend has other dictionaries than the capture did.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+from time import perf_counter
+from datetime import datetime, timezone
+
+from gui import capture
+from gui.service import get_exe_path, parse_address, DEFAULT_SOCKET, DEFAULT_DICT
+
+DEFAULT_OUT = "replay-bench.json"
+STARTUP_TIMEOUT = 60.0
+KINDS = ("pattern", "near_miss", "range")
+
+class Connection:
+    """One client connection speaking the suggester's line protocol."""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, proc=None):
+        self.reader = reader
+        self.writer = writer
+        self.proc = proc
+
+    @classmethod
+    async def open_service(cls, address: str) -> "Connection":
+        kind, where = parse_address(address)
+        if kind == "tcp":
+            reader, writer = await asyncio.open_connection(*where)
+        else:
+            reader, writer = await asyncio.open_unix_connection(where)
+        conn = cls(reader, writer)
+        await conn.wait_ready()
+        return conn
+
+    @classmethod
+    async def open_subprocess(cls, dict_paths: list[str]) -> "Connection":
+        proc = await asyncio.create_subprocess_exec(
+            str(get_exe_path()), *dict_paths, stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        conn = cls(proc.stdout, proc.stdin, proc)
+        await conn.wait_ready()
+        return conn
+
+    async def wait_ready(self):
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), STARTUP_TIMEOUT)
+            if not line:
+                raise RuntimeError("Backend closed the connection during startup")
+            if line.startswith(b"# Initialized"):
+                return
+
+    async def read_answer(self) -> int:
+        """Reads one answer and returns the number of results in it."""
+        results = 0
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise RuntimeError("Backend closed the connection")
+            if line.startswith(b"---"):
+                return results
+            if not line.startswith(b"#"):
+                results += 1
+
+    async def close(self):
+        try:
+            self.writer.write(b"!Q\n")
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+        self.writer.close()
+        if self.proc is not None:
+            try:
+                await asyncio.wait_for(self.proc.wait(), 1.0)
+            except asyncio.TimeoutError:
+                self.proc.kill()
+
+def request_kind(request: str) -> str:
+    if request.startswith("!F"):
+        return "near_miss"
+    if request.startswith("!R"):
+        return "range"
+    return "pattern"
+
+def load_requests(path: str, include_cache: bool, repeat: int) -> list[dict]:
+    """Returns the captured requests to replay, in the order they were sent."""
+    _, records = capture.read(path)
+    skipped = (capture.SOURCE_FAILED,) if include_cache else (capture.SOURCE_FAILED, capture.SOURCE_CACHE)
+    requests = sorted((record for record in records if record["src"] not in skipped), key=lambda r: r["t"])
+    if not requests:
+        return []
+    start = requests[0]["t"]
+    # Each repetition follows the last, a mean gap later
+    span = requests[-1]["t"] - start
+    gap = span / max(1, len(requests) - 1)
+    replayed = []
+    for i in range(repeat):
+        offset = i * (span + gap)
+        replayed.extend(dict(record, t=record["t"] - start + offset) for record in requests)
+    return replayed
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "p999_ms": round(percentile(latencies, 99.9), 3),
+        "max_ms": round(max(latencies), 3) if latencies else 0.0,
+    }
+
+async def drive(conn: Connection, requests: list[dict], speed: float, time_start: float,
+                latencies: dict, mismatches: list[int]):
+    """Sends `requests` over `conn`, on schedule or back to back, and times the answers."""
+    due = asyncio.Queue()
+
+    async def read_main():
+        while True:
+            item = await due.get()
+            if item is None:
+                return
+            record, time_due = item
+            results = await conn.read_answer()
+            latencies[request_kind(record["req"])].append((perf_counter() - time_due) * 1000)
+            if results != record["n"]:
+                mismatches[0] += 1
+            if not speed:
+                due.task_done()
+
+    reader = asyncio.create_task(read_main())
+    try:
+        for record in requests:
+            if speed:
+                time_due = time_start + record["t"] / speed
+                delay = time_due - perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                time_due = perf_counter()
+            conn.writer.write(record["req"].encode("utf-8") + b"\n")
+            await conn.writer.drain()
+            due.put_nowait((record, time_due))
+            if not speed:
+                await due.join()
+        due.put_nowait(None)
+        await reader
+    finally:
+        reader.cancel()
+
+async def start_standin(dict_paths: list[str], backends: int) -> tuple[asyncio.subprocess.Process, str]:
+    """Starts `gui.service --engine python` on a temporary socket, and returns it and its address."""
+    address = os.path.join(tempfile.mkdtemp(prefix="replay-"), "standin.sock")
+    args = [sys.executable, "-m", "gui.service", "--engine", "python", "--socket", address,
+            "--backends", str(backends)]
+    for path in dict_paths:
+        args += ["--dict", path]
+    proc = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE)
+    while True:
+        line = await asyncio.wait_for(proc.stdout.readline(), STARTUP_TIMEOUT)
+        if not line:
+            raise RuntimeError("The stand-in service exited during startup")
+        if line.startswith(b"Listening"):
+            return proc, address
+
+async def replay(requests: list[dict], args: argparse.Namespace) -> dict:
+    standin = None
+    if args.standin:
+        standin, address = await start_standin(args.dict, args.backends)
+    else:
+        address = args.service or DEFAULT_SOCKET
+    try:
+        if args.subprocess:
+            conns = await asyncio.gather(*(Connection.open_subprocess(args.dict) for _ in range(args.clients)))
+        else:
+            conns = await asyncio.gather(*(Connection.open_service(address) for _ in range(args.clients)))
+
+        latencies = {kind: [] for kind in KINDS}
+        mismatches = [0]
+        time_start = perf_counter()
+        await asyncio.gather(*(drive(conn, requests[i::args.clients], args.speed, time_start, latencies, mismatches)
+                               for i, conn in enumerate(conns)))
+        elapsed = perf_counter() - time_start
+        await asyncio.gather(*(conn.close() for conn in conns))
+    finally:
+        if standin is not None:
+            standin.terminate()
+            await standin.wait()
+
+    all_latencies = [ms for kind in KINDS for ms in latencies[kind]]
+    return {
+        "seconds": round(elapsed, 3),
+        "overall": summarize(all_latencies, elapsed),
+        "kinds": {kind: summarize(latencies[kind], elapsed) for kind in KINDS if latencies[kind]},
+        "size_mismatches": mismatches[0],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.bench.replay",
+                                     description="Replay captured suggester requests as load against a backend.")
+    parser.add_argument("capture", help="capture file written by `python -m gui --capture`")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--service", metavar="ADDR",
+                        help="address of a running gui.service (default: the service's socket)")
+    target.add_argument("--subprocess", action="store_true", help="start a suggester program per client")
+    target.add_argument("--standin", action="store_true",
+                        help="start a pure-Python stand-in service (`gui.service --engine python`)")
+    parser.add_argument("--dict", action="append", metavar="PATH",
+                        help=f"dictionary for --subprocess and --standin; repeat for several (default: {DEFAULT_DICT})")
+    parser.add_argument("--backends", type=int, default=2, help="backends of the stand-in service (default: %(default)s)")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent connections (default: %(default)s)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay this many times faster than captured, or 0 for back to back (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the capture this many times over")
+    parser.add_argument("--include-cache", action="store_true", help="also replay requests answered from the cache")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="JSON file for the results (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.clients < 1 or args.repeat < 1 or args.speed < 0:
+        parser.error("--clients and --repeat must be positive, and --speed must not be negative")
+    args.dict = args.dict or [str(DEFAULT_DICT)]
+    try:
+        requests = load_requests(args.capture, args.include_cache, args.repeat)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if not requests:
+        print(f"No requests to replay in {args.capture}")
+        sys.exit(1)
+
+    results = asyncio.run(replay(requests, args))
+    run = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "capture": args.capture,
+        "target": "subprocess" if args.subprocess else "standin" if args.standin else args.service or DEFAULT_SOCKET,
+        "clients": args.clients,
+        "speed": args.speed,
+        "repeat": args.repeat,
+    } | results
+    with open(args.out, "w") as f:
+        json.dump(run, f, indent=2)
+        f.write("\n")
+
+    overall = results["overall"]
+    print(f"Replayed {overall['requests']} requests in {results['seconds']:.2f} s: "
+          f"{overall['throughput_per_s']:.1f} requests/s")
+    for kind, summary in [("overall", overall)] + list(results["kinds"].items()):
+        print(f"{kind:>10}: {summary['requests']:6} requests, p50 {summary['p50_ms']:.2f} ms, "
+              f"p90 {summary['p90_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms, max {summary['max_ms']:.2f} ms")
+    if results["size_mismatches"]:
+        print(f"{results['size_mismatches']} answer(s) had a different number of results from the capture")
+    print(f"Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
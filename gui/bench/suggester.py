@@ -0,0 +1,310 @@
+"""
+Benchmark and differential test for the word suggester's engines.
+
+Generates a seeded workload of patterns and runs it against each bundled
+dictionary through every engine path the tools use:
+
+    subprocess  the `suggester` program, over its stdin/stdout pipes
+    binding     the `libsuggester` shared library, through gui.native
+    python      the pure-Python `WordIndex` from gui.wordlist
+
+Latency percentiles and throughput are reported per engine and pattern
+category, and the words each engine returns are compared against the others.
+Results are written as JSON, and a one-line summary can be appended to a
+JSON Lines file for tracking trends across runs. The process exits with
+status 1 if any two engines disagreed.
+
+    python -m gui.bench.suggester
+    python -m gui.bench.suggester --dict word-suggester/data/american.txt --engines binding python
+    python -m gui.bench.suggester --queries 50 --history suggester-history.jsonl
+
+Pattern categories:
+
+    wildcard    every letter blank, of lengths 2 to 15
+    single      one fixed letter
+    dense       a dictionary word with one or two letters blanked
+    slots       the slots of the sample puzzles in gui/bench/puzzles, as they
+                are and partially filled with dictionary words
+"""
+import sys
+import json
+import random
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone
+from time import perf_counter
+
+from gui import grid_io
+from gui.slots import extract_slots
+from gui.service import get_exe_path
+from gui.native import NativeSuggester, load_library
+from gui.wordlist import WordIndex, DATA_DIR
+
+BENCH_DIR = Path(__file__).parent
+ROOT_DIR = BENCH_DIR.parent.parent
+PUZZLES_DIR = BENCH_DIR.joinpath("puzzles")
+DEFAULT_OUT = "suggester-bench.json"
+
+ENGINES = ("subprocess", "binding", "python")
+CATEGORIES = ("wildcard", "single", "dense", "slots")
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+MIN_LENGTH = 2
+MAX_LENGTH = 15
+
+# Mismatching words listed per disagreement in the results
+MAX_LISTED_WORDS = 10
+
+class SubprocessEngine:
+    """Runs the `suggester` program and talks to it over its pipes."""
+    def __init__(self, dict_path: str):
+        self.proc = subprocess.Popen([str(get_exe_path()), dict_path], stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     text=True, encoding="utf-8")
+        for line in self.proc.stdout:
+            if line.startswith("# Initialized"):
+                return
+        raise RuntimeError("Word suggester exited during startup")
+
+    def query(self, pattern: str) -> list[str]:
+        self.proc.stdin.write(pattern + "\n")
+        self.proc.stdin.flush()
+        words = []
+        for line in self.proc.stdout:
+            if line.startswith("---"):
+                return words
+            if not line.startswith("#"):
+                words.append(line.rstrip("\n"))
+        raise RuntimeError("Word suggester exited")
+
+    def close(self):
+        try:
+            self.proc.stdin.write("!Q\n")
+            self.proc.stdin.flush()
+            self.proc.wait(1.0)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+class BindingEngine:
+    def __init__(self, dict_path: str):
+        self.native = NativeSuggester([dict_path])
+
+    def query(self, pattern: str) -> list[str]:
+        return self.native.query(pattern)
+
+    def close(self):
+        self.native.close()
+
+class PythonEngine:
+    def __init__(self, dict_path: str):
+        self.index = WordIndex.from_file(dict_path)
+
+    def query(self, pattern: str) -> list[str]:
+        return self.index.match(pattern)
+
+    def close(self):
+        pass
+
+ENGINE_CLASSES = {
+    "subprocess": SubprocessEngine,
+    "binding": BindingEngine,
+    "python": PythonEngine,
+}
+
+def engine_available(name: str) -> bool:
+    if name == "subprocess":
+        return get_exe_path().exists()
+    if name == "binding":
+        return load_library() is not None
+    return True
+
+def blank_out(word: str, count: int, rng: random.Random) -> str:
+    letters = list(word)
+    for pos in rng.sample(range(len(word)), min(count, len(word))):
+        letters[pos] = "*"
+    return "".join(letters)
+
+def slot_patterns() -> list[str]:
+    """Returns the patterns of every slot in the sample puzzles."""
+    patterns = []
+    for path in sorted(PUZZLES_DIR.glob("*.txt")):
+        grid = grid_io.read_grid(path)
+        patterns.extend(slot.pattern(grid) for slot in extract_slots(grid))
+    return patterns
+
+def make_workload(index: WordIndex, queries: int, seed: int) -> dict[str, list[str]]:
+    """
+    Returns `queries` patterns for each category, drawn with `seed` so that
+    every engine and every run sees the same workload for a dictionary.
+    """
+    rng = random.Random(seed)
+    lengths = [length for length in range(MIN_LENGTH, MAX_LENGTH + 1) if len(index.bucket(length))]
+
+    def random_word(length: int) -> str:
+        bucket = index.bucket(length)
+        return bucket[rng.randrange(len(bucket))].tobytes().decode("ascii")
+
+    workload = {category: [] for category in CATEGORIES}
+    for i in range(queries):
+        length = lengths[i % len(lengths)]
+        workload["wildcard"].append("*" * length)
+        length = rng.choice(lengths)
+        workload["single"].append(blank_out(rng.choice(LETTERS) * length, length - 1, rng))
+        word = random_word(rng.choice(lengths))
+        workload["dense"].append(blank_out(word, rng.randint(1, min(2, len(word) - 1)), rng))
+
+    # Slots as they are, then filled with matching words, half blanked
+    slots = slot_patterns()
+    for i in range(queries):
+        pattern = slots[i % len(slots)]
+        if i >= len(slots):
+            matches = index.match(pattern)
+            if matches:
+                word = rng.choice(matches)
+                pattern = blank_out(word, len(word) // 2, rng)
+        workload["slots"].append(pattern)
+    return workload
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+def run_engine(engine, patterns: list[str]) -> tuple[list[float], list[set[str]]]:
+    """Returns the latency in ms and the set of words for each pattern."""
+    latencies = []
+    results = []
+    for pattern in patterns:
+        time_start = perf_counter()
+        words = engine.query(pattern)
+        latencies.append((perf_counter() - time_start) * 1000)
+        # Phrase entries carry their display form after a tab
+        results.append({word.split("\t", 1)[0] for word in words})
+    return latencies, results
+
+def summarize(dict_name: str, engine: str, category: str,
+              latencies: list[float], results: list[set[str]]) -> dict:
+    total_ms = sum(latencies)
+    return {
+        "dict": dict_name,
+        "engine": engine,
+        "category": category,
+        "queries": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 4),
+        "p99_ms": round(percentile(latencies, 99), 4),
+        "max_ms": round(max(latencies, default=0.0), 4),
+        "mean_ms": round(total_ms / len(latencies), 4) if latencies else 0.0,
+        "qps": round(len(latencies) / total_ms * 1000, 1) if total_ms else 0.0,
+        "words": sum(map(len, results)),
+    }
+
+def diff_results(dict_name: str, category: str, patterns: list[str],
+                 results: dict[str, list[set[str]]]) -> list[dict]:
+    """Compares every engine's results against the first engine's."""
+    mismatches = []
+    engines = list(results)
+    for other in engines[1:]:
+        for pattern, expected, actual in zip(patterns, results[engines[0]], results[other]):
+            if expected != actual:
+                mismatches.append({
+                    "dict": dict_name,
+                    "category": category,
+                    "pattern": pattern,
+                    "engines": [engines[0], other],
+                    "missing": sorted(expected - actual)[:MAX_LISTED_WORDS],
+                    "extra": sorted(actual - expected)[:MAX_LISTED_WORDS],
+                })
+    return mismatches
+
+def bench_dictionary(dict_path: Path, engines: list[str], queries: int, seed: int) -> tuple[list[dict], list[dict]]:
+    index = WordIndex.from_file(dict_path)
+    workload = make_workload(index, queries, seed)
+
+    results = {category: dict() for category in CATEGORIES}
+    summaries = []
+    for name in engines:
+        time_start = perf_counter()
+        engine = ENGINE_CLASSES[name](str(dict_path))
+        print(f"{dict_path.name}: {name} engine started in {(perf_counter() - time_start) * 1000:.0f} ms")
+        try:
+            engine.query("*")
+            for category, patterns in workload.items():
+                latencies, results[category][name] = run_engine(engine, patterns)
+                summary = summarize(dict_path.stem, name, category, latencies, results[category][name])
+                summaries.append(summary)
+                print(f"{name:>12} {category:>9}: p50 {summary['p50_ms']:8.3f} ms, "
+                      f"p99 {summary['p99_ms']:8.3f} ms, {summary['qps']:10.1f} queries/s")
+        finally:
+            engine.close()
+
+    mismatches = []
+    for category, patterns in workload.items():
+        mismatches.extend(diff_results(dict_path.stem, category, patterns, results[category]))
+    return summaries, mismatches
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.bench.suggester",
+                                     description="Benchmark and cross-check the word suggester's engines.")
+    parser.add_argument("--dict", action="append", metavar="PATH",
+                        help=f"dictionary to benchmark; repeat for several (default: every file in {DATA_DIR})")
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES),
+                        help="engines to run (default: all that are available)")
+    parser.add_argument("--queries", type=int, default=200, help="patterns per category")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the workload")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="JSON file for the results (default: %(default)s)")
+    parser.add_argument("--history", help="append a one-line summary of this run to this JSON Lines file")
+    args = parser.parse_args()
+
+    engines = []
+    for name in args.engines:
+        if engine_available(name):
+            engines.append(name)
+        else:
+            print(f"[WARNING] Skipping the {name} engine, which has not been built; run `make`")
+    dict_paths = [Path(p) for p in args.dict] if args.dict else sorted(DATA_DIR.glob("*.txt"))
+
+    summaries = []
+    mismatches = []
+    for dict_path in dict_paths:
+        dict_summaries, dict_mismatches = bench_dictionary(dict_path, engines, args.queries, args.seed)
+        summaries.extend(dict_summaries)
+        mismatches.extend(dict_mismatches)
+
+    run = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "seed": args.seed,
+        "queries_per_category": args.queries,
+        "engines": engines,
+        "results": summaries,
+        "mismatches": mismatches,
+    }
+    with open(args.out, "w") as f:
+        json.dump(run, f, indent=2)
+        f.write("\n")
+    print(f"Results written to {args.out}")
+
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps({key: value for key, value in run.items() if key != "mismatches"}
+                               | {"mismatches": len(mismatches)}) + "\n")
+
+    for mismatch in mismatches[:MAX_LISTED_WORDS]:
+        print(f"[MISMATCH] {mismatch['dict']} {mismatch['pattern']}: {' vs '.join(mismatch['engines'])}, "
+              f"missing {mismatch['missing']}, extra {mismatch['extra']}")
+    if mismatches:
+        print(f"{len(mismatches)} pattern(s) gave different results across engines")
+        sys.exit(1)
+    print("All engines agreed on every pattern")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Opt-in capture of the requests answered by the word suggester client, to
+replay later as realistic load (see gui.bench.replay).
+
+    python -m gui --capture suggester-requests.jsonl.gz
+
+Like gui.metrics, nothing is recorded until `start()` has been called, and
+`record()` returns immediately while capture is off. Every answered request
+becomes one JSON line holding when it was sent, in seconds since capture
+began, the request line as sent to the suggester, where the answer came
+from (a backend, the cache, a prefetch, or nowhere when the request was
+given up on), the number of results and the latency in milliseconds. The
+first line records the wall-clock time capture began. Lines are written in
+batches, and a path ending in .gz is gzip-compressed.
+"""
+import gzip
+import json
+from threading import Lock
+from time import perf_counter
+from datetime import datetime, timezone
+from typing import Iterator, Union
+
+SOURCE_BACKEND = "backend"
+SOURCE_CACHE = "cache"
+SOURCE_PREFETCH = "prefetch"
+SOURCE_FAILED = "failed"
+
+FORMAT_VERSION = 1
+# Records are buffered and written this many at a time
+FLUSH_EVERY = 256
+
+enabled = False
+
+_file = None
+_lines = []
+_count = 0
+_time_start = 0.0
+_mutex = Lock()
+
+def _open(path: str, mode: str):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def start(path: str):
+    """Starts capturing requests to `path`, replacing any previous capture there."""
+    global enabled, _file, _count, _time_start
+    stop()
+    with _mutex:
+        _file = _open(path, "w")
+        _time_start = perf_counter()
+        _count = 0
+        header = {"version": FORMAT_VERSION, "start": datetime.now(timezone.utc).isoformat(timespec="milliseconds")}
+        _file.write(json.dumps(header) + "\n")
+        enabled = True
+
+def record(request: str, source: str, result_size: int, latency_ms: float,
+           time_sent: Union[float, None] = None):
+    """
+    Records an answered request. `time_sent` is the `perf_counter()` time
+    the request was made, by default now.
+    """
+    global _count
+    if not enabled:
+        return
+    if time_sent is None:
+        time_sent = perf_counter()
+    line = json.dumps({"t": round(time_sent - _time_start, 4), "req": request, "src": source,
+                       "n": result_size, "ms": round(latency_ms, 3)}, separators=(",", ":"))
+    with _mutex:
+        if _file is None:
+            return
+        _lines.append(line)
+        _count += 1
+        if len(_lines) >= FLUSH_EVERY:
+            _flush()
+
+def _flush():
+    """Must hold `_mutex`."""
+    if _lines:
+        _file.write("\n".join(_lines) + "\n")
+        _lines.clear()
+
+def stop() -> int:
+    """Stops capturing and returns the number of requests captured."""
+    global enabled, _file
+    with _mutex:
+        enabled = False
+        if _file is None:
+            return 0
+        _flush()
+        _file.close()
+        _file = None
+        return _count
+
+def read(path: str) -> tuple[dict, Iterator[dict]]:
+    """
+    Returns the header of the capture at `path` and an iterator over its
+    records, in the order they were answered. A truncated final line, as
+    left by a crash, is skipped.
+    """
+    f = _open(path, "r")
+    try:
+        header = json.loads(f.readline())
+    except (ValueError, EOFError, OSError):
+        f.close()
+        raise ValueError(f"{path} is not a request capture")
+    if not isinstance(header, dict) or header.get("version") != FORMAT_VERSION:
+        f.close()
+        raise ValueError(f"{path} is not a request capture of version {FORMAT_VERSION}")
+
+    def records() -> Iterator[dict]:
+        with f:
+            try:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        pass
+            except (EOFError, OSError):
+                pass
+    return header, records()
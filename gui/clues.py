@@ -0,0 +1,259 @@
+"""
+Local clue database, for looking up how an answer has been clued before.
+
+    python -m gui.clues --db clues.db build clues/
+    python -m gui.clues answer OCEAN ATLAS
+    python -m gui.clues search "sea monster"
+    python -m gui.clues grid puzzle.cwg
+
+Clues are read from text files with one clue per line, as tab-separated
+fields ending in the answer and the clue. Any fields before those, such as
+the publication and year in the xd clue dumps, are kept as the clue's
+source. Blank lines, lines starting with '#' and header lines are skipped.
+
+The database is SQLite: clues are stored clustered by answer, so that all
+the clues for one answer share a few pages, with an FTS5 full-text index over
+the clue text for keyword searches. Building
+streams the files in batches, so the corpus is never held in memory, and
+writes to a temporary file that replaces the database only once complete.
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import sqlite3
+import argparse
+from pathlib import Path
+from itertools import islice
+from time import perf_counter
+from typing import Iterable, Iterator, Union
+
+import numpy
+
+from gui import grid_io
+from gui.slots import Slot, DIR_NAMES, extract_slots
+from gui.wordlist import normalize_word
+
+DEFAULT_DB = "clues.db"
+CLUE_EXTS = {".tsv", ".txt"}
+
+# Rows inserted per transaction batch while building
+BUILD_BATCH_SIZE = 10000
+
+SCHEMA = """
+CREATE TABLE clues (
+    answer TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    clue TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (answer, id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE clue_text USING fts5(clue, content='clues', content_rowid='id');
+"""
+
+class Clue:
+    def __init__(self, answer: str, clue: str, source: str):
+        self.answer = answer
+        self.clue = clue
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"Clue({self.answer}: {self.clue!r} [{self.source}])"
+
+    def to_dict(self) -> dict:
+        return {"answer": self.answer, "clue": self.clue, "source": self.source}
+
+def iter_clue_files(path: Union[str, Path]) -> Iterator[Path]:
+    """Yields `path` if it is a file, or the clue files under it if it is a directory."""
+    path = Path(path)
+    if not path.is_dir():
+        yield path
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in CLUE_EXTS:
+                yield Path(dirpath, name)
+
+def read_clues(path: Union[str, Path]) -> Iterator[tuple[str, str, str]]:
+    """Yields (answer, clue, source) for every usable line of a clue file."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            fields = line.rstrip("\r\n").split("\t")
+            if len(fields) < 2 or line.startswith("#"):
+                continue
+            *source, answer, clue = fields
+            if answer.lower() == "answer" and clue.lower() == "clue":
+                continue
+            answer = normalize_word(answer)
+            clue = clue.strip()
+            if answer is not None and clue:
+                yield answer, clue, " ".join(source)
+
+def slot_entries(grid: numpy.ndarray) -> list[tuple[Slot, str]]:
+    """Returns every complete slot of `grid` with its answer."""
+    slots = extract_slots(grid)
+    return [(slot, slot.pattern(grid)) for slot in slots if slot.is_complete(grid)]
+
+def fts_query(keywords: str) -> str:
+    """Quotes each keyword, so that FTS5 operators in user input are taken literally."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in keywords.split())
+
+class ClueDB:
+    def __init__(self, path: Union[str, Path] = DEFAULT_DB):
+        """Opens a database written by `build()`, read-only."""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No clue database at {path}; build one with `python -m gui.clues build`")
+        self.path = Path(path)
+        self.conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True,
+                                    check_same_thread=False)
+
+    @classmethod
+    def build(cls, path: Union[str, Path], sources: Iterable[Union[str, Path]],
+              batch_size: int = BUILD_BATCH_SIZE) -> ClueDB:
+        """
+        Builds a database at `path` from clue files, replacing any database
+        already there. `sources` may contain files and directories.
+        """
+        path = Path(path)
+        path_tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        if path_tmp.exists():
+            path_tmp.unlink()
+
+        def all_rows() -> Iterator[tuple[str, int, str, str]]:
+            clue_id = 0
+            for source in sources:
+                for file in iter_clue_files(source):
+                    for answer, clue, clue_source in read_clues(file):
+                        yield answer, clue_id, clue, clue_source
+                        clue_id += 1
+
+        conn = sqlite3.connect(path_tmp)
+        try:
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.executescript(SCHEMA)
+            rows = all_rows()
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                with conn:
+                    conn.executemany("INSERT INTO clues (answer, id, clue, source) VALUES (?, ?, ?, ?)", batch)
+
+            # The full-text index finds clues by id. Indexing once at the end is
+            # much faster than on every insert.
+            with conn:
+                conn.execute("CREATE UNIQUE INDEX clues_id ON clues (id)")
+                conn.execute("INSERT INTO clue_text (clue_text) VALUES ('rebuild')")
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+        os.replace(path_tmp, path)
+        return cls(path)
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM clues").fetchone()[0]
+
+    def lookup(self, answer: str, limit: int = 100) -> list[Clue]:
+        """Returns up to `limit` clues for `answer`, in the order they were read."""
+        answer = normalize_word(answer)
+        rows = self.conn.execute("SELECT answer, clue, source FROM clues WHERE answer = ? ORDER BY id LIMIT ?",
+                                 (answer, limit))
+        return [Clue(*row) for row in rows]
+
+    def lookup_many(self, answers: Iterable[str], limit: int = 100) -> dict[str, list[Clue]]:
+        """
+        Looks up every answer, each once, within a single read transaction.
+        Returns up to `limit` clues per answer, keyed by the normalized
+        answer; answers with no clues map to an empty list.
+        """
+        result = {answer: [] for answer in map(normalize_word, answers) if answer is not None}
+        # Clustering makes each lookup a short range scan, which is faster
+        # than any single query over all the answers
+        self.conn.execute("BEGIN")
+        try:
+            for answer in result:
+                result[answer] = self.lookup(answer, limit)
+        finally:
+            self.conn.execute("COMMIT")
+        return result
+
+    def lookup_grid(self, grid: numpy.ndarray, limit: int = 100) -> list[tuple[Slot, list[Clue]]]:
+        """
+        Returns the clues for every complete slot of `grid`, in clue order.
+        Pass `Crossword.get_grid()` to look up a whole crossword at once.
+        """
+        entries = slot_entries(grid)
+        clues = self.lookup_many((answer for _, answer in entries), limit)
+        return [(slot, clues.get(answer, [])) for slot, answer in entries]
+
+    def search(self, keywords: str, limit: int = 100) -> list[Clue]:
+        """Returns up to `limit` clues containing every word of `keywords`, best matches first."""
+        query = fts_query(keywords)
+        if not query:
+            return []
+        rows = self.conn.execute(
+            "SELECT clues.answer, clues.clue, clues.source FROM clue_text"
+            " JOIN clues ON clues.id = clue_text.rowid"
+            " WHERE clue_text MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit))
+        return [Clue(*row) for row in rows]
+
+def print_clues(clues: list[Clue]):
+    for clue in clues:
+        source = f"  [{clue.source}]" if clue.source else ""
+        print(f"  {clue.answer}: {clue.clue}{source}")
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.clues", description="Build and query a local clue database.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="database path (default: %(default)s)")
+    parser.add_argument("--limit", type=int, default=20, help="clues shown per answer or search")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build the database from clue files")
+    build.add_argument("sources", nargs="+", help="clue files or directories of them")
+    answer = commands.add_parser("answer", help="look up clues by answer")
+    answer.add_argument("answers", nargs="+")
+    search = commands.add_parser("search", help="look up clues containing keywords")
+    search.add_argument("keywords", nargs="+")
+    grid = commands.add_parser("grid", help="look up clues for every complete entry of a grid file")
+    grid.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        time_start = perf_counter()
+        db = ClueDB.build(args.db, args.sources)
+        print(f"Indexed {len(db)} clues into {args.db} in {perf_counter() - time_start:.1f} s")
+        return
+
+    try:
+        db = ClueDB(args.db)
+    except FileNotFoundError as e:
+        print(f"[WARNING] {e}")
+        sys.exit(1)
+
+    time_start = perf_counter()
+    if args.command == "answer":
+        groups = list(db.lookup_many(args.answers, args.limit).items())
+    elif args.command == "search":
+        groups = [(" ".join(args.keywords), db.search(" ".join(args.keywords), args.limit))]
+    else:
+        grid = grid_io.read_grid(args.path)
+        groups = [(f"{slot.number} {DIR_NAMES[slot.direction]}", clues)
+                  for slot, clues in db.lookup_grid(grid, args.limit)]
+    time_ms = (perf_counter() - time_start) * 1000
+
+    if args.json:
+        print(json.dumps({key: [clue.to_dict() for clue in clues] for key, clues in groups}, indent=2))
+        return
+    for key, clues in groups:
+        print(f"{key}: {len(clues)} clue(s)")
+        print_clues(clues)
+    print(f"Looked up in {time_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Live co-editing of one grid between several crossword makers.
+
+    python -m gui.collab                             # serve on 127.0.0.1:7879
+    python -m gui.collab --host 0.0.0.0 --grid shared.cwg
+    python -m gui --collab 192.168.1.20:7879
+
+The server holds the shared grid and relays edits between clients. An edit
+is one changed tile, sent as 4 bytes: (kind, x, y, character). The server
+gives each edit the next sequence number, applies it to its grid, relays it
+to every other client as 8 bytes, (kind, sequence, x, y, character), and
+acknowledges it to the sender with 5, (kind, sequence). Each connection's
+messages are handled in order and relayed without yielding in between, so
+every client sees all edits in the same order: the server's.
+
+Conflicts resolve by that order, the last edit to a tile winning. A client
+shows its own edits at once and remembers them until acknowledged. A
+remote edit to a tile with an edit still in flight is ignored, since the
+server ordered it first and the client's edit will overwrite it everywhere.
+
+Clients that join get a snapshot of the grid, and a client that loads a
+file replaces the grid for everyone else with a snapshot of its own, which
+is acknowledged to it like an edit. Until then, the client ignores whatever
+the server ordered before it, since the snapshot overwrites it. Snapshots
+carry the sequence number they are current to, and edits still in flight
+are applied again on top of them. With `--grid`, the server starts from a
+grid file and writes the grid back every few seconds while it changes, so
+a restarted server picks up where it left off.
+
+The address is a `host:port` or the path of a Unix socket, as for
+gui.service. `gui.bench.collab` load-tests a server over loopback.
+"""
+import os
+import queue
+import socket
+import struct
+import asyncio
+import argparse
+from collections import Counter, deque
+from threading import Thread
+from typing import Union
+
+import numpy
+
+from gui import grid_io
+from gui.service import parse_address
+
+DEFAULT_PORT = 7879
+DEFAULT_ADDRESS = f"127.0.0.1:{DEFAULT_PORT}"
+SAVE_PERIOD = 5.0
+# Clients this far behind on reading are dropped; they get a fresh
+# snapshot if they reconnect
+MAX_BUFFERED = 1 << 20
+
+KIND_EDIT = b"E"
+KIND_ACK = b"A"
+KIND_SNAPSHOT = b"S"
+EDIT = struct.Struct("<cBBc")
+RELAY = struct.Struct("<cIBBc")
+ACK = struct.Struct("<cI")
+# Followed by width * height tiles, row by row
+SNAPSHOT = struct.Struct("<cIBB")
+
+TILES = frozenset(bytes(grid_io.LETTERS) + bytes([grid_io.BLANK, grid_io.DARK]))
+
+# Updates returned by `Replica.receive()`
+UPDATE_EDIT = 0
+UPDATE_GRID = 1
+
+def pack_edit(x: int, y: int, char: str) -> bytes:
+    return EDIT.pack(KIND_EDIT, x, y, char.encode("ascii"))
+
+def pack_snapshot(grid: numpy.ndarray, seq: int = 0) -> bytes:
+    width, height = grid.shape
+    return SNAPSHOT.pack(KIND_SNAPSHOT, seq, width, height) + grid.T.tobytes()
+
+def unpack_tiles(data: bytes, width: int, height: int) -> Union[numpy.ndarray, None]:
+    """Returns the grid sent in a snapshot, or None if it is not a valid grid."""
+    if not (0 < width <= grid_io.MAX_DIM[0] and 0 < height <= grid_io.MAX_DIM[1]) \
+            or not TILES.issuperset(data):
+        return None
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(height, width).T.copy()
+
+class Replica:
+    """
+    One client's view of the shared grid, without any I/O. Local edits are
+    passed to `edit()`, and server messages to `receive()`, which returns
+    the changes the client must make to stay in step with the server.
+    """
+    def __init__(self):
+        # Local edits as (x, y, char), and None for a local snapshot
+        self.in_flight = deque()
+        self.tiles_in_flight = Counter()
+        self.snapshots_in_flight = 0
+        self.seq = 0
+        self.shape = None
+
+    def edit(self, x: int, y: int, char: str) -> bytes:
+        """Records a local edit and returns the message to send for it."""
+        self.in_flight.append((x, y, char))
+        self.tiles_in_flight[x, y] += 1
+        return pack_edit(x, y, char)
+
+    def replace_grid(self, grid: numpy.ndarray) -> bytes:
+        """Records that the local grid replaces the shared one and returns the message to send for it."""
+        self.in_flight.append(None)
+        self.snapshots_in_flight += 1
+        self.shape = grid.shape
+        return pack_snapshot(grid)
+
+    def receive(self, kind: bytes, header: tuple, tiles: bytes = b"") -> list[tuple]:
+        """
+        Handles a message from the server, given its unpacked header, and
+        returns a list of (UPDATE_EDIT, x, y, char) and (UPDATE_GRID, grid)
+        updates to apply in order.
+        """
+        if kind == KIND_ACK:
+            self.seq = header[1]
+            edit = self.in_flight.popleft()
+            if edit is None:
+                self.snapshots_in_flight -= 1
+                return []
+            x, y, _ = edit
+            self.tiles_in_flight[x, y] -= 1
+            if not self.tiles_in_flight[x, y]:
+                del self.tiles_in_flight[x, y]
+            return []
+
+        if kind == KIND_EDIT:
+            _, self.seq, x, y, char = header
+            if (x, y) in self.tiles_in_flight or self.snapshots_in_flight:
+                return []
+            return [(UPDATE_EDIT, x, y, char.decode("ascii"))]
+
+        _, self.seq, width, height = header
+        grid = unpack_tiles(tiles, width, height)
+        if grid is None or self.snapshots_in_flight:
+            return []
+        self.shape = grid.shape
+        updates = [(UPDATE_GRID, grid)]
+        for x, y, char in self.in_flight:
+            if x < width and y < height:
+                updates.append((UPDATE_EDIT, x, y, char))
+        return updates
+
+class CollabClient:
+    """
+    A connection to a collaboration server for the crossword maker. A
+    background thread reads from the socket, and `poll()`, called from the
+    main loop, applies what it read to the replica.
+    """
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.replica = Replica()
+        self.messages = queue.Queue()
+        self.connected = True
+        self.thread = Thread(target=self._read_main, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def connect(cls, address: str, timeout: float = 5.0) -> "CollabClient":
+        """Connects to the server at `address`. Raises OSError on failure."""
+        kind, where = parse_address(address)
+        if kind == "tcp":
+            sock = socket.create_connection(where, timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            sock.connect(where)
+        sock.settimeout(None)
+        return cls(sock)
+
+    def _read_main(self):
+        f = self.sock.makefile("rb")
+        try:
+            while True:
+                kind = f.read(1)
+                if kind == KIND_EDIT:
+                    header = RELAY.unpack(kind + f.read(RELAY.size - 1))
+                    self.messages.put((kind, header, b""))
+                elif kind == KIND_ACK:
+                    self.messages.put((kind, ACK.unpack(kind + f.read(ACK.size - 1)), b""))
+                elif kind == KIND_SNAPSHOT:
+                    header = SNAPSHOT.unpack(kind + f.read(SNAPSHOT.size - 1))
+                    tiles = f.read(header[2] * header[3])
+                    self.messages.put((kind, header, tiles))
+                else:
+                    break
+        except (OSError, struct.error):
+            pass
+        self.messages.put(None)
+
+    def send(self, data: bytes):
+        if not self.connected:
+            return
+        try:
+            self.sock.sendall(data)
+        except OSError as e:
+            print(f"[WARNING] Lost the connection to the collaboration server\n -> Reason: {e}")
+            self.connected = False
+
+    def send_edit(self, x: int, y: int, char: str):
+        if self.connected:
+            self.send(self.replica.edit(x, y, char))
+
+    def send_grid(self, grid: numpy.ndarray):
+        """Replaces the shared grid with `grid` for every other client."""
+        if self.connected:
+            self.send(self.replica.replace_grid(grid))
+
+    def poll(self) -> list[tuple]:
+        """Returns the updates received since the last call (see `Replica.receive()`)."""
+        updates = []
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                return updates
+            if message is None:
+                if self.connected:
+                    print("[WARNING] The collaboration server closed the connection")
+                self.connected = False
+                return updates
+            updates.extend(self.replica.receive(*message))
+
+    def close(self):
+        self.connected = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+class Session:
+    def __init__(self, name: str, writer: asyncio.StreamWriter):
+        self.name = name
+        self.writer = writer
+
+class CollabServer:
+    def __init__(self, grid: numpy.ndarray, path: Union[str, None] = None):
+        """
+        Parameters
+        ----------
+        grid: The grid to start from
+        path: Where to save the grid periodically, or None not to
+        """
+        self.width, self.height = grid.shape
+        self.tiles = bytearray(grid.T.tobytes())
+        self.path = path
+        self.seq = 0
+        self.saved_seq = 0
+        self.sessions = []
+        self.clients = 0
+        self.edits = 0
+
+    def get_grid(self) -> numpy.ndarray:
+        return numpy.frombuffer(bytes(self.tiles), dtype=numpy.uint8).reshape(self.height, self.width).T.copy()
+
+    def snapshot(self) -> bytes:
+        return SNAPSHOT.pack(KIND_SNAPSHOT, self.seq, self.width, self.height) + bytes(self.tiles)
+
+    def send(self, session: Session, data: bytes):
+        if session.writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+            print(f"[collab] Dropping {session.name}, which stopped reading")
+            session.writer.transport.abort()
+            return
+        session.writer.write(data)
+
+    def broadcast(self, data: bytes, skip: Union[Session, None] = None):
+        for session in list(self.sessions):
+            if session is not skip:
+                self.send(session, data)
+
+    def apply_edit(self, session: Session, x: int, y: int, char: bytes):
+        # Edits made just before a smaller grid arrived fall outside it, and
+        # are acknowledged without being applied
+        if x < self.width and y < self.height:
+            self.seq += 1
+            self.tiles[y * self.width + x] = char[0]
+            self.edits += 1
+            self.broadcast(RELAY.pack(KIND_EDIT, self.seq, x, y, char), skip=session)
+        self.send(session, ACK.pack(KIND_ACK, self.seq))
+
+    def replace_grid(self, session: Session, grid: numpy.ndarray):
+        # The sender already has the grid, and only needs to learn its place
+        # in the order
+        self.seq += 1
+        self.width, self.height = grid.shape
+        self.tiles = bytearray(grid.T.tobytes())
+        self.broadcast(self.snapshot(), skip=session)
+        self.send(session, ACK.pack(KIND_ACK, self.seq))
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients += 1
+        session = Session(f"client-{self.clients}", writer)
+        sock = writer.get_extra_info("socket")
+        if sock is not None and sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send(session, self.snapshot())
+        self.sessions.append(session)
+        try:
+            while True:
+                kind = await reader.readexactly(1)
+                if kind == KIND_EDIT:
+                    _, x, y, char = EDIT.unpack(kind + await reader.readexactly(EDIT.size - 1))
+                    if char[0] not in TILES:
+                        break
+                    self.apply_edit(session, x, y, char)
+                elif kind == KIND_SNAPSHOT:
+                    _, _, width, height = SNAPSHOT.unpack(kind + await reader.readexactly(SNAPSHOT.size - 1))
+                    grid = unpack_tiles(await reader.readexactly(width * height), width, height)
+                    if grid is None:
+                        break
+                    self.replace_grid(session, grid)
+                else:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.remove(session)
+            writer.close()
+
+    def save(self):
+        """Writes the grid to the server's file, if it changed since last time."""
+        if self.path is None or self.saved_seq == self.seq:
+            return
+        seq = self.seq
+        path_tmp = f"{self.path}.tmp{os.path.splitext(self.path)[1]}"
+        try:
+            grid_io.write_grid(path_tmp, self.get_grid())
+            os.replace(path_tmp, self.path)
+        except OSError as e:
+            print(f"[WARNING] Could not save the shared grid to {self.path}\n -> Reason: {e}")
+            return
+        self.saved_seq = seq
+
+    async def save_main(self):
+        while True:
+            await asyncio.sleep(SAVE_PERIOD)
+            self.save()
+
+async def start_server(server: CollabServer, address: str) -> asyncio.AbstractServer:
+    kind, where = parse_address(address)
+    if kind == "tcp":
+        return await asyncio.start_server(server.handle_client, where[0], where[1])
+    if os.path.exists(where):
+        os.remove(where)
+    return await asyncio.start_unix_server(server.handle_client, where)
+
+async def serve(address: str, grid: numpy.ndarray, path: Union[str, None]):
+    server = CollabServer(grid, path)
+    listener = await start_server(server, address)
+    print(f"Sharing a {server.width}x{server.height} grid on {address}")
+    saver = asyncio.create_task(server.save_main())
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        saver.cancel()
+        server.save()
+
+def parse_size(size: str) -> tuple[int, int]:
+    width, _, height = size.lower().partition("x")
+    return int(width), int(height or width)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.collab",
+                                     description="Share a grid between crossword makers for live co-editing.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port (default: %(default)s)")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--grid", help="grid file to start from and save the shared grid to")
+    parser.add_argument("--size", default="x".join(map(str, grid_io.MAX_DIM)),
+                        help="size of a new grid, as WIDTHxHEIGHT (default: %(default)s)")
+    args = parser.parse_args()
+
+    path = args.grid
+    if path is not None and os.path.exists(path):
+        try:
+            grid = grid_io.read_grid(path)
+        except (OSError, grid_io.GridFormatError) as e:
+            parser.error(f"could not read {path}: {e}")
+    else:
+        width, height = parse_size(args.size)
+        if not (0 < width <= grid_io.MAX_DIM[0] and 0 < height <= grid_io.MAX_DIM[1]):
+            parser.error(f"--size must be at most {grid_io.MAX_DIM[0]}x{grid_io.MAX_DIM[1]}")
+        grid = numpy.full((width, height), grid_io.BLANK, dtype=numpy.uint8)
+
+    address = args.socket or f"{args.host}:{args.port}"
+    try:
+        asyncio.run(serve(address, grid, path))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
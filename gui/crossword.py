@@ -3,9 +3,10 @@ import numpy
 from pathlib import Path
 from typing import Union
 
+from gui import metrics, grid_io
 from gui.vec import *
 
-MAX_CROSSWORD_DIM = (20, 20)
+MAX_CROSSWORD_DIM = grid_io.MAX_DIM
 TILE_BLANK = None
 TILE_DARK = None
 TILE_SELECTED = None
@@ -35,6 +36,11 @@ class Crossword:
         self.selected = None
         self.select_dir = VEC_RIGHT
 
+        # Functions called as `listener(at, old, new)` whenever a tile changes
+        self.edit_listeners = []
+        # Functions called as `listener()` whenever a different word is highlighted
+        self.select_listeners = []
+
         # Initialize globals for the first time
         global TILE_BLANK, TILE_DARK, TILE_SELECTED, TILE_HIGHLIGHTED, TILES_DICT
         if TILE_BLANK is None:
@@ -119,34 +125,108 @@ class Crossword:
                 break
         return dist
 
+    def get_rows(self) -> list[str]:
+        """Returns the rows of the crossword, top to bottom, as strings."""
+        return grid_io.to_rows(self.get_grid())
+
+    def set_rows(self, rows: list[str]):
+        """
+        Replaces the whole crossword with `rows`. Edit listeners are not
+        notified.
+        """
+        self.set_grid(grid_io.from_rows(rows))
+
     def get_letter(self, at: Vec) -> str:
         if self.is_valid(at):
             return self.letters[at.tp()]
         else:
             return None
     
+    def get_highlighted_range(self) -> Union[tuple[Vec, int], None]:
+        """
+        Return the first tile and the length of the word currently highlighted
+        in the crossword. If nothing is currently selected, returns None.
+        """
+        if self.selected is None:
+            return None
+        return self.get_word_range(self.selected, self.select_dir)
+
+    def get_word_range(self, at: Vec, direction: Vec) -> tuple[Vec, int]:
+        """
+        Return the first tile and the length of the word running through the
+        typable tile `at` in `direction`.
+        """
+        dist_back = self.dist_obstruction(at, direction * -1) - 1
+        length = dist_back + self.dist_obstruction(at, direction)
+        pos = at + direction * -dist_back
+
+        return pos, length
+
+    def get_word(self, pos: Vec, direction: Vec, length: int) -> str:
+        """Return the `length` tiles starting at `pos` in `direction`."""
+        return ''.join([self.letters[v.tp()] for v in VecRange(pos, direction, length)])
+
     def get_highlighted_word(self) -> Union[str, None]:
         """
         Return the word currently highlighted in the crossword. If nothing is
         currently selected, returns None.
         """
-        if self.selected is None:
+        highlighted = self.get_highlighted_range()
+        if highlighted is None:
             return None
-        
-        dist_back = self.dist_obstruction(self.selected, self.select_dir * -1) - 1
-        length = dist_back + self.dist_obstruction(self.selected, self.select_dir)
-        pos = self.selected + self.select_dir * -dist_back
-        
-        return ''.join([self.letters[v.tp()] for v in VecRange(pos, self.select_dir, length)])
+
+        pos, length = highlighted
+        return self.get_word(pos, self.select_dir, length)
+
+    def set_highlighted_word(self, word: str) -> bool:
+        """
+        Writes `word` into the currently highlighted slot. Returns False, and
+        leaves the crossword untouched, if nothing is highlighted or `word`
+        does not fit the slot exactly.
+        """
+        highlighted = self.get_highlighted_range()
+        if highlighted is None:
+            return False
+
+        pos, length = highlighted
+        if len(word) != length or not ALLOWED_LETTERS.issuperset(word.upper()):
+            return False
+
+        for letter, at in zip(word, VecRange(pos, self.select_dir, length)):
+            if self.letters[at.tp()] != letter.upper():
+                self.set_letter(letter, at)
+        return True
+
+    def write_tile(self, at: Vec, char: str):
+        """Stores `char` at `at` and notifies edit listeners if it changed."""
+        old = self.letters[at.tp()]
+        if old != char:
+            self.letters[at.tp()] = char
+            for listener in self.edit_listeners:
+                listener(at, old, char)
+
+    def set_tile(self, at: Vec, char: str):
+        """Sets the tile at `at` to a letter, a blank or a dark square."""
+        if char == CHAR_DARK:
+            if not self.is_dark(at):
+                self.set_dark(at)
+        elif self.is_dark(at):
+            self.set_blank(at)
+            if char != CHAR_BLANK:
+                self.set_letter(char, at)
+        elif char == CHAR_BLANK:
+            self.del_letter(at)
+        else:
+            self.set_letter(char, at)
 
     def set_letter(self, letter: str, at: Vec):
         if self.is_valid(at):
-            self.letters[at.tp()] = letter.upper()
+            self.write_tile(at, letter.upper())
             self.redraw_at(at)
 
     def set_blank(self, at: Vec):
         if self.is_dark(at):
-            self.letters[at.tp()] = CHAR_BLANK
+            self.write_tile(at, CHAR_BLANK)
 
             if self.is_obstructed_between(at, self.selected):
                 self.redraw_at(at)
@@ -161,10 +241,12 @@ class Crossword:
                         self.highlighted[pos.tp()] = True
                         self.redraw_at(pos)
                         pos += direction
+                else:
+                    self.redraw_at(at)
 
     def del_letter(self, at: Vec):
         if self.is_letter(at):
-            self.letters[at.tp()] = CHAR_BLANK
+            self.write_tile(at, CHAR_BLANK)
             self.redraw_at(at)
 
     def set_dark(self, at: Vec):
@@ -180,7 +262,7 @@ class Crossword:
                     self.highlighted[pos.tp()] = False
                     self.redraw_at(pos)
                     pos += direction
-            self.letters[at.tp()] = CHAR_DARK
+            self.write_tile(at, CHAR_DARK)
             self.redraw_at(at)
 
     def select(self, at: Vec, direction: Union[Vec, None] = None):
@@ -228,6 +310,9 @@ class Crossword:
                     self.highlighted[pos.tp()] = True
                     self.redraw_at(pos)
                     pos -= direction
+
+            for listener in self.select_listeners:
+                listener()
         else:
             self.selected = None
             self.redraw_at(prev_selected)
@@ -274,6 +359,8 @@ class Crossword:
     def redraw_at(self, at: Vec):
         if not self.is_valid(at):
             return
+        if metrics.enabled:
+            metrics.count("crossword.redraw_at")
 
         letter = self.letters[at.tp()]
         coord = self.offset + at * 32
@@ -304,80 +391,61 @@ class Crossword:
             for y in range(self.dimensions.Y):
                 self.redraw_at(Vec(x, y))
 
+    def get_grid(self) -> numpy.ndarray:
+        """Returns a copy of the crossword as a `uint8` grid (see gui.grid_io)."""
+        letters = self.letters[:self.dimensions.X, :self.dimensions.Y]
+        letters = numpy.where(letters == "", CHAR_BLANK, letters)
+        return letters.astype("S1").view(numpy.uint8)
+
+    def set_grid(self, grid: numpy.ndarray):
+        """
+        Replaces the whole crossword with a `uint8` grid (see gui.grid_io).
+        Edit listeners are not notified.
+        """
+        self.dimensions = Vec(grid.shape)
+        self.letters.fill(CHAR_BLANK)
+        self.highlighted.fill(False)
+        self.selected = None
+        self.select_dir = VEC_RIGHT
+        self.letters[:grid.shape[0], :grid.shape[1]] = grid.view("S1").astype(str)
+        self.redraw()
+
     def save(self, path: str, overwrite: bool) -> tuple[bool, str]:
         """
-        Saves progress in a text file at the designated path, and returns True
-        if successful.
+        Saves progress at the designated path, and returns True if successful.
+        The format is chosen by extension: `.cwg` for the compact binary
+        format, `.puz` for Across Lite, and the text format otherwise.
         Will return False when `overwrite` is False and `path` references an
         existing file, or the specified filepath was invalid for the OS.
         """
-        if overwrite:
-            options = "w"
-        else:
-            options = "x"
-
-        # Open file for writing
         try:
-            f = open(path, options)
+            grid_io.write_grid(path, self.get_grid(), overwrite)
         except Exception as e:
             return False, str(e)
 
-        f.write(f"{self.dimensions.X} {self.dimensions.Y}\n")
-        for y in range(self.dimensions.Y):
-            for x in range(self.dimensions.X):
-                letter = (self.letters[x, y])
-                if len(letter) == 0:
-                    f.write(CHAR_BLANK)
-                else:
-                    f.write(letter[0])
-            f.write('\n')
-        
         return True, None
 
     def load(self, path: str, blank=CHAR_BLANK, dark = CHAR_DARK) -> tuple[bool, str]:
         """
-        Attempts to load a crossword from the specified path.
+        Attempts to load a crossword from the specified path, in any of the
+        formats accepted by `save()`. `blank` and `dark` give the characters
+        used for blank and dark tiles in text files.
         If any errors are encountered while attempting to load and parse the
         specified file, returns (False, `reason`), where `reason` is a string
-        explaining what went wrong. Returns (True, None) if everything was ok.
+        explaining what went wrong. The current crossword is left untouched
+        in that case. Returns (True, None) if everything was ok.
         """
-        # Attempt to open file and read contents
         try:
-            f = open(path, "r")
+            grid = grid_io.read_grid(path, blank, dark)
         except FileNotFoundError:
             return False, "File not found"
-        lines = f.readlines()
+        except (OSError, grid_io.GridFormatError) as e:
+            return False, str(e)
 
-        # Parse file header
-        try:
-            dims = lines[0].split()
-            dim_x = int(dims[0])
-            dim_y = int(dims[1])
-        except (ValueError, IndexError):
-            return False, "Could not parse file header"
-
-        # Clear current data
-        self.dimensions = Vec(dim_x, dim_y)
-        self.letters.fill(CHAR_BLANK)
-        self.highlighted.fill(False)
-        self.selected = None
-        self.select_dir = VEC_RIGHT
+        if grid.shape[0] > MAX_CROSSWORD_DIM[0] or grid.shape[1] > MAX_CROSSWORD_DIM[1]:
+            return False, f"Crossword is larger than {MAX_CROSSWORD_DIM[0]}x{MAX_CROSSWORD_DIM[1]}"
 
-        for idx_line, line in enumerate(lines[1:]):
-            if (idx_line >= dim_y):
-                break
-            for idx_let, letter in enumerate(line.upper()):
-                if (idx_let >= dim_x):
-                    break
-
-                if letter == CHAR_BLANK:
-                    self.letters[idx_let, idx_line] = CHAR_BLANK
-                elif letter in ALLOWED_LETTERS or letter == CHAR_DARK:
-                    self.letters[idx_let, idx_line] = letter
-                else:
-                    return False, f"Unrecognized character: {letter}"
-        
-        # Redraw with the new data
-        self.redraw()
+        # Redraws with the new data
+        self.set_grid(grid)
 
         return True, None
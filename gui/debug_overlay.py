@@ -0,0 +1,68 @@
+from pygame.font import Font
+from pygame import Surface, Rect
+
+from gui import metrics
+from gui.vec import Vec
+from gui.suggestion_list import GlyphAtlas
+
+BLACK = (0, 0, 0)
+GREEN = (96, 255, 96)
+
+# Number of frames between refreshes of the overlay text
+REFRESH_PERIOD = 10
+
+class DebugOverlay:
+    """
+    Shows a summary of the metrics recorded by `gui.metrics`. Text is drawn
+    from a glyph atlas and only refreshed every few frames.
+    """
+    def __init__(self, corner: Vec, size: Vec, font: Font, surface: Surface):
+        self.min = corner
+        self.size = size
+        self.surface = surface
+        self.atlas = GlyphAtlas(font, GREEN)
+        self.visible = False
+        self.frames = 0
+
+    def toggle(self):
+        """Shows or hides the overlay. Showing it enables metric collection."""
+        self.visible = not self.visible
+        if self.visible:
+            metrics.enable()
+            self.frames = 0
+        else:
+            self.surface.fill(BLACK, Rect(self.min.tp(), self.size.tp()))
+
+    def draw(self):
+        if self.visible:
+            if self.frames % REFRESH_PERIOD == 0:
+                self.redraw()
+            self.frames += 1
+
+    def redraw(self):
+        self.surface.fill(BLACK, Rect(self.min.tp(), self.size.tp()))
+        y = self.min.Y
+        for line in self.get_lines():
+            self.atlas.draw(self.surface, line, (self.min.X, y), self.size.X)
+            y += self.atlas.height
+
+    def get_lines(self) -> list[str]:
+        tick = metrics.histogram("game.tick_ms")
+        inp = metrics.histogram("game.input_ms")
+        redraws = metrics.histogram("crossword.redraws_per_tick")
+        frame = metrics.histogram("game.frame_ms")
+        wait = metrics.histogram("suggester.queue_wait_ms")
+        proc = metrics.histogram("suggester.subprocess_ms")
+        parse = metrics.histogram("suggester.parse_ms")
+        size = metrics.histogram("suggester.result_size")
+
+        frame_p50 = frame.percentile(50)
+        fps = 1000 / frame_p50 if frame_p50 else 0.0
+        return [
+            f"fps {fps:.1f}  tick p50 {tick.percentile(50):.2f} p99 {tick.percentile(99):.2f} ms  "
+            f"input p50 {inp.percentile(50):.2f} ms  redraws/tick {redraws.mean():.1f} "
+            f"({metrics.get_count('crossword.redraw_at')} total)",
+            f"suggest n={proc.count}  wait p50 {wait.percentile(50):.1f} ms  "
+            f"engine p50 {proc.percentile(50):.1f} p99 {proc.percentile(99):.1f} ms  "
+            f"parse p50 {parse.percentile(50):.1f} ms  size p50 {size.percentile(50):.0f}",
+        ]
@@ -0,0 +1,405 @@
+"""
+Exhaustive fill enumeration for small grids, and fill-count estimates for
+large ones.
+
+    python -m gui.fills mini.txt                  # count every fill
+    python -m gui.fills mini.txt --list 20        # and print the first 20
+    python -m gui.fills themeless.cwg --estimate 500
+
+A fill assigns a letter to every blank tile so that every entry is a
+distinct dictionary word; letters already in the grid are kept. Fills are
+searched row by row, one across run at a time, as in a word square. Each
+entry length has a prefix trie of its words, and every column keeps its
+place in the trie of its down entry, so a run is only ever given letters
+that continue both its across word and every down word it crosses. Dead
+ends are cut as soon as any down prefix stops matching, rather than when a
+whole slot fails to match a pattern.
+
+The search is split over a process pool by the ways to fill the first row,
+and fills are streamed back as each batch of first rows finishes. Grids
+larger than 7x7 have far too many fills to count; for those, the count is
+estimated by Knuth's method, from random root-to-leaf walks of the same
+search tree, each weighted by the product of the choices along it.
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import math
+import random
+import argparse
+from time import perf_counter
+from typing import Callable, Iterator, Union
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from gui import grid_io
+from gui.slots import run_lengths
+from gui.parallel import bounded_map
+from gui.wordlist import WordIndex, DEFAULT_DICT
+
+LETTERS = 26
+# Sets of letters are bitmasks, with bit 0 for 'A'
+ALL_LETTERS = (1 << LETTERS) - 1
+# Largest grids counted exhaustively by default
+MAX_EXHAUSTIVE_DIM = 7
+# First-row choices searched per task sent to a worker
+CHUNK_SIZE = 32
+DEFAULT_SAMPLES = 200
+
+# Per-process state, set up once by `init_worker()`
+_index = None
+_tries = dict()
+
+class Trie:
+    """
+    The words of one length as a prefix trie. `children[node, letter]` is
+    the node reached from `node` by `letter` (0 for 'A'), or -1. Node 0 is
+    the root, and every node at depth `length` ends a word.
+    The search walks the trie one letter at a time, which is much faster on
+    plain lists than on NumPy arrays, so `next[node]` holds the same as a
+    list and `letters[node]` the bitmask of letters that `node` has
+    children for.
+    """
+    def __init__(self, children: numpy.ndarray, length: int):
+        self.children = children
+        self.length = length
+        self.next = children.tolist()
+        weights = (1 << numpy.arange(LETTERS, dtype=numpy.int64))
+        self.letters = ((children >= 0) * weights).sum(axis=1).tolist()
+
+    @classmethod
+    def from_rows(cls, rows: numpy.ndarray) -> Trie:
+        """Builds a trie from a sorted uint8 matrix of words, one per row, as in `WordIndex.bucket()`."""
+        count, length = rows.shape
+        codes = rows.astype(numpy.int64) - ord("A")
+        # A row starts a new node at every depth from the first letter where
+        # it differs from the row before it
+        first_diff = numpy.zeros(count, dtype=numpy.int64)
+        if count > 1:
+            first_diff[1:] = numpy.argmax(rows[1:] != rows[:-1], axis=1)
+
+        parents = numpy.zeros(count, dtype=numpy.int64)
+        edges = []
+        total = 1
+        for depth in range(length):
+            new = first_diff <= depth
+            nodes = total - 1 + numpy.cumsum(new)
+            edges.append((parents[new], codes[new, depth], nodes[new]))
+            total += int(new.sum())
+            parents = nodes
+
+        children = numpy.full((total, LETTERS), -1, dtype=numpy.int32)
+        for parent, letter, node in edges:
+            children[parent, letter] = node
+        return cls(children, length)
+
+def init_worker(index_path: str):
+    global _index
+    _index = WordIndex.attach(index_path)
+
+def get_trie(length: int) -> Trie:
+    """Returns the trie of the worker's words of `length` letters, building it on first use."""
+    trie = _tries.get(length)
+    if trie is None:
+        trie = _tries[length] = Trie.from_rows(_index.bucket(length))
+    return trie
+
+class FillSearch:
+    """
+    Depth-first search over the fills of a grid, one across run at a time
+    in reading order. Runs of a single tile are filled like any other, with
+    letters limited only by the down word through them.
+    """
+    def __init__(self, grid: numpy.ndarray, trie: Callable[[int], Trie] = get_trie):
+        self.grid = grid.copy()
+        self.trie = trie
+        width, height = grid.shape
+        open_ = grid != grid_io.DARK
+
+        # Length of the down run through every tile, and the tile's place in it
+        down = run_lengths(open_, 1)
+        up = numpy.flip(run_lengths(numpy.flip(open_, 1), 1), 1)
+        self.down_len = (down + up - 1).tolist()
+        self.down_pos = (up - 1).tolist()
+
+        fixed = (grid != grid_io.BLANK) & open_
+        self.fixed = numpy.where(fixed, 1 << (grid.astype(numpy.int64) - ord("A")).clip(0, LETTERS), ALL_LETTERS).tolist()
+        self.runs = []
+        across = run_lengths(open_, 0)
+        for y in range(height):
+            x = 0
+            while x < width:
+                if open_[x, y]:
+                    self.runs.append((y, x, int(across[x, y])))
+                    x += int(across[x, y])
+                else:
+                    x += 1
+        self.first_row = sum(1 for y, _, _ in self.runs if y == self.runs[0][0]) if self.runs else 0
+
+        self.down_node = [0] * width
+        self.used = set()
+
+    def allowed(self, x: int, y: int) -> int:
+        """Returns the bitmask of letters that may go at (x, y), given the down word so far."""
+        mask = self.fixed[x][y]
+        length = self.down_len[x][y]
+        if length > 1:
+            node = 0 if self.down_pos[x][y] == 0 else self.down_node[x]
+            mask &= self.trie(length).letters[node]
+        return mask
+
+    def options(self, run: int) -> list[bytes]:
+        """Returns every way to fill across run `run` that keeps all its down words possible."""
+        y, x0, length = self.runs[run]
+        masks = [self.allowed(x0 + i, y) for i in range(length)]
+        trie = self.trie(length) if length > 1 else None
+        letters = bytearray(length)
+        options = []
+
+        def walk(i: int, node: int):
+            if i == length:
+                options.append(bytes(letters))
+                return
+            mask = masks[i] if trie is None else masks[i] & trie.letters[node]
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                letter = bit.bit_length() - 1
+                letters[i] = ord("A") + letter
+                walk(i + 1, trie.next[node][letter] if trie is not None else 0)
+
+        walk(0, 0)
+        return options
+
+    def place(self, run: int, word: bytes) -> Union[tuple[list[int], list[bytes]], None]:
+        """
+        Writes `word` into across run `run` and advances the down words
+        through it. Returns what `unplace()` needs to undo this, or None,
+        leaving the grid unchanged, if an entry would be repeated.
+        """
+        y, x0, length = self.runs[run]
+        if length > 1 and word in self.used:
+            return None
+        saved = self.down_node[x0:x0 + length]
+        self.grid[x0:x0 + length, y] = numpy.frombuffer(word, dtype=numpy.uint8)
+        added = [word] if length > 1 else []
+        if added:
+            self.used.add(word)
+        for i in range(length):
+            x = x0 + i
+            down_len = self.down_len[x][y]
+            if down_len < 2:
+                continue
+            node = 0 if self.down_pos[x][y] == 0 else self.down_node[x]
+            self.down_node[x] = self.trie(down_len).next[node][word[i] - ord("A")]
+            if self.down_pos[x][y] == down_len - 1:
+                down_word = self.grid[x, y - down_len + 1:y + 1].tobytes()
+                if down_word in self.used:
+                    self.unplace(run, (saved, added))
+                    return None
+                self.used.add(down_word)
+                added.append(down_word)
+        return saved, added
+
+    def unplace(self, run: int, undo: tuple[list[int], list[bytes]]):
+        y, x0, length = self.runs[run]
+        saved, added = undo
+        self.down_node[x0:x0 + length] = saved
+        self.used.difference_update(added)
+
+    def fills(self, run: int = 0, stop: Union[int, None] = None) -> Iterator[list[bytes]]:
+        """
+        Yields the words of runs `run` to `stop` (by default, the last) for
+        every fill, given the runs before `run`. The grid holds the fill
+        while it is yielded.
+        """
+        stop = len(self.runs) if stop is None else stop
+        if run == stop:
+            yield []
+            return
+        for word in self.options(run):
+            undo = self.place(run, word)
+            if undo is None:
+                continue
+            for rest in self.fills(run + 1, stop):
+                yield [word] + rest
+            self.unplace(run, undo)
+
+    def count(self, run: int = 0) -> int:
+        """Returns the number of fills, given the runs before `run`."""
+        if run == len(self.runs):
+            return 1
+        total = 0
+        for word in self.options(run):
+            undo = self.place(run, word)
+            if undo is not None:
+                total += self.count(run + 1)
+                self.unplace(run, undo)
+        return total
+
+    def sample(self, rng: random.Random) -> float:
+        """
+        Walks to a random leaf of the search tree and returns the product of
+        the number of choices along the way, or 0 at a dead end. Its mean
+        over many walks is the number of fills. Leaves the search unchanged.
+        """
+        weight = 1.0
+        undos = []
+        try:
+            for run in range(len(self.runs)):
+                options = self.options(run)
+                if not options:
+                    return 0.0
+                weight *= len(options)
+                undo = self.place(run, rng.choice(options))
+                if undo is None:
+                    return 0.0
+                undos.append((run, undo))
+            return weight
+        finally:
+            for run, undo in reversed(undos):
+                self.unplace(run, undo)
+
+def apply_prefix(search: FillSearch, prefix: list[bytes]) -> list:
+    return [search.place(run, word) for run, word in enumerate(prefix)]
+
+def undo_prefix(search: FillSearch, undos: list):
+    for run in reversed(range(len(undos))):
+        search.unplace(run, undos[run])
+
+def list_chunk(task: tuple[numpy.ndarray, list[list[bytes]], Union[int, None]]) -> list[list[str]]:
+    """Returns up to `keep` fills, as rows, following a chunk of first-row choices."""
+    grid, prefixes, keep = task
+    search = FillSearch(grid)
+    fills = []
+    for prefix in prefixes:
+        undos = apply_prefix(search, prefix)
+        for _ in search.fills(len(prefix)):
+            fills.append(grid_io.to_rows(search.grid))
+            if keep is not None and len(fills) >= keep:
+                return fills
+        undo_prefix(search, undos)
+    return fills
+
+def count_chunk(task: tuple[numpy.ndarray, list[list[bytes]]]) -> int:
+    """Returns the number of fills following a chunk of first-row choices."""
+    grid, prefixes = task
+    search = FillSearch(grid)
+    total = 0
+    for prefix in prefixes:
+        undos = apply_prefix(search, prefix)
+        total += search.count(len(prefix))
+        undo_prefix(search, undos)
+    return total
+
+def sample_chunk(task: tuple[numpy.ndarray, int, int]) -> list[float]:
+    grid, samples, seed = task
+    search = FillSearch(grid)
+    rng = random.Random(seed)
+    return [search.sample(rng) for _ in range(samples)]
+
+def first_rows(grid: numpy.ndarray) -> Iterator[list[list[bytes]]]:
+    """Yields the ways to fill the first row, in chunks of CHUNK_SIZE."""
+    search = FillSearch(grid)
+    chunk = []
+    for prefix in search.fills(0, search.first_row):
+        chunk.append(prefix)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_fills(grid: numpy.ndarray, index_path: str, workers: int = os.cpu_count(),
+               limit: Union[int, None] = None) -> Iterator[list[str]]:
+    """
+    Yields up to `limit` fills of `grid` as rows (see `grid_io.to_rows()`),
+    as soon as the batch of first-row choices each belongs to is searched.
+    Fills come in no particular order.
+    """
+    init_worker(index_path)
+    found = 0
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(index_path,)) as executor:
+        tasks = ((grid, chunk, limit) for chunk in first_rows(grid))
+        for fills in bounded_map(executor, list_chunk, tasks, workers * 2):
+            for rows in fills:
+                yield rows
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+
+def count_fills(grid: numpy.ndarray, index_path: str, workers: int = os.cpu_count()) -> int:
+    """Returns the number of fills of `grid`."""
+    init_worker(index_path)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(index_path,)) as executor:
+        tasks = ((grid, chunk) for chunk in first_rows(grid))
+        return sum(bounded_map(executor, count_chunk, tasks, workers * 2))
+
+def estimate_fills(grid: numpy.ndarray, index_path: str, samples: int = DEFAULT_SAMPLES,
+                   seed: int = 0, workers: int = os.cpu_count()) -> tuple[float, float]:
+    """
+    Estimates the number of fills of `grid` from `samples` random walks.
+    Returns the estimate and its standard error.
+    """
+    per_task = max(1, math.ceil(samples / (4 * workers)))
+    tasks = [(grid, min(per_task, samples - start), seed + i)
+             for i, start in enumerate(range(0, samples, per_task))]
+    weights = []
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(index_path,)) as executor:
+        for chunk in executor.map(sample_chunk, tasks):
+            weights.extend(chunk)
+    weights = numpy.array(weights)
+    stderr = weights.std(ddof=1) / math.sqrt(len(weights)) if len(weights) > 1 else math.inf
+    return float(weights.mean()), float(stderr)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.fills",
+                                     description="Count, list or estimate the fills of a grid.")
+    parser.add_argument("path", help="grid file; letters already in it are kept")
+    parser.add_argument("--list", type=int, default=0, metavar="N", help="print up to N fills instead of counting")
+    parser.add_argument("--estimate", type=int, nargs="?", const=DEFAULT_SAMPLES, metavar="SAMPLES",
+                        help="estimate the count from random samples (the default for grids over "
+                             f"{MAX_EXHAUSTIVE_DIM}x{MAX_EXHAUSTIVE_DIM})")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --estimate")
+    parser.add_argument("--dict", default=str(DEFAULT_DICT), help="dictionary file (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    try:
+        grid = grid_io.read_grid(args.path)
+    except (OSError, grid_io.GridFormatError) as e:
+        parser.error(f"Could not read {args.path}: {e}")
+    _, index_path = WordIndex.cached(args.dict)
+    index_path = str(index_path)
+
+    time_start = perf_counter()
+    result = {"file": args.path}
+    if args.list:
+        fills = []
+        for rows in iter_fills(grid, index_path, args.workers, args.list):
+            fills.append(rows)
+            if not args.json:
+                print("\n".join(rows) + "\n")
+        result["fills"] = fills
+    elif args.estimate is not None or max(grid.shape) > MAX_EXHAUSTIVE_DIM:
+        samples = args.estimate or DEFAULT_SAMPLES
+        estimate, stderr = estimate_fills(grid, index_path, samples, args.seed, args.workers)
+        result.update(estimate=estimate, stderr=stderr, samples=samples)
+        if not args.json:
+            print(f"About {estimate:.4g} fills (standard error {stderr:.2g}, {samples} samples)")
+    else:
+        result["count"] = count_fills(grid, index_path, args.workers)
+        if not args.json:
+            print(f"{result['count']} fills")
+    result["time_s"] = round(perf_counter() - time_start, 3)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"Finished in {result['time_s']:.2f} s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 import pygame
 from pathlib import Path
 from enum import Enum
+from threading import Thread
 
-from gui import suggester
+from gui import suggester, metrics, validate, collab
 from gui.game_input import *
 from gui.vec import *
 from gui.text_box import TextBox
-from gui.crossword import Crossword
+from gui.crossword import Crossword, CHAR_BLANK
 from gui.clickable import ClickIcon
+from gui.suggestion_list import SuggestionList, ROWS_PER_WHEEL_STEP
+from gui.debug_overlay import DebugOverlay
+from gui.journal import Journal
 
 REPEATABLE_KEYS = ARROW_KEY_SET.union({pygame.K_BACKSPACE})
 SUG_BTN_MIN = Vec(720, 80)
@@ -15,13 +19,23 @@ BTN_SIZE = Vec(64, 64)
 CW_MIN = Vec(40, 40)
 CW_SIZE = Vec(640, 640)
 CW_MAX = CW_MIN + CW_SIZE
+SUG_LIST_MIN = Vec(700, 160)
+SUG_LIST_SIZE = Vec(240, 520)
+OVERLAY_MIN = Vec(40, 684)
+OVERLAY_SIZE = Vec(900, 36)
+# When a word has no matches, suggest words differing in up to this many letters
+NEAR_MISS_MISMATCHES = 2
+STATUS_MIN = Vec(796, 104)
+STATUS_SIZE = Vec(160, 20)
 
 class InputMode(Enum):
     CROSSWORD = 0
     TEXT_ENTRY = 1
 
 class Game:
-    def __init__(self, disp_size: tuple[int], screen: pygame.Surface):
+    def __init__(self, disp_size: tuple[int], screen: pygame.Surface,
+                 inp: InputHandler = None, journal: Journal = None,
+                 collab_client: collab.CollabClient = None, load_words: bool = True):
         # Important numbers
         self.disp_size = Vec(disp_size[0], disp_size[1])
         self.input_mode = InputMode.CROSSWORD
@@ -34,27 +48,75 @@ class Game:
         self.font = pygame.font.SysFont(None, 40)
         self.screen = screen
         self.cw = Crossword((20, 20), self.font, screen, CW_MIN)
-        self.inp = InputHandler(REPEATABLE_KEYS)
+        self.inp = inp if inp is not None else InputHandler(REPEATABLE_KEYS)
         self.text = TextBox(pygame.font.SysFont(None, 32), (255,)*3, 400, 2)
         sug_button = ClickIcon(SUG_BTN_MIN, SUG_BTN_MIN + BTN_SIZE, self.request_suggestion,
                                screen, images_dir.joinpath("button_suggest.png"))
         self.buttons = [sug_button]
+        self.sug_list = SuggestionList(SUG_LIST_MIN, SUG_LIST_SIZE, pygame.font.SysFont(None, 24),
+                                       screen, self.accept_suggestion)
+        self.overlay = DebugOverlay(OVERLAY_MIN, OVERLAY_SIZE, pygame.font.SysFont(None, 18), screen)
+        self.status_font = pygame.font.SysFont(None, 20)
+        self.status_text = None
         
         # State and side functions
         self.exec_func = None
         self.awaiting_suggestion = False
+        self.suggestion_pattern = None
+        self.awaiting_near_misses = False
+
+        # Dictionary words for validating the grid on save and load, loaded
+        # in the background. Until then, or without `load_words`, only the
+        # layout is checked.
+        self.words = None
+        if load_words:
+            Thread(target=self.load_words, daemon=True).start()
+
+        # Edit journal, for autosave and undo/redo. Picks up where the last
+        # session left off if the journal has anything to recover.
+        self.journal = journal if journal is not None else Journal(None)
+        recovered = self.journal.recover()
+        if recovered is not None:
+            dims, rows = recovered
+            self.cw.set_rows(rows)
+            self.cw.select(Vec(0, 0), VEC_RIGHT)
+            print(f"Recovered autosaved {dims[0]}x{dims[1]} crossword")
+        self.journal.start(self.cw.dimensions.tp(), self.cw.get_rows())
+        self.cw.edit_listeners.append(self.record_edit)
+        self.cw.select_listeners.append(self.prefetch_suggestions)
+
+        # Live co-editing. Edits from collaborators are applied as they
+        # arrive, and are neither sent back nor undoable.
+        self.collab = collab_client
+        self.applying_remote = False
 
     def tick(self):
-        if not pygame.key.get_focused():
+        self.sync_collab()
+        if self.input_mode == InputMode.CROSSWORD:
+            self.draw_status()
+        if not self.inp.is_focused():
             return
 
-        # Get fresh input
-        self.inp.update()
+        with metrics.timed("game.tick_ms"):
+            redraws = metrics.get_count("crossword.redraw_at")
+
+            # Get fresh input
+            with metrics.timed("game.input_ms"):
+                self.inp.update()
+
+            if self.input_mode == InputMode.CROSSWORD:
+                self.handle_mode_crossword()
+            elif self.input_mode == InputMode.TEXT_ENTRY:
+                self.handle_mode_text_entry()
+
+            metrics.record("crossword.redraws_per_tick",
+                           metrics.get_count("crossword.redraw_at") - redraws)
 
         if self.input_mode == InputMode.CROSSWORD:
-            self.handle_mode_crossword()
-        elif self.input_mode == InputMode.TEXT_ENTRY:
-            self.handle_mode_text_entry()
+            self.overlay.draw()
+
+    def recv_event(self, event: pygame.event.Event):
+        self.inp.recv_event(event)
 
     # ------------------------ #
     # Input handling functions #
@@ -63,10 +125,30 @@ class Game:
     def handle_mode_crossword(self):
         # Check if currently awaiting any output from the word suggester
         if self.awaiting_suggestion:
-            suggestions = suggester.get_result()
-            if suggestions is not None:
-                print(suggestions)
-                self.awaiting_suggestion = False
+            page = suggester.get_page()
+            if page is not None:
+                words, done = page
+                if self.awaiting_near_misses:
+                    self.extend_near_misses(words, done)
+                else:
+                    entries = [suggester.split_display(line) for line in words]
+                    self.sug_list.extend([word for word, _ in entries], done,
+                                         [display for _, display in entries])
+                self.awaiting_suggestion = not done
+
+                # Nothing fits, so offer words that would need a few crossing
+                # letters changed instead
+                if done and not self.sug_list.words and not self.awaiting_near_misses \
+                        and self.suggestion_pattern.strip("*"):
+                    self.awaiting_suggestion = True
+                    self.awaiting_near_misses = True
+                    self.sug_list.clear(near_misses=True)
+                    suggester.send_request(self.suggestion_pattern, max_mismatches=NEAR_MISS_MISMATCHES)
+
+        # The suggestion list scrolls with the mouse wheel while hovered
+        if self.inp.wheel and self.sug_list.in_range(self.inp.mpos):
+            self.sug_list.scroll(-self.inp.wheel * ROWS_PER_WHEEL_STEP)
+        self.sug_list.set_hover(self.inp.mpos)
 
         # Check key combos
         if self.inp.any_down(pygame.K_LCTRL, pygame.K_RCTRL):
@@ -76,6 +158,11 @@ class Game:
             # CTRL+L initiates load script
             elif self.inp.get_state(pygame.K_l) == ButtonState.PRESSED:
                 self.begin_mode_text_entry(self.attempt_load)
+            # CTRL+Z undoes and CTRL+Y redoes the last edit
+            elif self.inp.get_state(pygame.K_z) == ButtonState.PRESSED:
+                self.journal.undo(self.apply_edit)
+            elif self.inp.get_state(pygame.K_y) == ButtonState.PRESSED:
+                self.journal.redo(self.apply_edit)
         # LMB Selects a tile or clicks a button
         elif self.inp.get_state(LMB) == ButtonState.PRESSED:
             if self.inp.mpos.in_rect(CW_MIN, CW_MAX):
@@ -84,6 +171,7 @@ class Game:
             else:
                 for btn in self.buttons:
                     btn.click_if_in_range(self.inp.mpos)
+                self.sug_list.click_if_in_range(self.inp.mpos)
         # RMB Toggles darks and blanks
         elif self.inp.get_state(RMB) == ButtonState.PRESSED:
             tile_coord = self.get_tile_coord(self.inp.mpos)
@@ -115,6 +203,11 @@ class Game:
                         self.cw.select_next_typable(VEC_LEFT)
                     elif key == pygame.K_RIGHT:
                         self.cw.select_next_typable(VEC_RIGHT)
+                    # F3 shows or hides the debug overlay
+                    elif key == pygame.K_F3:
+                        self.overlay.toggle()
+
+        self.sug_list.draw()
 
     def handle_mode_text_entry(self):
         # ctrl + backspace clears entire text box
@@ -161,8 +254,101 @@ class Game:
             word = self.cw.get_highlighted_word()
             if word is not None:
                 self.awaiting_suggestion = True
+                self.suggestion_pattern = word
+                self.awaiting_near_misses = False
+                self.sug_list.clear()
                 suggester.send_request(word)
 
+    def prefetch_suggestions(self):
+        """
+        Asks the suggester to prepare suggestions for the highlighted word and
+        every word crossing it, so that they appear at once when requested.
+        """
+        highlighted = self.cw.get_highlighted_range()
+        if highlighted is None:
+            suggester.prefetch([])
+            return
+
+        pos, length = highlighted
+        direction = self.cw.select_dir
+        cross_dir = VEC_DOWN if direction == VEC_RIGHT else VEC_RIGHT
+        patterns = [self.cw.get_word(pos, direction, length)]
+        for at in VecRange(pos, direction, length):
+            cross_pos, cross_length = self.cw.get_word_range(at, cross_dir)
+            if cross_length > 1:
+                patterns.append(self.cw.get_word(cross_pos, cross_dir, cross_length))
+        suggester.prefetch([pattern for pattern in patterns if CHAR_BLANK in pattern])
+
+    def extend_near_misses(self, lines: list[str], done: bool):
+        """Adds near misses to the list, with the letters to change in lowercase."""
+        words = []
+        labels = []
+        for line in lines:
+            word, positions = suggester.parse_near_miss(line)
+            _, display = suggester.split_display(line)
+            # Positions count letters only, not a phrase's punctuation
+            letter_idx = [i for i, c in enumerate(display) if c.isalpha()]
+            label = list(display)
+            for pos in positions:
+                label[letter_idx[pos]] = label[letter_idx[pos]].lower()
+            words.append(word)
+            labels.append("".join(label))
+        self.sug_list.extend(words, done, labels)
+
+    def accept_suggestion(self, word: str):
+        self.journal.begin_group()
+        if not self.cw.set_highlighted_word(word):
+            print(f"[WARNING] {word} does not fit the highlighted word")
+        self.journal.end_group()
+
+    def record_edit(self, at: Vec, old: str, new: str):
+        self.journal.record(at.X, at.Y, old, new, undoable=not self.applying_remote)
+        if self.collab is not None and not self.applying_remote:
+            self.collab.send_edit(at.X, at.Y, new)
+
+    def apply_edit(self, x: int, y: int, char: str):
+        self.cw.set_tile(Vec(x, y), char)
+
+    def sync_collab(self):
+        """Applies the edits and grids received from the collaboration server."""
+        if self.collab is None:
+            return
+        updates = self.collab.poll()
+        if not updates:
+            return
+        with metrics.timed("game.collab_sync_ms"):
+            self.applying_remote = True
+            try:
+                for update in updates:
+                    if update[0] == collab.UPDATE_EDIT:
+                        _, x, y, char = update
+                        self.apply_edit(x, y, char)
+                    else:
+                        self.cw.set_grid(update[1])
+                        self.cw.select(Vec(0, 0), VEC_RIGHT)
+                        self.journal.start(self.cw.dimensions.tp(), self.cw.get_rows())
+            finally:
+                self.applying_remote = False
+
+    def shutdown(self):
+        self.journal.close()
+        if self.collab is not None:
+            self.collab.close()
+
+    def load_words(self):
+        try:
+            self.words = validate.WordSet.from_dictionaries(suggester.get_dictionaries(), suggester.get_stack())
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Could not load words for validation\n -> Reason: {e}")
+
+    def check_grid(self) -> list[validate.Problem]:
+        """Validates the whole crossword, and reports any problems found."""
+        with metrics.timed("game.validate_ms"):
+            problems = validate.validate(self.cw.get_grid(), self.words)
+        for problem in problems:
+            print(f"[WARNING] {problem}")
+        return problems
+
     # ----------------- #
     # Utility functions #
     # ----------------- #
@@ -179,6 +365,7 @@ class Game:
         if len(path):
             success, reason = self.cw.save(path, overwrite)
             if success:
+                self.check_grid()
                 return True
             else:
                 print(f"[WARNING] Could not save at {path}\n -> Reason: {reason}")
@@ -189,6 +376,10 @@ class Game:
         if len(path):
             success, reason = self.cw.load(path)
             if success:
+                self.journal.start(self.cw.dimensions.tp(), self.cw.get_rows())
+                if self.collab is not None:
+                    self.collab.send_grid(self.cw.get_grid())
+                self.check_grid()
                 return True
             else:
                 print(f"[WARNING] Could not load {path}\n -> Reason: {reason}")
@@ -197,3 +388,15 @@ class Game:
     def draw_buttons(self):
         for btn in self.buttons:
             btn.draw()
+        self.sug_list.redraw()
+        self.status_text = None
+        self.draw_status()
+
+    def draw_status(self):
+        """Shows whether the word suggester has finished loading."""
+        count = suggester.get_word_count()
+        text = "Loading words..." if count is None else f"{count:,} words"
+        if text != self.status_text:
+            self.status_text = text
+            self.screen.fill((0, 0, 0), pygame.Rect(STATUS_MIN.tp(), STATUS_SIZE.tp()))
+            self.screen.blit(self.status_font.render(text, True, (160,)*3), STATUS_MIN.tp())
@@ -80,6 +80,7 @@ SPECIAL_KEY_SET = set([
     pygame.K_LSHIFT,
     pygame.K_RSHIFT,
     pygame.K_CAPSLOCK,
+    pygame.K_F3,
 ])
 
 ARROW_KEY_SET = set([
@@ -178,6 +179,8 @@ class InputHandler:
         all_buttons = ALL_KEYS_SET.union(MB_SET) - repeatable_keys
 
         self.mpos = Vec(0, 0)
+        self.wheel = 0
+        self.wheel_accum = 0
         self.buttons = dict()
         for key in all_buttons:
             self.buttons[key] = Button()
@@ -191,8 +194,17 @@ class InputHandler:
         mbs = pygame.mouse.get_pressed()
         keys = pygame.key.get_pressed()
 
-        # Update state based on input
+        self.apply(time, mpos, mbs, keys)
+
+    def apply(self, time: int, mpos: tuple[int], mbs: tuple[bool], keys):
+        """
+        Updates all button states from raw input. `mbs` holds the state of the
+        left, middle and right mouse buttons, and `keys` is indexable by key
+        code, like the result of `pygame.key.get_pressed()`.
+        """
         self.mpos = Vec(mpos)
+        self.wheel = self.wheel_accum
+        self.wheel_accum = 0
         for idx, mb in enumerate(MB_SET):
             self.buttons[mb].update(mbs[idx])
         for key in ALL_KEYS_SET:
@@ -202,6 +214,17 @@ class InputHandler:
             elif type(btn) == RepeatableButton:
                 btn.update(keys[key], time)
 
+    def recv_event(self, event: pygame.event.Event):
+        """
+        Receives events that cannot be polled, such as mouse wheel motion.
+        Wheel motion is accumulated until the next `update()`.
+        """
+        if event.type == pygame.MOUSEWHEEL:
+            self.wheel_accum += event.y
+
+    def is_focused(self) -> bool:
+        return pygame.key.get_focused()
+
     def get_state(self, key: int) -> int:
         return self.buttons.get(key).state
 
@@ -0,0 +1,373 @@
+"""
+Reading and writing crossword grids, without any dependency on pygame.
+
+Grids are NumPy `uint8` arrays of ASCII codes indexed as `grid[x, y]`, the
+same layout as `Crossword.letters`. Letters are stored uppercase, blanks as
+`*` and dark squares as `#`.
+
+Three formats are supported, chosen by file extension:
+ * `.txt` (or anything else): the text format written by `Crossword.save`,
+   a "width height" header followed by one line per row.
+ * `.cwg`: a compact binary format. An 8-byte header (magic, width, height,
+   flags) is followed by the cells in row-major order and, if flagged, one
+   byte of metadata per cell (for example circled squares).
+ * `.puz`: the Across Lite format. Only the solution grid is imported; clues
+   are exported empty.
+"""
+import os
+import sys
+import struct
+import tarfile
+from pathlib import Path
+from typing import Iterable, Iterator, Union
+
+import numpy
+
+BLANK = ord("*")
+DARK = ord("#")
+LETTERS = numpy.arange(ord("A"), ord("Z") + 1, dtype=numpy.uint8)
+
+# Largest grid the editor can display
+MAX_DIM = (20, 20)
+
+CWG_HEADER = struct.Struct("<4sBBBB")
+CWG_MAGIC = b"CWG1"
+CWG_FLAG_META = 0x01
+CWG_EXT = ".cwg"
+
+PUZ_EXT = ".puz"
+PUZ_MAGIC = b"ACROSS&DOWN\0"
+PUZ_HEADER = struct.Struct("<H12sH4s4s4sH2s12sBBHHH")
+PUZ_VERSION = b"1.3\0"
+PUZ_MASK = b"ICHEATED"
+PUZ_DARK = ord(".")
+PUZ_EMPTY = ord("-")
+# Extensions of the grid files found when walking a directory
+GRID_EXTS = {CWG_EXT, PUZ_EXT, ".txt"}
+
+class GridFormatError(ValueError):
+    pass
+
+# ---------------- #
+# Grid conversions #
+# ---------------- #
+
+def normalize(cells: numpy.ndarray, blank: int = BLANK, dark: int = DARK) -> numpy.ndarray:
+    """
+    Uppercases letters and maps custom blank and dark characters to the
+    standard ones, in place. Raises GridFormatError listing every cell that
+    holds anything else. `cells` is indexed [x, y].
+    """
+    lower = (cells >= ord("a")) & (cells <= ord("z"))
+    cells[lower] -= 32
+    if blank != BLANK or dark != DARK:
+        is_blank = cells == blank
+        is_dark = cells == dark
+        cells[is_blank] = BLANK
+        cells[is_dark] = DARK
+
+    valid = (cells == BLANK) | (cells == DARK) | ((cells >= ord("A")) & (cells <= ord("Z")))
+    if not valid.all():
+        bad = numpy.argwhere(~valid)
+        shown = ", ".join(f"{chr(cells[x, y])!r} at ({x}, {y})" for x, y in bad[:5])
+        more = f" and {len(bad) - 5} more" if len(bad) > 5 else ""
+        raise GridFormatError(f"Unrecognized characters: {shown}{more}")
+    return cells
+
+def to_rows(grid: numpy.ndarray) -> list[str]:
+    return [row.tobytes().decode("ascii") for row in grid.T]
+
+def from_rows(rows: list[str]) -> numpy.ndarray:
+    width = max((len(row) for row in rows), default=0)
+    grid = numpy.full((len(rows), width), BLANK, dtype=numpy.uint8)
+    for y, row in enumerate(rows):
+        grid[y, :len(row)] = numpy.frombuffer(row.encode("ascii"), dtype=numpy.uint8)
+    return normalize(grid.T.copy())
+
+def slot_starts(grid: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Returns boolean arrays marking the tiles that begin an across word and
+    a down word, respectively. Words are at least two tiles long.
+    """
+    open_ = grid != DARK
+    before_x = numpy.zeros_like(open_)
+    before_x[1:, :] = open_[:-1, :]
+    after_x = numpy.zeros_like(open_)
+    after_x[:-1, :] = open_[1:, :]
+    before_y = numpy.zeros_like(open_)
+    before_y[:, 1:] = open_[:, :-1]
+    after_y = numpy.zeros_like(open_)
+    after_y[:, :-1] = open_[:, 1:]
+    return open_ & ~before_x & after_x, open_ & ~before_y & after_y
+
+# ----------- #
+# Text format #
+# ----------- #
+
+def parse_text(data: bytes, blank: str = "*", dark: str = "#") -> numpy.ndarray:
+    lines = data.splitlines()
+    try:
+        dims = lines[0].split()
+        dim_x = int(dims[0])
+        dim_y = int(dims[1])
+    except (ValueError, IndexError):
+        raise GridFormatError("Could not parse file header")
+    if dim_x < 0 or dim_y < 0:
+        raise GridFormatError("Could not parse file header")
+
+    # Missing rows and short lines are treated as blank
+    cells = numpy.full((dim_y, dim_x), ord(blank), dtype=numpy.uint8)
+    for y, line in enumerate(lines[1:dim_y + 1]):
+        line = line[:dim_x]
+        cells[y, :len(line)] = numpy.frombuffer(line, dtype=numpy.uint8)
+    return normalize(cells.T.copy(), ord(blank), ord(dark))
+
+def format_text(grid: numpy.ndarray) -> bytes:
+    width, height = grid.shape
+    rows = numpy.empty((height, width + 1), dtype=numpy.uint8)
+    rows[:, :width] = grid.T
+    rows[:, width] = ord("\n")
+    return f"{width} {height}\n".encode("ascii") + rows.tobytes()
+
+# ------------- #
+# Binary format #
+# ------------- #
+
+def parse_binary(data: bytes) -> tuple[numpy.ndarray, Union[numpy.ndarray, None]]:
+    """Returns (grid, metadata), where metadata is None if not stored."""
+    try:
+        magic, width, height, flags, _ = CWG_HEADER.unpack_from(data)
+    except struct.error:
+        raise GridFormatError("File too short for a grid header")
+    if magic != CWG_MAGIC:
+        raise GridFormatError("Not a binary grid file")
+
+    size = width * height
+    has_meta = bool(flags & CWG_FLAG_META)
+    if len(data) < CWG_HEADER.size + size * (2 if has_meta else 1):
+        raise GridFormatError("Grid file is truncated")
+
+    body = numpy.frombuffer(data, dtype=numpy.uint8, offset=CWG_HEADER.size)
+    grid = normalize(body[:size].reshape(height, width).T.copy())
+    meta = body[size:size * 2].reshape(height, width).T.copy() if has_meta else None
+    return grid, meta
+
+def format_binary(grid: numpy.ndarray, meta: numpy.ndarray = None) -> bytes:
+    width, height = grid.shape
+    flags = CWG_FLAG_META if meta is not None else 0
+    data = CWG_HEADER.pack(CWG_MAGIC, width, height, flags, 0) + grid.T.tobytes()
+    if meta is not None:
+        data += meta.astype(numpy.uint8).T.tobytes()
+    return data
+
+# ---------- #
+# PUZ format #
+# ---------- #
+
+def puz_checksum(data: bytes, cksum: int = 0) -> int:
+    for byte in data:
+        cksum = ((cksum >> 1) | ((cksum & 1) << 15)) + byte
+        cksum &= 0xFFFF
+    return cksum
+
+def parse_puz(data: bytes) -> numpy.ndarray:
+    """Returns the solution grid of an Across Lite puzzle."""
+    idx_magic = data.find(PUZ_MAGIC)
+    if idx_magic < 2:
+        raise GridFormatError("Not an Across Lite puzzle")
+    data = data[idx_magic - 2:]
+    try:
+        header = PUZ_HEADER.unpack_from(data)
+    except struct.error:
+        raise GridFormatError("Puzzle header is truncated")
+    width, height = header[9], header[10]
+    size = width * height
+    if len(data) < PUZ_HEADER.size + size:
+        raise GridFormatError("Puzzle grid is truncated")
+
+    solution = numpy.frombuffer(data, dtype=numpy.uint8, count=size, offset=PUZ_HEADER.size)
+    cells = solution.reshape(height, width).T.copy()
+    cells[cells == PUZ_DARK] = DARK
+    cells[cells == PUZ_EMPTY] = BLANK
+    return normalize(cells)
+
+def format_puz(grid: numpy.ndarray, title: str = "", author: str = "", copyright: str = "") -> bytes:
+    """
+    Encodes `grid` as an Across Lite puzzle with an empty clue for every
+    word. Blank tiles are stored as '-' in the solution.
+    """
+    width, height = grid.shape
+    cells = grid.T.copy()
+    cells[cells == DARK] = PUZ_DARK
+    cells[cells == BLANK] = PUZ_EMPTY
+    solution = cells.tobytes()
+    state = numpy.where(cells == PUZ_DARK, PUZ_DARK, PUZ_EMPTY).astype(numpy.uint8).tobytes()
+
+    across, down = slot_starts(grid)
+    num_clues = int(across.sum() + down.sum())
+    strings = [s.encode("latin-1", "replace") for s in (title, author, copyright)]
+    clues = [b""] * num_clues
+
+    cib = struct.pack("<BBHHH", width, height, num_clues, 1, 0)
+    c_cib = puz_checksum(cib)
+    c_sol = puz_checksum(solution)
+    c_grid = puz_checksum(state)
+    c_part = 0
+    for s in strings:
+        if s:
+            c_part = puz_checksum(s + b"\0", c_part)
+    for clue in clues:
+        c_part = puz_checksum(clue, c_part)
+    c_file = puz_checksum(solution, c_cib)
+    c_file = puz_checksum(state, c_file)
+    for s in strings:
+        if s:
+            c_file = puz_checksum(s + b"\0", c_file)
+    for clue in clues:
+        c_file = puz_checksum(clue, c_file)
+
+    sums = (c_cib, c_sol, c_grid, c_part)
+    masked_low = bytes(PUZ_MASK[i] ^ (sums[i] & 0xFF) for i in range(4))
+    masked_high = bytes(PUZ_MASK[i + 4] ^ (sums[i] >> 8) for i in range(4))
+
+    header = PUZ_HEADER.pack(c_file, PUZ_MAGIC, c_cib, masked_low, masked_high,
+                             PUZ_VERSION, 0, b"\0" * 2, b"\0" * 12,
+                             width, height, num_clues, 1, 0)
+    body = b"".join(s + b"\0" for s in strings) + b"".join(c + b"\0" for c in clues) + b"\0"
+    return header + solution + state + body
+
+# ------------------- #
+# Files and archives #
+# ------------------- #
+
+def parse_grid(data: bytes, name: str, blank: str = "*", dark: str = "#") -> numpy.ndarray:
+    """Parses `data` in the format implied by the extension of `name`."""
+    ext = os.path.splitext(name)[1].lower()
+    if ext == CWG_EXT:
+        return parse_binary(data)[0]
+    elif ext == PUZ_EXT:
+        return parse_puz(data)
+    else:
+        return parse_text(data, blank, dark)
+
+def read_grid(path: Union[str, Path], blank: str = "*", dark: str = "#") -> numpy.ndarray:
+    with open(path, "rb") as f:
+        return parse_grid(f.read(), str(path), blank, dark)
+
+def write_grid(path: Union[str, Path], grid: numpy.ndarray, overwrite: bool = True,
+               meta: numpy.ndarray = None):
+    """
+    Writes `grid` in the format implied by the extension of `path`. When
+    `overwrite` is False, raises FileExistsError if `path` already exists.
+    """
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext == CWG_EXT:
+        data = format_binary(grid, meta)
+    elif ext == PUZ_EXT:
+        data = format_puz(grid)
+    else:
+        data = format_text(grid)
+    with open(path, "wb" if overwrite else "xb") as f:
+        f.write(data)
+
+def iter_files(path: Union[str, Path]) -> Iterator[tuple[str, bytes]]:
+    """
+    Yields (name, contents) for every file in a directory tree or tarball,
+    one at a time, in a stable order for directories.
+    """
+    path = Path(path)
+    if path.is_dir():
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                with open(file_path, "rb") as f:
+                    yield file_path, f.read()
+    else:
+        with tarfile.open(path, "r|*") as tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, tar.extractfile(member).read()
+
+def iter_grids(path: Union[str, Path], exts: Iterable[str] = GRID_EXTS,
+               errors: list = None) -> Iterator[tuple[str, numpy.ndarray]]:
+    """
+    Yields (name, grid) for every grid file in a directory tree or tarball.
+    Files that fail to parse are skipped; pass a list as `errors` to collect
+    (name, reason) for each of them.
+    """
+    exts = set(exts)
+    for name, data in iter_files(path):
+        if os.path.splitext(name)[1].lower() not in exts:
+            continue
+        try:
+            yield name, parse_grid(data, name)
+        except GridFormatError as e:
+            if errors is not None:
+                errors.append((name, str(e)))
+
+def iter_paths(source: str) -> Iterator[str]:
+    """Yields grid file paths from a directory tree or a list of paths."""
+    if os.path.isdir(source):
+        stack = [source]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif os.path.splitext(entry.name)[1].lower() in GRID_EXTS:
+                        yield entry.path
+    else:
+        f = sys.stdin if source == "-" else open(source)
+        try:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+def load_bulk(path: Union[str, Path], shape: tuple[int, int] = MAX_DIM,
+              errors: list = None) -> tuple[numpy.ndarray, numpy.ndarray, list[str]]:
+    """
+    Loads every binary grid (`.cwg`) in a directory or tarball into a single
+    `uint8` array of shape (count, shape[0], shape[1]). Tiles outside each
+    grid's own dimensions are dark. Returns (grids, dims, names), where
+    dims[i] holds the (width, height) of grid i.
+    """
+    capacity = 64
+    grids = numpy.empty((capacity,) + tuple(shape), dtype=numpy.uint8)
+    dims = numpy.empty((capacity, 2), dtype=numpy.int32)
+    names = []
+    for name, grid in iter_grids(path, (CWG_EXT,), errors):
+        width, height = grid.shape
+        if width > shape[0] or height > shape[1]:
+            if errors is not None:
+                errors.append((name, f"Grid is larger than {shape[0]}x{shape[1]}"))
+            continue
+        idx = len(names)
+        if idx == capacity:
+            capacity *= 2
+            grids = numpy.resize(grids, (capacity,) + tuple(shape))
+            dims = numpy.resize(dims, (capacity, 2))
+        grids[idx].fill(DARK)
+        grids[idx, :width, :height] = grid
+        dims[idx] = (width, height)
+        names.append(name)
+    return grids[:len(names)], dims[:len(names)], names
+
+def export_puz(grids: Iterable[tuple[str, numpy.ndarray]], out_dir: Union[str, Path]) -> int:
+    """
+    Writes each (name, grid) pair to `out_dir` as `<name>.puz`, one at a time.
+    Returns the number of puzzles written.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for name, grid in grids:
+        stem = Path(name).stem
+        with open(out_dir.joinpath(stem + PUZ_EXT), "wb") as f:
+            f.write(format_puz(grid, title=stem))
+        written += 1
+    return written
@@ -0,0 +1,270 @@
+"""
+Append-only edit journal with crash-safe autosave.
+
+Every edit to the crossword is appended to a journal file as a 4-byte record
+(x, y, old character, new character). A background thread periodically
+compacts the journal: it writes the whole grid to a snapshot file, which is
+atomically renamed into place, and then starts a fresh journal. Recovering
+after a crash means loading the snapshot and replaying whatever journals are
+newer than it.
+
+The same records drive undo and redo. Edits can be grouped so that an action
+that changes several tiles at once is undone in a single step. A journal
+without a directory keeps nothing on disk and only provides undo and redo.
+"""
+import os
+import struct
+from pathlib import Path
+from threading import Thread, Lock, Event
+from typing import Union
+
+RECORD = struct.Struct("<BBcc")
+SNAPSHOT_HEADER = struct.Struct("<4sIBB")
+SNAPSHOT_MAGIC = b"CWJS"
+SNAPSHOT_NAME = "autosave.snapshot"
+JOURNAL_PREFIX = "autosave.journal."
+DEFAULT_DIR = Path.home().joinpath(".crossword-suggester", "autosave")
+COMPACT_PERIOD = 10.0
+
+_NORMAL = 0
+_UNDOING = 1
+_REDOING = 2
+
+class Journal:
+    def __init__(self, directory: Union[Path, str, None] = DEFAULT_DIR,
+                 compact_period: float = COMPACT_PERIOD):
+        """
+        Parameters
+        ----------
+        directory: Where to keep the snapshot and journal files, or None to
+                   keep nothing on disk
+        compact_period: How often, in seconds, to compact the journal
+        """
+        self.dir = Path(directory) if directory is not None else None
+        self.compact_period = compact_period
+        self.mutex = Lock()
+        self.compact_mutex = Lock()
+        self.stop = Event()
+        self.thread = None
+
+        self.dims = (0, 0)
+        self.grid = bytearray()
+        self.generation = 0
+        self.fd = None
+        self.pending = 0
+
+        self.undo_stack = []
+        self.redo_stack = []
+        self.group_edits = None
+        self.mode = _NORMAL
+
+    # --------------------- #
+    # Recovery and lifetime #
+    # --------------------- #
+
+    def recover(self) -> Union[tuple[tuple[int, int], list[str]], None]:
+        """
+        Reads the latest snapshot and replays any newer journals on top of it.
+        Returns ((width, height), rows), or None if there is nothing to recover.
+        """
+        if self.dir is None:
+            return None
+        try:
+            with open(self.dir.joinpath(SNAPSHOT_NAME), "rb") as f:
+                data = f.read()
+            magic, generation, width, height = SNAPSHOT_HEADER.unpack_from(data)
+        except (OSError, struct.error):
+            return None
+        cells = bytearray(data[SNAPSHOT_HEADER.size:])
+        if magic != SNAPSHOT_MAGIC or len(cells) != width * height:
+            return None
+
+        for gen, path in self.list_journals():
+            if gen < generation:
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            # A torn final record from a crash is ignored
+            usable = len(data) - len(data) % RECORD.size
+            for x, y, _, new in RECORD.iter_unpack(data[:usable]):
+                if x < width and y < height:
+                    cells[y * width + x] = new[0]
+
+        rows = [cells[y * width:(y + 1) * width].decode("ascii") for y in range(height)]
+        return (width, height), rows
+
+    def start(self, dims: tuple[int, int], rows: list[str]):
+        """
+        Starts journaling a crossword of size `dims` whose current contents
+        are `rows`. Writes a snapshot immediately and forgets all undo history.
+        Also starts the background compaction thread, if not yet running.
+        """
+        with self.mutex:
+            self.dims = tuple(dims)
+            self.grid = bytearray("".join(rows).encode("ascii"))
+            self.undo_stack.clear()
+            self.redo_stack.clear()
+        if self.dir is None:
+            return
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.compact()
+
+        if self.thread is None:
+            self.stop.clear()
+            self.thread = Thread(target=self._compact_main, daemon=True)
+            self.thread.start()
+
+    def close(self):
+        """Stops the compaction thread and writes a final snapshot."""
+        if self.thread is not None:
+            self.stop.set()
+            self.thread.join()
+            self.thread = None
+        if self.fd is not None:
+            self.compact()
+            with self.mutex:
+                fd = self.fd
+                self.fd = None
+            os.close(fd)
+
+    # ------- #
+    # Editing #
+    # ------- #
+
+    def record(self, x: int, y: int, old: str, new: str, undoable: bool = True):
+        """
+        Appends an edit to the journal. Called for every changed tile. Edits
+        that are not `undoable`, such as those made by collaborators, are
+        only autosaved.
+        """
+        edit = (x, y, old, new)
+        if self.fd is not None:
+            with self.mutex:
+                os.write(self.fd, RECORD.pack(x, y, old.encode("ascii"), new.encode("ascii")))
+                self.grid[y * self.dims[0] + x] = ord(new)
+                self.pending += 1
+
+        if not undoable:
+            return
+        if self.mode == _UNDOING:
+            self.redo_stack[-1].append(edit)
+        elif self.mode == _REDOING:
+            self.undo_stack[-1].append(edit)
+        elif self.group_edits is not None:
+            self.group_edits.append(edit)
+        else:
+            self.undo_stack.append([edit])
+            self.redo_stack.clear()
+
+    def begin_group(self):
+        """Edits recorded until `end_group()` are undone as a single step."""
+        self.group_edits = []
+
+    def end_group(self):
+        edits = self.group_edits
+        self.group_edits = None
+        if edits:
+            self.undo_stack.append(edits)
+            self.redo_stack.clear()
+
+    def undo(self, apply) -> bool:
+        """
+        Reverts the most recent group of edits by calling `apply(x, y, char)`
+        for each tile, newest first. Returns False if there is nothing to undo.
+        """
+        if not self.undo_stack:
+            return False
+        edits = self.undo_stack.pop()
+        self.redo_stack.append([])
+        self.mode = _UNDOING
+        try:
+            for x, y, old, _ in reversed(edits):
+                apply(x, y, old)
+        finally:
+            self.mode = _NORMAL
+        return True
+
+    def redo(self, apply) -> bool:
+        """
+        Re-applies the most recently undone group of edits. Returns False if
+        there is nothing to redo.
+        """
+        if not self.redo_stack:
+            return False
+        edits = self.redo_stack.pop()
+        self.undo_stack.append([])
+        self.mode = _REDOING
+        try:
+            for x, y, old, _ in reversed(edits):
+                apply(x, y, old)
+        finally:
+            self.mode = _NORMAL
+        return True
+
+    # ---------- #
+    # Compaction #
+    # ---------- #
+
+    def compact(self):
+        """
+        Writes the current grid to a new snapshot and deletes the journals it
+        supersedes. Journal appends continue on a fresh file in the meantime.
+        """
+        with self.compact_mutex:
+            self._compact()
+
+    def _compact(self):
+        with self.mutex:
+            grid = bytes(self.grid)
+            width, height = self.dims
+            self.pending = 0
+            fd_old = self._rotate()
+            generation = self.generation
+
+        if fd_old is not None:
+            os.fsync(fd_old)
+            os.close(fd_old)
+
+        # The snapshot covers every journal older than the one just opened
+        path = self.dir.joinpath(SNAPSHOT_NAME)
+        path_tmp = path.with_suffix(".tmp")
+        with open(path_tmp, "wb") as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation, width, height))
+            f.write(grid)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path_tmp, path)
+
+        for gen, journal_path in self.list_journals():
+            if gen < generation:
+                try:
+                    os.remove(journal_path)
+                except OSError:
+                    pass
+
+    def list_journals(self) -> list[tuple[int, Path]]:
+        journals = []
+        for path in self.dir.glob(JOURNAL_PREFIX + "*"):
+            try:
+                journals.append((int(path.name[len(JOURNAL_PREFIX):]), path))
+            except ValueError:
+                pass
+        return sorted(journals)
+
+    def _rotate(self) -> Union[int, None]:
+        """
+        Switches appends to the next journal file and returns the descriptor
+        of the previous one, which the caller must close. Must hold `mutex`.
+        """
+        fd_old = self.fd
+        gens = [gen for gen, _ in self.list_journals()]
+        self.generation = max(gens + [self.generation]) + 1
+        path = self.dir.joinpath(f"{JOURNAL_PREFIX}{self.generation}")
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        return fd_old
+
+    def _compact_main(self):
+        while not self.stop.wait(self.compact_period):
+            if self.pending:
+                self.compact()
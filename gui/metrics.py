@@ -0,0 +1,164 @@
+"""
+Opt-in instrumentation for the editor and the word suggester client.
+
+Nothing is recorded until `enable()` has been called, and every recording
+function returns immediately while disabled, so instrumented code paths cost
+a single attribute check in normal use. Values go into log-bucketed
+histograms, which take constant memory no matter how many samples they see.
+"""
+import json
+import math
+from threading import Lock
+from time import perf_counter
+
+# Each power of two is split into this many linear sub-buckets, which bounds
+# the relative error of reported percentiles to roughly 1 / SUB_BUCKETS.
+SUB_BUCKETS = 8
+
+enabled = False
+
+_histograms = dict()
+_counters = dict()
+_mutex = Lock()
+
+class Histogram:
+    def __init__(self, name: str):
+        self.name = name
+        self.buckets = dict()
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.mutex = Lock()
+
+    def record(self, value: float):
+        idx = _bucket_index(value)
+        with self.mutex:
+            self.buckets[idx] = self.buckets.get(idx, 0) + 1
+            self.count += 1
+            self.total += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, pct: float) -> float:
+        """Returns an estimate of the `pct`th percentile of all recorded values."""
+        with self.mutex:
+            if not self.count:
+                return 0.0
+            rank = pct / 100 * self.count
+            seen = 0
+            for idx in sorted(self.buckets):
+                seen += self.buckets[idx]
+                if seen >= rank:
+                    return min(max(_bucket_value(idx), self.min), self.max)
+            return self.max
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "min": self.min if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max if self.count else 0.0,
+        }
+
+class _Timed:
+    """Context manager that records its duration, in milliseconds."""
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, (perf_counter() - self.start) * 1000)
+        return False
+
+class _NotTimed:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOT_TIMED = _NotTimed()
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    """Discards everything recorded so far."""
+    with _mutex:
+        _histograms.clear()
+        _counters.clear()
+
+def histogram(name: str) -> Histogram:
+    """Returns the histogram called `name`, creating it if necessary."""
+    hist = _histograms.get(name)
+    if hist is None:
+        with _mutex:
+            hist = _histograms.setdefault(name, Histogram(name))
+    return hist
+
+def record(name: str, value: float):
+    """Adds `value` to the histogram called `name`."""
+    if enabled:
+        histogram(name).record(value)
+
+def count(name: str, amount: int = 1):
+    """Increments the counter called `name`."""
+    if enabled:
+        with _mutex:
+            _counters[name] = _counters.get(name, 0) + amount
+
+def get_count(name: str) -> int:
+    return _counters.get(name, 0)
+
+def timed(name: str):
+    """
+    Returns a context manager that records the duration of its body in the
+    histogram called `name`, in milliseconds.
+    """
+    return _Timed(name) if enabled else _NOT_TIMED
+
+def snapshot() -> dict:
+    """Returns a JSON-serializable summary of all histograms and counters."""
+    with _mutex:
+        hists = list(_histograms.values())
+        counters = dict(_counters)
+    return {
+        "histograms": dict((hist.name, hist.summary()) for hist in hists),
+        "counters": counters,
+    }
+
+def dump(path: str):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+        f.write("\n")
+
+def _bucket_index(value: float) -> int:
+    if value <= 0:
+        return -(1 << 20)
+    mantissa, exponent = math.frexp(value)
+    return exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS)
+
+def _bucket_value(idx: int) -> float:
+    """Returns the midpoint of bucket `idx`."""
+    if idx == -(1 << 20):
+        return 0.0
+    exponent, sub = divmod(idx, SUB_BUCKETS)
+    return math.ldexp(0.5 + (sub + 0.5) / (2 * SUB_BUCKETS), exponent)
@@ -0,0 +1,112 @@
+"""
+In-process binding to the C++ word suggester, built as a shared library by
+`make` (see word-suggester/CApi.h).
+
+Requests use the suggester's line protocol, but are plain function calls
+instead of writes and reads on a pipe. Answers are written straight into a
+buffer owned by the `NativeSuggester`, which is reused across queries and
+only grows when an answer does not fit.
+"""
+from __future__ import annotations
+import sys
+import ctypes
+from pathlib import Path
+from typing import Union
+
+SUGGESTER_DIR = Path(__file__).parent.parent.joinpath("word-suggester")
+INITIAL_BUFFER_SIZE = 1 << 16
+# Times to grow the buffer and ask again when an answer does not fit
+MAX_QUERY_TRIES = 4
+
+if sys.platform == "win32":
+    LIB_NAME = "suggester.dll"
+elif sys.platform == "darwin":
+    LIB_NAME = "libsuggester.dylib"
+else:
+    LIB_NAME = "libsuggester.so"
+
+_lib = None
+
+def load_library(path: Union[str, Path, None] = None) -> Union[ctypes.CDLL, None]:
+    """
+    Loads the shared library, by default from word-suggester/. Returns None
+    if it has not been built or cannot be loaded.
+    """
+    global _lib
+    if _lib is not None and path is None:
+        return _lib
+    try:
+        lib = ctypes.CDLL(str(path or SUGGESTER_DIR.joinpath(LIB_NAME)))
+    except OSError:
+        return None
+
+    lib.suggester_create.argtypes = [ctypes.POINTER(ctypes.c_char_p), ctypes.c_int]
+    lib.suggester_create.restype = ctypes.c_void_p
+    lib.suggester_word_count.argtypes = [ctypes.c_void_p]
+    lib.suggester_word_count.restype = ctypes.c_int64
+    lib.suggester_query.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int64]
+    lib.suggester_query.restype = ctypes.c_int64
+    lib.suggester_free.argtypes = [ctypes.c_void_p]
+    lib.suggester_free.restype = None
+    if path is None:
+        _lib = lib
+    return lib
+
+class NativeSuggester:
+    def __init__(self, dictionaries: list[str], lib: Union[ctypes.CDLL, None] = None):
+        """
+        Loads `dictionaries`, each a path or `name=path`. Raises OSError if
+        the library is missing or a dictionary cannot be read.
+        """
+        self.lib = lib or load_library()
+        if self.lib is None:
+            raise OSError(f"{LIB_NAME} not found; build it with `make`")
+        paths = [str(d).encode("utf-8") for d in dictionaries]
+        self.handle = self.lib.suggester_create((ctypes.c_char_p * len(paths))(*paths), len(paths))
+        if not self.handle:
+            raise OSError(f"Could not load dictionaries {dictionaries}")
+        self.buffer = ctypes.create_string_buffer(INITIAL_BUFFER_SIZE)
+        self.owner = True
+
+    def sibling(self) -> NativeSuggester:
+        """
+        Returns a suggester sharing this one's dictionaries, with a buffer of
+        its own, for querying from another thread. It stays valid until this
+        suggester is closed.
+        """
+        sibling = object.__new__(NativeSuggester)
+        sibling.lib = self.lib
+        sibling.handle = self.handle
+        sibling.buffer = ctypes.create_string_buffer(INITIAL_BUFFER_SIZE)
+        sibling.owner = False
+        return sibling
+
+    def word_count(self) -> int:
+        return self.lib.suggester_word_count(self.handle)
+
+    def query_raw(self, request: str) -> memoryview:
+        """Returns a view of the answer's bytes, valid until the next query."""
+        req = request.encode("utf-8")
+        size = self.lib.suggester_query(self.handle, req, self.buffer, len(self.buffer))
+        # A dictionary reloaded between tries can make the answer grow again
+        for _ in range(MAX_QUERY_TRIES):
+            if size <= len(self.buffer):
+                return memoryview(self.buffer)[:max(size, 0)]
+            self.buffer = ctypes.create_string_buffer(max(size, 2 * len(self.buffer)))
+            size = self.lib.suggester_query(self.handle, req, self.buffer, len(self.buffer))
+        if size > len(self.buffer):
+            raise RuntimeError(f"The answer to {request!r} kept growing past the buffer")
+        return memoryview(self.buffer)[:max(size, 0)]
+
+    def query(self, request: str) -> list[str]:
+        """Returns the lines of the answer, without comment lines."""
+        lines = str(self.query_raw(request), "utf-8").splitlines()
+        return [line for line in lines if not line.startswith("#")]
+
+    def close(self):
+        if self.handle and self.owner:
+            self.lib.suggester_free(self.handle)
+        self.handle = None
+
+    def __del__(self):
+        self.close()
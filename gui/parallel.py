@@ -0,0 +1,29 @@
+"""
+Helpers for fanning work out over a process pool without materializing the
+whole input.
+"""
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator
+
+def bounded_map(executor: Executor, fn: Callable, items: Iterable,
+                window: int) -> Iterator:
+    """
+    Like `executor.map(fn, items)`, but pulls from `items` lazily and keeps
+    at most `window` calls in flight, so memory stays bounded however long
+    `items` is. Results are yielded in completion order, not input order.
+    """
+    pending = set()
+    items = iter(items)
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < window:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+            else:
+                pending.add(executor.submit(fn, item))
+        if pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
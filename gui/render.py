@@ -0,0 +1,241 @@
+"""
+Headless rendering of grids to PNG and SVG, for print and the web.
+
+    python -m gui.render grids/ --out rendered/
+    python -m gui.render puzzle.cwg --out rendered/ --format svg --answers
+    find archive -name '*.cwg' | python -m gui.render - --out rendered/ --cell 64
+
+Grid files are read with `gui.grid_io`, and each one is written to the
+output directory under the same name, with the relative path kept when the
+input is a directory. Tiles are `--cell` pixels (or SVG units) wide, with
+clue numbers in the top-left corner of every tile that begins an entry.
+
+No display is needed, nor pygame: a PNG is rasterized a whole grid at a
+time with NumPy, by scaling the grid up to the image size, drawing every
+grid line with one slice assignment and stamping every clue number with one
+fancy-indexing assignment, then compressed with zlib. Clue numbers use a
+built-in 3x5 pixel font, scaled to the tile size. SVG output can also show
+the answers with `--answers`.
+
+Files are spread over a process pool the way gui.batch does it: paths are
+read lazily and only a bounded number of grids are in flight at once, and
+each worker writes its own files, so memory use does not grow with the
+size of the input. One JSON line is written per grid.
+"""
+import os
+import sys
+import json
+import zlib
+import struct
+import argparse
+from pathlib import Path
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from gui import grid_io
+from gui.parallel import bounded_map
+
+FORMATS = ("png", "svg")
+DEFAULT_CELL = 32
+# Clue numbers are only drawn on tiles at least this large
+MIN_NUMBERED_CELL = 12
+
+INK = 0
+PAPER = 255
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+# 3x5 pixel digits, one row of bits per line
+DIGIT_ROWS = (
+    ("111", "101", "101", "101", "111"),
+    ("010", "110", "010", "010", "111"),
+    ("111", "001", "111", "100", "111"),
+    ("111", "001", "111", "001", "111"),
+    ("101", "101", "111", "001", "001"),
+    ("111", "100", "111", "001", "111"),
+    ("111", "100", "111", "101", "111"),
+    ("111", "001", "001", "001", "001"),
+    ("111", "101", "111", "101", "111"),
+    ("111", "101", "111", "001", "111"),
+)
+# Glyphs of shape (10, 5, 4), with a blank column for spacing
+GLYPHS = numpy.array([[[bit == "1" for bit in row + "0"] for row in digit] for digit in DIGIT_ROWS])
+
+# Per-process state, set up once by `init_worker()`
+_options = None
+
+def clue_numbers(grid: numpy.ndarray) -> numpy.ndarray:
+    """Returns the clue number of every tile that begins an entry, and 0 elsewhere."""
+    across, down = grid_io.slot_starts(grid)
+    starts = (across | down).T
+    numbers = numpy.where(starts, numpy.cumsum(starts.ravel()).reshape(starts.shape), 0)
+    return numbers.T
+
+def number_stamps(numbers: numpy.ndarray, scale: int) -> numpy.ndarray:
+    """
+    Returns a boolean image of shape (count, 5 * scale, digits * 4 * scale)
+    for each of `numbers`, left-aligned.
+    """
+    digits = len(str(int(numbers.max()))) if len(numbers) else 1
+    places = 10 ** numpy.arange(digits - 1, -1, -1)
+    codes = numbers[:, None] // places % 10
+    # Leading zeros are left out, which shifts each number to the left
+    shown = numbers[:, None] >= places
+    shown[:, -1] = True
+    order = numpy.argsort(~shown, axis=1, kind="stable")
+    codes = numpy.take_along_axis(codes, order, axis=1)
+    shown = numpy.take_along_axis(shown, order, axis=1)
+
+    glyphs = GLYPHS[codes] & shown[:, :, None, None]
+    stamps = glyphs.transpose(0, 2, 1, 3).reshape(len(numbers), 5, digits * 4)
+    return stamps.repeat(scale, axis=1).repeat(scale, axis=2)
+
+def rasterize(grid: numpy.ndarray, cell: int = DEFAULT_CELL) -> numpy.ndarray:
+    """
+    Returns a grayscale image of `grid` as a uint8 array of shape
+    (height * cell + 1, width * cell + 1).
+    """
+    width, height = grid.shape
+    dark = (grid == grid_io.DARK).T
+    image = numpy.where(dark.repeat(cell, axis=0).repeat(cell, axis=1), INK, PAPER).astype(numpy.uint8)
+    image = numpy.pad(image, ((0, 1), (0, 1)), constant_values=INK)
+    image[::cell, :] = INK
+    image[:, ::cell] = INK
+
+    numbers = clue_numbers(grid)
+    if cell >= MIN_NUMBERED_CELL and numbers.any():
+        xs, ys = numpy.nonzero(numbers)
+        scale = max(1, cell // 20)
+        stamps = number_stamps(numbers[xs, ys], scale)
+        # Stamps are cropped to the tile, leaving its border clear
+        stamps = stamps[:, :cell - 2 * scale, :cell - 2 * scale]
+        count, rows, cols = stamps.shape
+        top = (ys * cell + 1 + scale)[:, None, None] + numpy.arange(rows)[None, :, None]
+        left = (xs * cell + 1 + scale)[:, None, None] + numpy.arange(cols)[None, None, :]
+        image[numpy.broadcast_to(top, stamps.shape)[stamps],
+              numpy.broadcast_to(left, stamps.shape)[stamps]] = INK
+    return image
+
+def png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+def encode_png(image: numpy.ndarray) -> bytes:
+    """Encodes a grayscale uint8 image as an 8-bit PNG."""
+    height, width = image.shape
+    # Every scanline starts with its filter type, 0 for none
+    rows = numpy.zeros((height, width + 1), dtype=numpy.uint8)
+    rows[:, 1:] = image
+    return (PNG_MAGIC
+            + png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6))
+            + png_chunk(b"IEND", b""))
+
+def render_png(grid: numpy.ndarray, cell: int = DEFAULT_CELL) -> bytes:
+    return encode_png(rasterize(grid, cell))
+
+def render_svg(grid: numpy.ndarray, cell: int = DEFAULT_CELL, answers: bool = False) -> bytes:
+    """Returns `grid` as an SVG document, optionally with the letters filled in."""
+    width, height = grid.shape
+    size_w, size_h = width * cell, height * cell
+    font = cell * 0.3
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size_w}" height="{size_h}" '
+        f'viewBox="-1 -1 {size_w + 2} {size_h + 2}" font-family="sans-serif">',
+        f'<rect x="0" y="0" width="{size_w}" height="{size_h}" fill="white"/>',
+    ]
+
+    # All dark tiles as a single path
+    tiles = "".join(f"M{x * cell} {y * cell}h{cell}v{cell}h-{cell}z" for x, y in numpy.argwhere(grid == grid_io.DARK))
+    if tiles:
+        parts.append(f'<path d="{tiles}" fill="black"/>')
+    lines = "".join(f"M0 {y * cell}H{size_w}" for y in range(height + 1))
+    lines += "".join(f"M{x * cell} 0V{size_h}" for x in range(width + 1))
+    parts.append(f'<path d="{lines}" stroke="black" stroke-width="{max(1, cell // 32)}" fill="none"/>')
+
+    numbers = clue_numbers(grid)
+    parts.append(f'<g font-size="{font:g}">')
+    for x, y in numpy.argwhere(numbers):
+        parts.append(f'<text x="{x * cell + cell * 0.06:g}" y="{y * cell + font:g}">{numbers[x, y]}</text>')
+    parts.append("</g>")
+
+    if answers:
+        parts.append(f'<g font-size="{cell * 0.6:g}" text-anchor="middle">')
+        for x, y in numpy.argwhere((grid != grid_io.DARK) & (grid != grid_io.BLANK)):
+            parts.append(f'<text x="{(x + 0.5) * cell:g}" y="{(y + 0.85) * cell:g}">{chr(grid[x, y])}</text>')
+        parts.append("</g>")
+    parts.append("</svg>\n")
+    return "\n".join(parts).encode("utf-8")
+
+def init_worker(options: dict):
+    global _options
+    _options = options
+
+def output_path(path: str, ext: str) -> Path:
+    """Returns where to write the rendering of the grid at `path`."""
+    root = _options["root"]
+    relative = Path(os.path.relpath(path, root)) if root is not None else Path(Path(path).name)
+    return Path(_options["out"]).joinpath(relative).with_suffix("." + ext)
+
+def render_file(path: str) -> dict:
+    result = {"file": path, "ok": False, "outputs": []}
+    time_start = perf_counter()
+    try:
+        grid = grid_io.read_grid(path)
+    except (OSError, grid_io.GridFormatError) as e:
+        result["error"] = str(e)
+        return result
+
+    try:
+        for ext in _options["formats"]:
+            if ext == "png":
+                data = render_png(grid, _options["cell"])
+            else:
+                data = render_svg(grid, _options["cell"], _options["answers"])
+            out_path = output_path(path, ext)
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(out_path, "wb") as f:
+                f.write(data)
+            result["outputs"].append(str(out_path))
+    except OSError as e:
+        result["error"] = str(e)
+        return result
+    result["ok"] = True
+    result["time_ms"] = (perf_counter() - time_start) * 1000
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.render", description="Render grid files to PNG and SVG.")
+    parser.add_argument("input", help="grid file, directory of grid files, or a file listing paths ('-' for stdin)")
+    parser.add_argument("--out", required=True, help="directory to write the images to")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=list(FORMATS), help="formats to write")
+    parser.add_argument("--cell", type=int, default=DEFAULT_CELL, help="tile size in pixels (default: %(default)s)")
+    parser.add_argument("--answers", action="store_true", help="show the letters in SVG output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+
+    if args.cell < 2:
+        parser.error("--cell must be at least 2")
+    if os.path.isdir(args.input):
+        root, paths = args.input, grid_io.iter_paths(args.input)
+    elif os.path.splitext(args.input)[1].lower() in grid_io.GRID_EXTS:
+        root, paths = None, iter([args.input])
+    else:
+        root, paths = None, grid_io.iter_paths(args.input)
+    options = {"out": args.out, "root": root, "formats": args.format, "cell": args.cell, "answers": args.answers}
+
+    rendered = 0
+    failed = 0
+    time_start = perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(options,)) as executor:
+        for result in bounded_map(executor, render_file, paths, args.workers * 4):
+            print(json.dumps(result))
+            rendered += result["ok"]
+            failed += not result["ok"]
+
+    elapsed = perf_counter() - time_start
+    print(f"Rendered {rendered} grids ({failed} failed) in {elapsed:.2f} s", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
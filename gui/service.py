@@ -0,0 +1,372 @@
+"""
+Local word suggestion service.
+
+Keeps a pool of warm `suggester` processes and serves them to any number of
+clients over a Unix socket (or loopback TCP), so every tool on the machine
+can share one set of loaded dictionaries.
+
+    python -m gui.service                      # default Unix socket
+    python -m gui.service --port 7878          # loopback TCP instead
+    python -m gui.service --backends 4
+
+The protocol is the one spoken by the `suggester` program itself: a client
+writes one request per line and receives the matching words one per line,
+followed by a line holding `---`. Like the program, the service greets each
+connection with `# Initialized word suggester with N words!`. Clients may pipeline requests; responses
+on a connection always come back in request order. Pending requests are
+dispatched round-robin across clients, so one client sending a burst of
+requests cannot starve the others. `!Q` closes the connection.
+
+Every backend loads the dictionaries given with `--dict` and reloads them
+when they change on disk. `!S` sets the dictionary stack for the connection
+only; `!L` and `!U` are refused, since they would change a single backend.
+
+With `--engine python`, backends answer from the pure-Python `WordIndex` of
+gui.wordlist instead of running `suggester`, so the service works where the
+program has not been built, such as in CI. This stand-in answers patterns,
+`!F` and `!R` from the union of the dictionaries, ignoring stacks, and
+gives no display forms for phrases; it is meant for testing and load
+generation (see gui.bench.replay), not for the crossword maker.
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+from collections import deque
+from threading import Lock
+from pathlib import Path
+from typing import Union
+
+ROOT_DIR = Path(__file__).parent.parent
+SUGGESTER_DIR = ROOT_DIR.joinpath("word-suggester")
+DEFAULT_DICT = SUGGESTER_DIR.joinpath("data", "american.txt")
+ENGINES = ("suggester", "python")
+DEFAULT_SOCKET = os.path.join(os.environ.get("XDG_RUNTIME_DIR", tempfile.gettempdir()),
+                              f"crossword-suggester-{os.getuid() if hasattr(os, 'getuid') else 0}.sock")
+
+STR_DONE = b"---"
+STR_IGNORE = b"#"
+CMD_QUIT = b"!Q"
+CMD_STACK = b"!S"
+CMDS_REFUSED = (b"!L", b"!U")
+
+# Longest word the suggester program accepts
+MAX_WORD_LEN = 31
+
+# Seconds to wait before retrying a backend that fails to restart, doubling
+# up to the maximum
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+
+# Requests a single client may have outstanding before the service stops
+# reading from its connection
+MAX_PIPELINE_DEPTH = 64
+
+def get_exe_path() -> Path:
+    exe_name = "suggester.exe" if sys.platform == "win32" else "suggester"
+    return SUGGESTER_DIR.joinpath(exe_name)
+
+def parse_address(address: str) -> tuple[str, Union[str, tuple[str, int]]]:
+    """
+    Parses a service address into ("unix", path) or ("tcp", (host, port)).
+    Addresses of the form `host:port` or `:port` are TCP; anything else is
+    the path of a Unix socket.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return "tcp", (host or "127.0.0.1", int(port))
+    return "unix", address
+
+class Backend:
+    """One `suggester` subprocess, handling a single request at a time."""
+    def __init__(self, name: str, dict_paths: list[str]):
+        self.name = name
+        self.dict_paths = dict_paths
+        self.proc = None
+        self.words = 0
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            str(get_exe_path()), *map(str, self.dict_paths),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL)
+
+        # Wait for the dictionary to finish loading
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Backend {self.name} exited during startup")
+            if line.startswith(b"# Initialized"):
+                self.words = int(line.split()[-2])
+                return
+
+    async def query(self, request: bytes) -> list[bytes]:
+        """Returns the output lines for `request`, without prompts or terminator."""
+        self.proc.stdin.write(request + b"\n")
+        await self.proc.stdin.drain()
+        lines = []
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Backend {self.name} exited")
+            if line.startswith(STR_DONE):
+                return lines
+            if not line.startswith(STR_IGNORE):
+                lines.append(line)
+
+    async def stop(self):
+        if self.proc is not None and self.proc.returncode is None:
+            try:
+                self.proc.stdin.write(CMD_QUIT + b"\n")
+                await self.proc.stdin.drain()
+                await asyncio.wait_for(self.proc.wait(), 1.0)
+            except (ConnectionError, asyncio.TimeoutError):
+                try:
+                    self.proc.kill()
+                except ProcessLookupError:
+                    pass
+
+class PythonBackend:
+    """A stand-in for `Backend` that answers in-process with `WordIndex`."""
+    # Backends start together, and must not all build the same saved index
+    load_mutex = Lock()
+
+    def __init__(self, name: str, dict_paths: list[str]):
+        self.name = name
+        self.dict_paths = dict_paths
+        self.indexes = []
+        self.words = 0
+
+    async def start(self):
+        from gui.wordlist import WordIndex
+
+        def load() -> list[WordIndex]:
+            with self.load_mutex:
+                return [WordIndex.cached(str(path).partition("=")[2] or str(path))[0] for path in self.dict_paths]
+
+        self.indexes = await asyncio.to_thread(load)
+        self.words = sum(len(index) for index in self.indexes)
+
+    async def query(self, request: bytes) -> list[bytes]:
+        lines = await asyncio.to_thread(self.answer, request.decode("utf-8", errors="replace"))
+        return [(line + "\n").encode("utf-8") for line in lines]
+
+    def answer(self, request: str) -> list[str]:
+        """Returns the output lines for `request`. Any stack in it is ignored."""
+        args = [arg for arg in request.split() if arg[0] not in "+-"]
+        if not args:
+            return []
+        if args[0] == "!F":
+            if len(args) != 3 or not args[1].isdigit():
+                return ["# Error: Invalid near-miss request"]
+            misses = dict()
+            for index in self.indexes:
+                for word, positions in index.match_near(args[2], int(args[1])):
+                    misses[word] = positions
+            ordered = sorted(misses.items(), key=lambda item: (len(item[1]), item[0]))
+            return [" ".join([word] + [str(pos) for pos in positions]) for word, positions in ordered]
+        if args[0] == "!R":
+            options = {"prefix": "", "suffix": "", "len": "-"}
+            for arg in args[1:]:
+                name, sep, value = arg.partition("=")
+                if not sep or name not in options:
+                    return [f"# Error: Invalid option {arg}"]
+                options[name] = value
+            low, dash, high = options["len"].partition("-")
+            if not (low + high).isdigit() and (low + high) != "":
+                return [f"# Error: Invalid option len={options['len']}"]
+            min_length = int(low) if low else 1
+            max_length = int(high) if high else (int(low) if low and not dash else MAX_WORD_LEN)
+            words = set()
+            for index in self.indexes:
+                words.update(index.match_affixes(options["prefix"], options["suffix"], min_length, max_length))
+            return sorted(words, key=lambda word: (len(word), word))
+        if args[0].startswith("!"):
+            return [f"# Error: Unknown command {args[0]}"]
+        return sorted(set().union(*(index.match(args[-1]) for index in self.indexes)))
+
+    async def stop(self):
+        pass
+
+class Request:
+    def __init__(self, client, line: bytes):
+        self.client = client
+        self.line = line
+        self.future = asyncio.get_running_loop().create_future()
+
+class Client:
+    def __init__(self, name: str):
+        self.name = name
+        self.pending = deque()
+        self.slots = asyncio.Semaphore(MAX_PIPELINE_DEPTH)
+        self.stack = b""
+
+class Service:
+    def __init__(self, backends: list[Backend]):
+        self.backends = backends
+        self.idle = asyncio.Queue()
+        self.ready = deque()
+        self.has_work = asyncio.Event()
+        self.dispatcher = None
+        self.clients = 0
+        self.requests = 0
+
+    async def start(self):
+        await asyncio.gather(*(backend.start() for backend in self.backends))
+        for backend in self.backends:
+            self.idle.put_nowait(backend)
+        self.dispatcher = asyncio.create_task(self.dispatch_main())
+
+    async def stop(self):
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+        await asyncio.gather(*(backend.stop() for backend in self.backends))
+
+    def submit(self, request: Request):
+        client = request.client
+        if not client.pending:
+            self.ready.append(client)
+        client.pending.append(request)
+        self.has_work.set()
+
+    async def dispatch_main(self):
+        """Hands pending requests to idle backends, one client at a time."""
+        while True:
+            backend = await self.idle.get()
+            while not self.ready:
+                self.has_work.clear()
+                await self.has_work.wait()
+
+            # Round-robin: take one request, then move the client to the back
+            client = self.ready.popleft()
+            request = client.pending.popleft()
+            if client.pending:
+                self.ready.append(client)
+            asyncio.create_task(self.run(backend, request))
+
+    async def run(self, backend: Backend, request: Request):
+        try:
+            request.future.set_result(await backend.query(request.line))
+        except Exception as e:
+            request.future.set_exception(e)
+            await self.restart(backend, e)
+        finally:
+            self.idle.put_nowait(backend)
+            self.requests += 1
+
+    async def restart(self, backend: Backend, reason: Exception):
+        """
+        Replaces the process of a backend whose query failed, so that it
+        does not fail every request sent to it after. Keeps trying, after a
+        growing delay, until the backend starts.
+        """
+        delay = RESTART_DELAY
+        while True:
+            print(f"[service] {backend.name} failed ({reason}); restarting")
+            await backend.stop()
+            try:
+                await backend.start()
+                return
+            except (OSError, RuntimeError) as e:
+                reason = e
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, MAX_RESTART_DELAY)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients += 1
+        client = Client(f"client-{self.clients}")
+        responses = asyncio.Queue()
+        writer.write(f"# Initialized word suggester with {self.backends[0].words} words!\n".encode("utf-8"))
+        writer_task = asyncio.create_task(self.write_responses(client, responses, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.rstrip(b"\r\n")
+                if line == CMD_QUIT:
+                    break
+                await client.slots.acquire()
+                request = Request(client, line)
+                if line.startswith(CMD_STACK):
+                    client.stack = line[len(CMD_STACK):].strip()
+                    request.future.set_result([])
+                elif line.startswith(CMDS_REFUSED):
+                    request.future.set_result([b"# Error: Dictionaries are fixed when the service starts\n"])
+                else:
+                    # Requests without their own stack use the connection's
+                    if client.stack and b" " not in line.strip() and not line.startswith(b"!"):
+                        request.line = client.stack + b" " + line
+                    self.submit(request)
+                responses.put_nowait(request)
+        except ConnectionError:
+            pass
+        finally:
+            responses.put_nowait(None)
+            await writer_task
+            writer.close()
+
+    async def write_responses(self, client: Client, responses: asyncio.Queue,
+                              writer: asyncio.StreamWriter):
+        """Writes responses back in request order as they complete."""
+        while True:
+            request = await responses.get()
+            if request is None:
+                return
+            try:
+                lines = await request.future
+            except Exception as e:
+                lines = [f"# Error: {e}\n".encode("utf-8")]
+            finally:
+                client.slots.release()
+            try:
+                writer.write(b"".join(lines) + STR_DONE + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                return
+
+async def serve(address: str, num_backends: int, dict_paths: list[str], engine: str = "suggester"):
+    backend_class = PythonBackend if engine == "python" else Backend
+    service = Service([backend_class(f"backend-{i}", dict_paths) for i in range(num_backends)])
+    await service.start()
+    print(f"Started {num_backends} backend(s) with {service.backends[0].words} words")
+
+    kind, where = parse_address(address)
+    if kind == "tcp":
+        server = await asyncio.start_server(service.handle_client, where[0], where[1])
+    else:
+        if os.path.exists(where):
+            os.remove(where)
+        server = await asyncio.start_unix_server(service.handle_client, where)
+    print(f"Listening on {address}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+        if kind == "unix" and os.path.exists(where):
+            os.remove(where)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.service",
+                                     description="Serve word suggestions to local clients.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path (default: %(default)s)")
+    parser.add_argument("--port", type=int, help="listen on this loopback TCP port instead of a Unix socket")
+    parser.add_argument("--backends", type=int, default=2, help="number of suggester processes")
+    parser.add_argument("--dict", action="append", metavar="[NAME=]PATH",
+                        help=f"dictionary file; repeat to load several (default: {DEFAULT_DICT})")
+    parser.add_argument("--engine", choices=ENGINES, default=ENGINES[0],
+                        help="what answers requests: the suggester program, or a pure-Python stand-in "
+                             "for testing (default: %(default)s)")
+    args = parser.parse_args()
+
+    address = f"127.0.0.1:{args.port}" if args.port else args.socket
+    try:
+        asyncio.run(serve(address, args.backends, args.dict or [str(DEFAULT_DICT)], args.engine))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Word slot extraction for `uint8` grids (see gui.grid_io), without pygame.
+"""
+from typing import Iterator
+
+import numpy
+
+from gui import grid_io
+
+ACROSS = 0
+DOWN = 1
+DIR_NAMES = ("across", "down")
+
+class Slot:
+    """
+    A run of two or more open tiles. `number` is the clue number of the
+    slot's first tile.
+    """
+    def __init__(self, number: int, x: int, y: int, direction: int, length: int):
+        self.number = number
+        self.x = x
+        self.y = y
+        self.direction = direction
+        self.length = length
+
+    def __repr__(self) -> str:
+        return f"Slot({self.number} {DIR_NAMES[self.direction]} at ({self.x}, {self.y}), length {self.length})"
+
+    def cells(self, grid: numpy.ndarray) -> numpy.ndarray:
+        """Returns a view of the slot's tiles in `grid`."""
+        if self.direction == ACROSS:
+            return grid[self.x:self.x + self.length, self.y]
+        else:
+            return grid[self.x, self.y:self.y + self.length]
+
+    def positions(self) -> Iterator[tuple[int, int]]:
+        dx, dy = (1, 0) if self.direction == ACROSS else (0, 1)
+        for i in range(self.length):
+            yield self.x + dx * i, self.y + dy * i
+
+    def pattern(self, grid: numpy.ndarray) -> str:
+        """Returns the slot as a suggester pattern, with '*' for blanks."""
+        return self.cells(grid).tobytes().decode("ascii")
+
+    def is_complete(self, grid: numpy.ndarray) -> bool:
+        return not (self.cells(grid) == grid_io.BLANK).any()
+
+    def to_dict(self) -> dict:
+        return {
+            "number": self.number,
+            "x": self.x,
+            "y": self.y,
+            "dir": DIR_NAMES[self.direction],
+            "length": self.length,
+        }
+
+def run_lengths(open_: numpy.ndarray, axis: int) -> numpy.ndarray:
+    """
+    Returns, for every tile, the number of consecutive open tiles starting
+    at that tile and continuing along `axis` (0 for x, 1 for y).
+    """
+    runs = numpy.zeros(open_.shape, dtype=numpy.int32)
+    size = open_.shape[axis]
+    for i in range(size - 1, -1, -1):
+        cur = numpy.take(open_, i, axis=axis)
+        if i == size - 1:
+            val = cur.astype(numpy.int32)
+        else:
+            val = numpy.where(cur, numpy.take(runs, i + 1, axis=axis) + 1, 0)
+        if axis == 0:
+            runs[i, :] = val
+        else:
+            runs[:, i] = val
+    return runs
+
+def extract_slots(grid: numpy.ndarray) -> list[Slot]:
+    """
+    Returns every slot in `grid`, in clue order: by number, with the across
+    slot before the down slot when both start on the same tile.
+    """
+    open_ = grid != grid_io.DARK
+    across, down = grid_io.slot_starts(grid)
+    len_across = run_lengths(open_, 0)
+    len_down = run_lengths(open_, 1)
+
+    slots = []
+    number = 0
+    width, height = grid.shape
+    starts = across | down
+    for y in range(height):
+        for x in numpy.flatnonzero(starts[:, y]):
+            x = int(x)
+            number += 1
+            if across[x, y]:
+                slots.append(Slot(number, x, y, ACROSS, int(len_across[x, y])))
+            if down[x, y]:
+                slots.append(Slot(number, x, y, DOWN, int(len_down[x, y])))
+    return slots
@@ -1,50 +1,271 @@
+import os
+import socket
 import platform
 import atexit
-from typing import Union
+from typing import Union, Callable
+from collections import OrderedDict, deque
 from subprocess import Popen, PIPE
-from threading import Thread, Lock
+from threading import Thread, Lock, Event
 from pathlib import Path
 from queue import Queue, Empty
-from time import sleep
+from time import perf_counter
+
+from gui import metrics, capture
 
 _request = None
+_request_time = 0.0
 _thread = None
 _run = False
 _result = None
+_page = []
+_page_done = False
+# Bumped by every request sent, so that the backend thread drops the output
+# of a request superseded while it was being answered
+_generation = 0
+_service = None
+_use_library = True
+_hedge_after = None
+_request_event = Event()
+_dictionaries = []
+_stack = []
+_ready = Event()
+_word_count = None
+_time_ready = None
+_time_first_result = None
 _shutdown_registered = False
+_cache = OrderedDict()
+_prefetch_queue = deque()
+_prefetch_event = Event()
+_prefetch_thread = None
+_prefetching = False
 
 _STR_DONE_SUGGESTING = "---"
 _STR_IGNORE_LINE = "#"
+_STR_INITIALIZED = "# Initialized word suggester with"
 _CMD_QUIT = "\n!Q\n"
+_CMD_FUZZY = "!F"
+_CMD_RANGE = "!R"
+
+# Number of suggestions collected before they are handed to `get_page()`
+PAGE_SIZE = 256
+
+# Results kept for repeated and prefetched requests. Entries expire after
+# CACHE_MAX_AGE seconds, which bounds how long they outlive a dictionary
+# being reloaded.
+CACHE_SIZE = 256
+CACHE_MAX_AGE = 60.0
+
+SUGGESTER_DIR = Path(__file__).parent.parent.joinpath("word-suggester")
+DEFAULT_DICT = SUGGESTER_DIR.joinpath("data", "american.txt")
+
+# Watchdog for the subprocess and service backends. A backend is restarted
+# if it exits, if it sends nothing for REQUEST_TIMEOUT seconds while
+# answering, or if it takes longer than STARTUP_TIMEOUT seconds to load. Its
+# request is replayed on the fresh backend, at most MAX_REPLAYS times.
+POLL_INTERVAL = 0.01
+REQUEST_TIMEOUT = 5.0
+STARTUP_TIMEOUT = 60.0
+MAX_REPLAYS = 1
+# Backends that fail again within this many seconds of starting are
+# restarted after a delay, doubled each time up to MAX_RESTART_DELAY
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+
+# Address of a running `gui.service` to use instead of a private subprocess
+SERVICE_ENV_VAR = "CROSSWORD_SUGGESTER_SERVICE"
 
 _mutex = Lock()
 
-def init():
+def init(service: Union[str, None] = None, dictionaries: Union[list[str], None] = None,
+         use_library: bool = True, hedge_after: Union[float, None] = None):
     """
     Initialize the word suggester. This must only be called once, unless
     `shutdown()` has been called since the last `init()` call. Otherwise
     raises RuntimeError.
+    If `service` (or the CROSSWORD_SUGGESTER_SERVICE environment variable)
+    holds the address of a running `gui.service`, requests are sent there
+    instead of to a private suggester subprocess. If the service cannot be
+    reached, falls back to the subprocess. An empty `service` means the
+    service's default socket.
+    `dictionaries` lists the word lists to load, each a path or `name=path`
+    (by default the name is the file's stem, e.g. "american"). Defaults to
+    american.txt. They are reloaded automatically when changed on disk.
+    A service uses the dictionaries it was started with instead.
+    Without a service, the suggester runs in-process through its shared
+    library (see gui.native) if it has been built and `use_library` is True,
+    and as a subprocess otherwise.
+    A subprocess or service connection that exits or hangs is restarted,
+    and the request it was answering is sent again. With `hedge_after`, a
+    second one is kept running, and requests still unanswered after that
+    many seconds are also sent to it, taking whichever answer comes first.
+    The in-process library has no second instance to hedge with, so it
+    ignores `hedge_after`; a query of it that fails is retried instead.
+    Returns immediately; the dictionary loads in the background and
+    `is_ready()` reports when it has finished.
     """
-    global _thread, _run, _shutdown_registered
+    global _thread, _run, _service, _use_library, _hedge_after, _dictionaries, _word_count, _time_ready, _time_first_result, _shutdown_registered
     if _run:
         raise RuntimeError("init called twice before suggester allowed to terminate")
     else:
         if not _shutdown_registered:
             atexit.register(shutdown)
             _shutdown_registered = True
+        _service = service if service is not None else os.environ.get(SERVICE_ENV_VAR) or None
+        _dictionaries = list(dictionaries) if dictionaries else [str(DEFAULT_DICT)]
+        _use_library = use_library
+        _hedge_after = hedge_after
+        _ready.clear()
+        _word_count = None
+        _time_ready = None
+        _time_first_result = None
+        _cache.clear()
+        _prefetch_queue.clear()
         _run = True
         _thread = Thread(target=_suggester_main)
         _thread.setDaemon(True)
         _thread.start()
 
-def send_request(request: str):
+def is_ready() -> bool:
+    """Returns True once the suggester has loaded its dictionary."""
+    return _ready.is_set()
+
+def wait_ready(timeout: Union[float, None] = None) -> bool:
+    """Blocks until the suggester is ready or `timeout` seconds pass."""
+    return _ready.wait(timeout)
+
+def get_word_count() -> Union[int, None]:
+    """Returns the number of words loaded, or None while still loading."""
+    return _word_count
+
+def get_startup_times() -> tuple[Union[float, None], Union[float, None]]:
+    """
+    Returns the `perf_counter()` times at which the suggester became ready
+    and at which it delivered its first result, each None if not yet reached.
+    """
+    return _time_ready, _time_first_result
+
+def set_stack(stack: list[str]):
+    """
+    Selects the dictionaries used by subsequent requests that don't give
+    their own stack. Each entry is a dictionary name prefixed with '+' to
+    include its words or '-' to exclude them, e.g.
+    `["+american", "+house", "-blocked"]`. Without any '+' entries, every
+    loaded dictionary is included; an empty stack selects everything.
+    """
+    global _stack
+    with _mutex:
+        _stack = list(stack)
+
+def get_stack() -> list[str]:
+    return list(_stack)
+
+def get_dictionaries() -> list[str]:
+    """Returns the dictionaries passed to `init()`, each a path or `name=path`."""
+    return list(_dictionaries)
+
+def send_request(request: str, stack: Union[list[str], None] = None, max_mismatches: int = 0):
     """
     Send a request to the suggester program.
     Results can be obtained by calling `get_result()`.
+    `stack` selects dictionaries for this request only; see `set_stack()`.
+    With `max_mismatches` above 0, also returns words that differ from the
+    pattern in up to that many letters, fewest first; use `parse_near_miss()`
+    to split each result into the word and the positions that differ.
+    A request sent before the suggester is ready is held back until it is,
+    and is replaced by any later request sent in the meantime.
+    Requests answered recently or prefetched (see `prefetch()`) are answered
+    from a cache, without waiting for the suggester.
+    Results and pages still to come for earlier requests are dropped.
     """
-    global _request
     with _mutex:
+        stack = _stack if stack is None else stack
+    _send(_make_request(request, stack, max_mismatches))
+
+def send_range_request(prefix: str = "", suffix: str = "", min_length: Union[int, None] = None,
+                       max_length: Union[int, None] = None, stack: Union[list[str], None] = None):
+    """
+    Like `send_request()`, but for the words that start with `prefix`, end
+    with `suffix` and are from `min_length` to `max_length` letters long,
+    shortest first. Each constraint is optional, e.g.
+    `send_range_request("UN", min_length=6, max_length=9)` or
+    `send_range_request(suffix="ING")`.
+    """
+    with _mutex:
+        stack = _stack if stack is None else stack
+    args = [_CMD_RANGE] + stack
+    if prefix:
+        args.append(f"prefix={prefix}")
+    if suffix:
+        args.append(f"suffix={suffix}")
+    if min_length is not None or max_length is not None:
+        args.append(f"len={min_length or ''}-{max_length or ''}")
+    _send(" ".join(args))
+
+def _send(request: str):
+    global _request, _request_time, _result, _page, _page_done, _generation
+    with _mutex:
+        _generation += 1
+        _result = None
+        _page = []
+        _page_done = False
+        cached = _cache_get(request)
+        if cached is not None:
+            _request = None
+            _result = list(cached)
+            _page = list(cached)
+            _page_done = True
+            metrics.count("suggester.cache_hits")
+            capture.record(request, capture.SOURCE_CACHE, len(cached), 0.0)
+            return
+        if request in _prefetch_queue:
+            _prefetch_queue.remove(request)
         _request = request
+        _request_time = perf_counter()
+    _request_event.set()
+
+def prefetch(patterns: list[str], stack: Union[list[str], None] = None):
+    """
+    Queues low-priority requests for `patterns` and caches their results,
+    so that a later `send_request()` for any of them is answered at once.
+    Patterns queued by an earlier call that have not been sent yet are
+    cancelled. Prefetches use a connection of their own and never delay
+    `send_request()`, so they only run with the in-process library or a
+    service; with a plain subprocess, this does nothing.
+    """
+    if _prefetch_thread is None:
+        return
+    with _mutex:
+        stack = _stack if stack is None else stack
+        _prefetch_queue.clear()
+        for pattern in patterns:
+            request = _make_request(pattern, stack)
+            if _cache_get(request) is None and request not in _prefetch_queue:
+                _prefetch_queue.append(request)
+    _prefetch_event.set()
+
+def clear_cache():
+    """Forgets every cached and prefetched result."""
+    with _mutex:
+        _cache.clear()
+        _prefetch_queue.clear()
+
+def split_display(line: str) -> tuple[str, str]:
+    """
+    Splits a result into the result proper and the display form of its
+    word. Phrase entries such as "CAT'S-PAW" are matched by their letters
+    only, and the suggester appends the phrase after a tab. For other
+    words, the display form is the word itself.
+    """
+    result, _, display = line.partition("\t")
+    return result, display or result.split(" ", 1)[0]
+
+def parse_near_miss(line: str) -> tuple[str, list[int]]:
+    """
+    Splits a result of a `max_mismatches` request into the word and the
+    positions of the pattern's letters that it differs in.
+    """
+    word, *positions = line.partition("\t")[0].split()
+    return word, [int(pos) for pos in positions]
 
 def get_result() -> Union[list[str], None]:
     """
@@ -61,6 +282,23 @@ def get_result() -> Union[list[str], None]:
             _result = None
     return result
 
+def get_page() -> Union[tuple[list[str], bool], None]:
+    """
+    Returns the suggestions that have arrived since the last `get_page()` call
+    as a tuple of (words, done), where `done` is True once the final page of
+    the current request has been delivered. Pages arrive while the suggester
+    is still producing output, so long result lists can be consumed
+    incrementally. If nothing new is available, returns None.
+    """
+    global _page, _page_done
+    page = None
+    with _mutex:
+        if _page or _page_done:
+            page = (_page, _page_done)
+            _page = []
+            _page_done = False
+    return page
+
 def shutdown():
     """
     Nicely shuts down the threads operating the suggester program.
@@ -76,80 +314,494 @@ def shutdown():
         _thread.join(0.5)
         _thread = None
 
+def _make_request(pattern: str, stack: list[str], max_mismatches: int = 0) -> str:
+    if max_mismatches > 0:
+        return " ".join([_CMD_FUZZY, str(max_mismatches)] + stack + [pattern])
+    return " ".join(stack + [pattern])
+
+def _cache_get(request: str) -> Union[list[str], None]:
+    """Returns the cached result of `request`, if fresh. Must hold `_mutex`."""
+    entry = _cache.get(request)
+    if entry is None:
+        return None
+    time_cached, result = entry
+    if perf_counter() - time_cached > CACHE_MAX_AGE:
+        del _cache[request]
+        return None
+    _cache.move_to_end(request)
+    return result
+
+def _publish(generation: int, lines: list[str], result: Union[list[str], None] = None):
+    """
+    Adds `lines` to the pages of the request of `generation`, and completes
+    it with `result` if given, unless a later request has superseded it.
+    Must hold `_mutex`.
+    """
+    global _result, _page_done
+    if generation != _generation:
+        return
+    _page.extend(lines)
+    if result is not None:
+        _result = result
+        _page_done = True
+
+def _cache_put(request: str, result: list[str]):
+    """Must hold `_mutex`."""
+    _cache[request] = (perf_counter(), result)
+    _cache.move_to_end(request)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+class _Backend:
+    """
+    One `suggester` subprocess, or one connection to a service at `address`.
+    A thread of its own reads its output into `lines`, a queue shared by all
+    backends, as (backend, line) pairs followed by (backend, None) once the
+    output ends.
+    """
+    def __init__(self, name: str, lines: Queue, address: Union[str, None]):
+        self.name = name
+        self.lines = lines
+        self.address = address
+        self.proc = None
+        self.conn = None
+        self.stdin = None
+        self.ready = False
+        # Requests sent and not yet fully answered, oldest first, as
+        # (request id, request) pairs, and the lines of the oldest so far
+        self.sent = deque()
+        self.result = []
+        self.time_started = 0.0
+        self.time_output = 0.0
+        self.retry_delay = RESTART_DELAY
+
+    def start(self) -> bool:
+        """Starts the subprocess or connects to the service. Returns False on failure."""
+        self.time_started = self.time_output = perf_counter()
+        if self.address is not None:
+            self.conn = _connect_service(self.address)
+            if self.conn is None:
+                return False
+            self.stdin = self.conn.makefile("wb")
+            stdout = self.conn.makefile("rb")
+        else:
+            exe_name = "suggester"
+            if platform.system() == "Windows":
+                exe_name += ".exe"
+            exe_path = SUGGESTER_DIR.joinpath(exe_name)
+            try:
+                self.proc = Popen([str(exe_path)] + _dictionaries, stdout=PIPE, stderr=PIPE, stdin=PIPE)
+            except OSError as e:
+                print(f"[suggester] Could not start {exe_path} ({e})")
+                return False
+            self.stdin = self.proc.stdin
+            stdout = self.proc.stdout
+        thread_read = Thread(target=_queue_output, args=(stdout, self.lines, self))
+        thread_read.setDaemon(True)
+        thread_read.start()
+        return True
+
+    def is_started(self) -> bool:
+        return self.stdin is not None
+
+    def is_idle(self) -> bool:
+        return self.ready and not self.sent
+
+    def is_answering(self, request_id: int) -> bool:
+        return any(rid == request_id for rid, _ in self.sent)
+
+    def has_exited(self) -> bool:
+        return self.proc is not None and self.proc.poll() is not None
+
+    def send(self, request_id: int, request: str):
+        if not self.sent:
+            self.time_output = perf_counter()
+        self.sent.append((request_id, request))
+        self.stdin.write((request + "\n").encode("utf-8"))
+        self.stdin.flush()
+
+    def stop(self):
+        if self.stdin is not None:
+            try:
+                self.stdin.write(_CMD_QUIT.encode("utf-8"))
+                self.stdin.flush()
+            except (OSError, ValueError):
+                pass
+        if self.conn is not None:
+            self.conn.close()
+        if self.proc is not None:
+            self.proc.kill()
+
 def _suggester_main():
     """Do not call this function directly. Call init() instead."""
 
-    global _request, _run, _result
-
-    # Start the subprocess
-    exe_name = "suggester"
-    if platform.system() == "Windows":
-        exe_name += ".exe"
-    root_dir = Path(__file__).parent.parent
-    suggester_dir = root_dir.joinpath("word-suggester")
-    exe_path = suggester_dir.joinpath(exe_name)
-    dict_path = suggester_dir.joinpath("data").joinpath("american.txt")
-    proc = Popen([str(exe_path), str(dict_path)], stdout=PIPE, stderr=PIPE, stdin=PIPE)
-    
-    # Start thread for reading subprocess output
-    q_stdout = Queue()
-    thread_read = Thread(target=_queue_output, args=(proc.stdout, q_stdout))
-    thread_read.setDaemon(True)
-    thread_read.start()
-
-    result = []
-    reading = False
+    global _request, _request_time, _run
+    global _word_count, _time_ready, _time_first_result
+
+    # Connect to the shared service, or load the library, or start the subprocess
+    lines = Queue()
+    backend = None
+    if _service is not None:
+        backend = _Backend("backend-0", lines, _service)
+        if not backend.start():
+            backend = None
+    if backend is None and _use_library:
+        native = _load_native()
+        if native is not None:
+            if _hedge_after is not None:
+                print("[suggester] Hedging only applies to a subprocess or service; "
+                      "the in-process library answers every request itself")
+            _native_main(native)
+            return
+    if backend is None:
+        backend = _Backend("backend-0", lines, None)
+        backend.start()
+    address = backend.address
+    backends = [backend]
+    # A second backend is kept warm for hedged requests
+    if _hedge_after is not None:
+        backends.append(_Backend("backend-1", lines, address))
+        backends[1].start()
+    conn_prefetch = None
+    if address is not None:
+        conn_prefetch = _connect_service(address)
+        if conn_prefetch is not None:
+            _start_prefetch(_line_query(conn_prefetch.makefile("wb"), conn_prefetch.makefile("rb")))
+
+    # The request being answered, which may be in flight on several backends
     request = None
+    request_id = 0
+    request_generation = 0
+    request_time = 0.0
+    replays = 0
+    hedged = False
+    published = 0
+    page = []
+    time_sent = 0.0
+    time_parsing = 0.0
+
+    def finish(result: list[str], cache: bool = True):
+        global _time_first_result
+        nonlocal request, page
+        if _time_first_result is None:
+            _time_first_result = perf_counter()
+        capture.record(request, capture.SOURCE_BACKEND if cache else capture.SOURCE_FAILED, len(result),
+                       (perf_counter() - request_time) * 1000, request_time)
+        page.extend(result[published:])
+        with _mutex:
+            _publish(request_generation, page, result)
+            if cache:
+                _cache_put(request, result)
+        request = None
+        page = []
+
+    def restart(backend: _Backend, reason: str):
+        """
+        Replaces a crashed or wedged backend with a fresh one, and replays
+        its request unless another backend is still answering it. A backend
+        that fails again soon after starting is restarted after a growing
+        delay.
+        """
+        nonlocal replays
+        print(f"[suggester] {backend.name} {reason}; restarting")
+        metrics.count("suggester.restarts")
+        backend.stop()
+        fresh = _Backend(backend.name, lines, address)
+        backends[backends.index(backend)] = fresh
+        if perf_counter() - backend.time_started < backend.retry_delay:
+            fresh.time_started = perf_counter()
+            fresh.retry_delay = min(2 * backend.retry_delay, MAX_RESTART_DELAY)
+        else:
+            fresh.start()
+        if not any(b.ready for b in backends):
+            _ready.clear()
+
+        if request is not None and backend.is_answering(request_id) and \
+                not any(b.is_answering(request_id) for b in backends):
+            replays += 1
+            if replays > MAX_REPLAYS:
+                print(f"[suggester] Giving up on request {request!r}")
+                finish([], cache=False)
+
     run = True
     try:
         while run:
             with _mutex:
                 run = _run
-                if not reading:
+                if request is None and _request is not None and any(b.is_idle() for b in backends):
+                    # A pending request is always the latest one sent
                     request = _request
+                    request_time = _request_time
+                    request_generation = _generation
+                    request_id += 1
                     _request = None
+                    replays = 0
+                    hedged = False
+                    published = 0
+                    time_sent = 0.0
+
+            # Send the request to an idle backend, unless it is in flight.
+            # A request still unanswered after `hedge_after` seconds is raced
+            # on a second backend, and the first answer wins.
+            idle = [b for b in backends if b.is_idle()]
+            if request is not None and idle:
+                if not any(b.is_answering(request_id) for b in backends):
+                    if not time_sent:
+                        metrics.record("suggester.queue_wait_ms", (perf_counter() - request_time) * 1000)
+                        time_parsing = 0.0
+                    idle[0].send(request_id, request)
+                    time_sent = perf_counter()
+                elif _hedge_after is not None and not hedged and perf_counter() - time_sent > _hedge_after:
+                    idle[0].send(request_id, request)
+                    hedged = True
+                    metrics.count("suggester.hedges")
 
-            if reading:
+            try:
+                backend, raw_line = lines.get(timeout=POLL_INTERVAL)
+            except Empty:
+                backend = None
+
+            if backend is not None and backend in backends:
+                if raw_line is None:
+                    restart(backend, "exited")
+                    continue
+                backend.time_output = perf_counter()
+                time_parse_start = perf_counter()
                 try:
-                    line = q_stdout.get_nowait().decode("utf-8").strip()
-                except Empty:
-                    pass
+                    line = raw_line.decode("utf-8").strip()
                 except UnicodeDecodeError:
                     print("[suggester] Could not decode subprocess output")
+                    line = _STR_IGNORE_LINE
+                if not backend.ready:
+                    # Wait for the line announcing that the dictionary is loaded
+                    if line.startswith(_STR_INITIALIZED):
+                        backend.ready = True
+                        if _word_count is None:
+                            try:
+                                _word_count = int(line.split()[-2])
+                            except ValueError:
+                                _word_count = 0
+                            _time_ready = perf_counter()
+                        _ready.set()
+                # Ignore lines used as prompts, and output nobody asked for
+                elif line.startswith(_STR_IGNORE_LINE) or not backend.sent:
+                    pass
+                # If final suggestion reached, finish reading and output result
+                elif line.startswith(_STR_DONE_SUGGESTING):
+                    rid, _ = backend.sent.popleft()
+                    result = backend.result
+                    backend.result = []
+                    if rid == request_id and request is not None:
+                        if metrics.enabled:
+                            metrics.record("suggester.subprocess_ms", (perf_counter() - time_sent) * 1000)
+                            metrics.record("suggester.parse_ms", time_parsing * 1000)
+                            metrics.record("suggester.result_size", len(result))
+                            if hedged and backend is not backends[0]:
+                                metrics.count("suggester.hedge_wins")
+                        finish(result)
+                # If just another suggestion, append to result
                 else:
-                    # Ignore lines used as prompts
-                    if line.startswith(_STR_IGNORE_LINE):
-                        pass
-                    # If final suggestion reached, finish reading and output result
-                    elif line.startswith(_STR_DONE_SUGGESTING):
-                        reading = False
-                        with _mutex:
-                            _result = result
-                        result = []
-                    # If just another suggestion, append to result
-                    else:
-                        result.append(line)
-            elif request is not None:
-                # Send request to stdin
-                request += '\n'
-                proc.stdin.write(request.encode("utf-8"))
-                proc.stdin.flush()
-                reading = True
-            else:
-                sleep(0.05)
+                    backend.result.append(line)
+                    # Whichever backend is furthest along fills the pages.
+                    # Answers are deterministic, so a replayed or hedged
+                    # request only adds the lines not delivered yet.
+                    if backend.sent[0][0] == request_id and len(backend.result) > published:
+                        page.append(line)
+                        published += 1
+                        if len(page) >= PAGE_SIZE:
+                            with _mutex:
+                                _publish(request_generation, page)
+                            page = []
+                time_parsing += perf_counter() - time_parse_start
+                continue
+
+            # Health checks, when there is no output to read
+            now = perf_counter()
+            for backend in list(backends):
+                if not backend.is_started():
+                    if now - backend.time_started > backend.retry_delay and not backend.start():
+                        backend.retry_delay = min(2 * backend.retry_delay, MAX_RESTART_DELAY)
+                elif backend.has_exited():
+                    restart(backend, "exited")
+                elif backend.sent and backend.ready and now - backend.time_output > REQUEST_TIMEOUT:
+                    metrics.count("suggester.timeouts")
+                    restart(backend, f"sent nothing for {REQUEST_TIMEOUT:g} s")
+                elif not backend.ready and now - backend.time_started > STARTUP_TIMEOUT:
+                    metrics.count("suggester.timeouts")
+                    restart(backend, f"did not load within {STARTUP_TIMEOUT:g} s")
     finally:
-        proc.stdin.write(_CMD_QUIT.encode("utf-8"))
-        proc.kill()
+        for backend in backends:
+            backend.stop()
+        if conn_prefetch is not None:
+            _stop_prefetch(conn_prefetch)
+            conn_prefetch.close()
         print("Suggester thread terminating.")
 
-def _queue_output(out, queue):
+def _load_native():
+    """Returns a `gui.native.NativeSuggester`, or None if it is unavailable."""
+    from gui.native import NativeSuggester, load_library
+
+    if load_library() is None:
+        return None
+    try:
+        return NativeSuggester(_dictionaries)
+    except OSError as e:
+        print(f"[suggester] Could not load the suggester library ({e}); starting subprocess")
+        return None
+
+def _native_main(native):
+    """Answers requests with in-process calls to the suggester library."""
+    global _request
+    global _word_count, _time_ready, _time_first_result
+
+    _word_count = native.word_count()
+    _time_ready = perf_counter()
+    _ready.set()
+    _start_prefetch(native.sibling().query)
+    run = True
+    try:
+        while run:
+            _request_event.wait(0.05)
+            with _mutex:
+                _request_event.clear()
+                run = _run
+                request = _request
+                request_time = _request_time
+                generation = _generation
+                _request = None
+            if request is None:
+                continue
+
+            time_sent = perf_counter()
+            metrics.record("suggester.queue_wait_ms", (time_sent - request_time) * 1000)
+            # A failed query is retried like a restarted backend's request,
+            # and given up on with an empty result that is not cached
+            result = None
+            for replays in range(MAX_REPLAYS + 1):
+                try:
+                    raw = native.query_raw(request)
+                    time_parse_start = perf_counter()
+                    result = [line for line in str(raw, "utf-8").splitlines()
+                              if not line.startswith(_STR_IGNORE_LINE)]
+                    break
+                except (RuntimeError, UnicodeDecodeError) as e:
+                    print(f"[suggester] In-process request {request!r} failed ({e})")
+                    if replays < MAX_REPLAYS:
+                        metrics.count("suggester.restarts")
+            if _time_first_result is None:
+                _time_first_result = perf_counter()
+            if result is None:
+                print(f"[suggester] Giving up on request {request!r}")
+                capture.record(request, capture.SOURCE_FAILED, 0, (perf_counter() - request_time) * 1000, request_time)
+                with _mutex:
+                    _publish(generation, [], [])
+                continue
+            capture.record(request, capture.SOURCE_BACKEND, len(result),
+                           (perf_counter() - request_time) * 1000, request_time)
+            with _mutex:
+                _publish(generation, result, result)
+                _cache_put(request, result)
+            if metrics.enabled:
+                metrics.record("suggester.subprocess_ms", (time_parse_start - time_sent) * 1000)
+                metrics.record("suggester.parse_ms", (perf_counter() - time_parse_start) * 1000)
+                metrics.record("suggester.result_size", len(result))
+    finally:
+        # The prefetch thread shares the library, so must finish first
+        _stop_prefetch()
+        native.close()
+        print("Suggester thread terminating.")
+
+def _start_prefetch(query: Callable[[str], list[str]]):
+    global _prefetch_thread, _prefetching
+    _prefetching = True
+    _prefetch_thread = Thread(target=_prefetch_main, args=(query,))
+    _prefetch_thread.setDaemon(True)
+    _prefetch_thread.start()
+
+def _stop_prefetch(conn: Union[socket.socket, None] = None):
+    """
+    Stops the prefetch thread and waits for its current request to finish.
+    Shutting down its connection `conn`, if any, cuts that request short.
+    """
+    global _prefetch_thread, _prefetching
+    if _prefetch_thread is not None:
+        _prefetching = False
+        _prefetch_event.set()
+        if conn is not None:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        _prefetch_thread.join()
+        _prefetch_thread = None
+
+def _prefetch_main(query: Callable[[str], list[str]]):
+    """Runs queued prefetches one at a time, caching their results."""
+    while _prefetching:
+        with _mutex:
+            request = _prefetch_queue.popleft() if _prefetch_queue else None
+            if request is None:
+                _prefetch_event.clear()
+        if request is None:
+            _prefetch_event.wait(0.05)
+            continue
+        time_sent = perf_counter()
+        try:
+            result = query(request)
+        except OSError as e:
+            if _prefetching:
+                print(f"[suggester] Stopped prefetching ({e})")
+            return
+        with _mutex:
+            _cache_put(request, result)
+        metrics.count("suggester.prefetches")
+        capture.record(request, capture.SOURCE_PREFETCH, len(result), (perf_counter() - time_sent) * 1000, time_sent)
+
+def _line_query(stdin, stdout) -> Callable[[str], list[str]]:
+    """Returns a function answering requests over a line-protocol connection."""
+    def query(request: str) -> list[str]:
+        stdin.write((request + "\n").encode("utf-8"))
+        stdin.flush()
+        result = []
+        for raw_line in iter(stdout.readline, b""):
+            line = raw_line.decode("utf-8", errors="replace").strip()
+            if line.startswith(_STR_DONE_SUGGESTING):
+                return result
+            if not line.startswith(_STR_IGNORE_LINE):
+                result.append(line)
+        raise OSError("Connection closed")
+    return query
+
+def _connect_service(address: str) -> Union[socket.socket, None]:
+    """Connects to a `gui.service` at `address`, or returns None on failure."""
+    from gui.service import parse_address, DEFAULT_SOCKET
+
+    address = address or DEFAULT_SOCKET
+    kind, where = parse_address(address)
+    try:
+        if kind == "tcp":
+            conn = socket.create_connection(where)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(where)
+    except OSError as e:
+        print(f"[suggester] Could not connect to service at {address} ({e}); starting subprocess")
+        return None
+    return conn
+
+def _queue_output(out, queue, backend):
     """
     Super handy function for reading lines from a subprocess without blocking:
     https://stackoverflow.com/questions/375427/a-non-blocking-read-on-a-subprocess-pipe-in-python
+    Lines are queued as (backend, line) pairs, and (backend, None) at the end.
     """
     try:
         for line in iter(out.readline, b''):
-            queue.put(line)
+            queue.put((backend, line))
         out.close()
+    except (OSError, ValueError):
+        pass
     finally:
+        queue.put((backend, None))
         print("Queue output thread terminating.")
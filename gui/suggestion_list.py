@@ -0,0 +1,192 @@
+import pygame
+from pygame.font import Font
+from pygame import Surface, Rect
+
+from gui.vec import Vec
+from gui.clickable import Clickable
+
+ATLAS_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 '-.,:;!?()/&"
+
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GRAY = (96, 96, 96)
+ROW_HOVER = (40, 40, 72)
+SCROLLBAR_WIDTH = 6
+ROWS_PER_WHEEL_STEP = 3
+
+class GlyphAtlas:
+    """
+    Every character rendered once into a single Surface. Text is drawn by
+    blitting sub-rectangles of the atlas, so no new text surfaces are created
+    while drawing.
+    """
+    def __init__(self, font: Font, color: tuple[int], chars: str = ATLAS_CHARS):
+        self.font = font
+        self.color = color
+        self.height = font.get_height()
+        self.rects = dict()
+        self.image = None
+        self.add_chars(chars)
+
+    def add_chars(self, chars: str):
+        """Adds any missing characters in `chars` to the atlas."""
+        chars = set(chars) - self.rects.keys()
+        if not chars:
+            return
+
+        all_chars = sorted(chars.union(self.rects.keys()))
+        tiles = [(c, self.font.render(c, True, self.color)) for c in all_chars]
+        width = sum(tile.get_width() for _, tile in tiles)
+
+        self.image = Surface((max(width, 1), self.height), pygame.SRCALPHA)
+        self.rects.clear()
+        x = 0
+        for c, tile in tiles:
+            self.image.blit(tile, (x, 0))
+            self.rects[c] = Rect(x, 0, tile.get_width(), self.height)
+            x += tile.get_width()
+
+    def draw(self, surface: Surface, text: str, pos: tuple[int], max_width: int) -> int:
+        """
+        Draws `text` at `pos` on `surface`, stopping before `max_width` pixels
+        are exceeded. Returns the width drawn.
+        """
+        rects = self.rects
+        if not rects.keys() >= set(text):
+            self.add_chars(text)
+            rects = self.rects
+
+        x, y = pos
+        blits = []
+        for c in text:
+            rect = rects[c]
+            if x + rect.width - pos[0] > max_width:
+                break
+            blits.append((self.image, (x, y), rect))
+            x += rect.width
+        surface.blits(blits, doreturn=False)
+        return x - pos[0]
+
+class SuggestionList(Clickable):
+    """
+    Scrollable list of suggestions. Only the rows that are currently visible
+    are drawn, so the cost of a redraw does not depend on how many suggestions
+    the list holds. `exec_func` is called with the word of a clicked row.
+    Rows may show a label other than the word, such as a near miss with the
+    letters that would change in lowercase.
+    """
+    def __init__(self, corner: Vec, size: Vec, font: Font, surface: Surface, exec_func):
+        super().__init__(corner, corner + size - 1, exec_func)
+        self.surface = surface
+        self.size = Vec(size)
+        self.atlas = GlyphAtlas(font, WHITE)
+        self.atlas_status = GlyphAtlas(font, GRAY)
+        self.row_height = self.atlas.height + 2
+        self.header_height = self.row_height + 4
+        self.visible_rows = (self.size.Y - self.header_height) // self.row_height
+        self.image = Surface(self.size.tp())
+
+        self.words = []
+        self.labels = []
+        self.near_misses = False
+        self.top = 0
+        self.hover = None
+        self.done = True
+        self.dirty = True
+
+    # ----- #
+    # State #
+    # ----- #
+
+    def clear(self, near_misses: bool = False):
+        """
+        Empties the list in preparation for a new set of suggestions, which
+        are near misses rather than matches if `near_misses` is True.
+        """
+        self.words = []
+        self.labels = []
+        self.near_misses = near_misses
+        self.top = 0
+        self.hover = None
+        self.done = False
+        self.dirty = True
+
+    def extend(self, words: list[str], done: bool = False, labels: list[str] = None):
+        """
+        Appends a page of suggestions, shown as `labels` if given. Nothing is
+        rendered here; the header, scrollbar and visible rows are refreshed on
+        the next `draw()`.
+        """
+        self.words.extend(words)
+        self.labels.extend(labels if labels is not None else words)
+        self.done = done
+        self.dirty = True
+
+    def scroll(self, rows: int):
+        new_top = max(0, min(self.top + rows, len(self.words) - self.visible_rows))
+        if new_top != self.top:
+            self.top = new_top
+            self.dirty = True
+
+    def get_row(self, pos: Vec) -> int:
+        """Returns the index of the word under `pos`, or None."""
+        if not self.in_range(pos):
+            return None
+        y = pos.Y - self.min.Y - self.header_height
+        if y < 0:
+            return None
+        idx = self.top + y // self.row_height
+        return idx if idx < len(self.words) else None
+
+    def set_hover(self, pos: Vec):
+        hover = self.get_row(pos)
+        if hover != self.hover:
+            self.hover = hover
+            self.dirty = True
+
+    def click_if_in_range(self, pos: Vec):
+        idx = self.get_row(pos)
+        if idx is not None:
+            self.exec_func(self.words[idx])
+
+    # ------- #
+    # Drawing #
+    # ------- #
+
+    def draw(self):
+        """Redraws the list if anything visible changed since the last draw."""
+        if self.dirty:
+            self.redraw()
+
+    def redraw(self):
+        img = self.image
+        img.fill(BLACK)
+        width = self.size.X - SCROLLBAR_WIDTH - 4
+
+        # Header with the number of suggestions
+        kind = "near misses" if self.near_misses else "matches"
+        status = f"{len(self.words)} {kind}" if self.done else f"{len(self.words)}..."
+        self.atlas_status.draw(img, status, (2, 2), width)
+        img.fill(GRAY, Rect(0, self.header_height - 2, self.size.X, 1))
+
+        # Visible rows only
+        y = self.header_height
+        end = min(self.top + self.visible_rows, len(self.words))
+        for idx in range(self.top, end):
+            if idx == self.hover:
+                img.fill(ROW_HOVER, Rect(0, y, width + 2, self.row_height))
+            self.atlas.draw(img, self.labels[idx], (2, y + 1), width)
+            y += self.row_height
+
+        # Scrollbar
+        total = len(self.words)
+        if total > self.visible_rows:
+            track = self.size.Y - self.header_height
+            bar_len = max(8, track * self.visible_rows // total)
+            bar_pos = (track - bar_len) * self.top // (total - self.visible_rows)
+            img.fill(GRAY, Rect(self.size.X - SCROLLBAR_WIDTH,
+                                self.header_height + bar_pos,
+                                SCROLLBAR_WIDTH, bar_len))
+
+        self.surface.blit(img, self.min.tp())
+        self.dirty = False
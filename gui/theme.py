@@ -0,0 +1,387 @@
+"""
+Placement optimizer for theme entries.
+
+    python -m gui.theme STARGAZER MOONSHINE SUNFLOWER --grid layout.txt
+    python -m gui.theme STARGAZER MOONSHINE SUNFLOWER --generate 64 --size 15x15
+
+Given a list of theme entries and a block layout, enumerates every way of
+placing the entries in slots of their length such that the placement is
+symmetric: a theme entry's slot and the slot opposite it under 180 degree
+rotation both hold theme entries, crossing entries agree on their shared
+letters, and only a self-symmetric slot holds an entry on its own. Each
+placement is scored by how fillable the rest of the grid is, from the number
+of dictionary words that fit each remaining slot, and the best placements
+are printed as grids.
+
+With `--generate`, layouts are generated instead: theme entries are laid
+across symmetric rows with blocks at their ends, and random symmetric
+blocks are added around them while every white square stays in an across
+and a down word of at least three letters.
+
+Layouts and chunks of placements are scored by a pool of worker processes,
+which share one memory-mapped `WordIndex` (see gui.wordlist).
+"""
+import os
+import sys
+import json
+import math
+import heapq
+import random
+import argparse
+from time import perf_counter
+from typing import Iterator, Union
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from gui import grid_io
+from gui.slots import Slot, DIR_NAMES, ACROSS, extract_slots, run_lengths
+from gui.parallel import bounded_map
+from gui.wordlist import WordIndex, DEFAULT_DICT, normalize_word
+
+MIN_WORD_LEN = 3
+# Fraction of squares that generated layouts aim to make dark
+BLOCK_DENSITY = 0.16
+# Random block placements tried per generated layout
+GENERATE_TRIES = 400
+# Placements enumerated per layout before giving up on finding more
+MAX_PLACEMENTS = 5000
+# Placements scored per task sent to a worker
+CHUNK_SIZE = 64
+
+# Per-process state, set up once by `init_worker()`
+_index = None
+_counts = dict()
+
+class Placement:
+    """A theme entry in a slot."""
+    def __init__(self, word: str, slot: Slot):
+        self.word = word
+        self.slot = slot
+
+    def to_dict(self) -> dict:
+        return dict(self.slot.to_dict(), word=self.word)
+
+class Result:
+    """A scored placement of every theme entry in a layout."""
+    def __init__(self, score: float, min_count: int, placements: list[Placement], grid: numpy.ndarray):
+        self.score = score
+        self.min_count = min_count
+        self.placements = placements
+        self.grid = grid
+
+    def __lt__(self, other) -> bool:
+        return (self.min_count > 0, self.score) < (other.min_count > 0, other.score)
+
+    def to_dict(self) -> dict:
+        return {
+            "score": round(self.score, 4),
+            "min_count": self.min_count,
+            "placements": [placement.to_dict() for placement in self.placements],
+            "rows": grid_io.to_rows(self.grid),
+        }
+
+def init_worker(index_path: str):
+    global _index
+    _index = WordIndex.attach(index_path)
+
+def count_candidates(pattern: str) -> int:
+    """Returns the number of words matching `pattern`, caching the answer."""
+    count = _counts.get(pattern)
+    if count is None:
+        count = _counts[pattern] = _index.count(pattern)
+    return count
+
+def partner_of(slot: Slot, width: int, height: int) -> tuple[int, int, int]:
+    """Returns the (x, y, direction) of the slot opposite `slot` under 180 degree rotation."""
+    if slot.direction == ACROSS:
+        return width - slot.x - slot.length, height - 1 - slot.y, slot.direction
+    return width - 1 - slot.x, height - slot.y - slot.length, slot.direction
+
+def find_placements(grid: numpy.ndarray, words: list[str], slots: list[Slot],
+                    limit: int = MAX_PLACEMENTS) -> Iterator[list[Placement]]:
+    """
+    Yields up to `limit` symmetric placements of `words` into `slots` of
+    `grid`, which is left unchanged.
+    """
+    width, height = grid.shape
+    by_key = {(slot.x, slot.y, slot.direction): slot for slot in slots}
+    partners = {id(slot): by_key.get(partner_of(slot, width, height)) for slot in slots}
+    by_length = dict()
+    for slot in slots:
+        by_length.setdefault(slot.length, []).append(slot)
+
+    # Longest first, as they have the fewest slots to go in
+    words = sorted(words, key=len, reverse=True)
+    grid = grid.copy()
+    used = set()
+    placed = []
+    found = [0]
+
+    def place(i: int) -> Iterator[list[Placement]]:
+        if i == len(words):
+            if all(id(partners[id(p.slot)]) in used for p in placed if partners[id(p.slot)] is not None):
+                found[0] += 1
+                yield list(placed)
+            return
+        word = words[i]
+        codes = numpy.frombuffer(word.encode("ascii"), dtype=numpy.uint8)
+        for slot in by_length.get(len(word), []):
+            if id(slot) in used or partners[id(slot)] is None:
+                continue
+            cells = slot.cells(grid)
+            if not ((cells == grid_io.BLANK) | (cells == codes)).all():
+                continue
+            saved = cells.copy()
+            cells[:] = codes
+            used.add(id(slot))
+            placed.append(Placement(word, slot))
+            yield from place(i + 1)
+            placed.pop()
+            used.discard(id(slot))
+            cells[:] = saved
+            if found[0] >= limit:
+                return
+
+    yield from place(0)
+
+def score_placement(grid: numpy.ndarray, slots: list[Slot], placements: list[Placement]) -> Result:
+    """
+    Scores how fillable `grid` is with `placements` written in: the mean of
+    log(1 + n) over the open slots, where n is the number of words that fit
+    the slot. `min_count` is the smallest n; with 0, the grid cannot be
+    filled at all.
+    """
+    grid = grid.copy()
+    for placement in placements:
+        placement.slot.cells(grid)[:] = numpy.frombuffer(placement.word.encode("ascii"), dtype=numpy.uint8)
+
+    total = 0.0
+    open_slots = 0
+    min_count = None
+    for slot in slots:
+        pattern = slot.pattern(grid)
+        if "*" not in pattern:
+            continue
+        count = count_candidates(pattern)
+        total += math.log1p(count)
+        open_slots += 1
+        min_count = count if min_count is None else min(min_count, count)
+    score = total / open_slots if open_slots else 0.0
+    return Result(score, min_count or 0, placements, grid)
+
+def score_chunk(task: tuple[numpy.ndarray, list[list[tuple[str, int]]], int]) -> list[Result]:
+    """Scores a chunk of placements, given as (word, slot index) pairs, keeping the best `top`."""
+    grid, chunk, top = task
+    slots = extract_slots(grid)
+    results = []
+    for pairs in chunk:
+        placements = [Placement(word, slots[idx]) for word, idx in pairs]
+        heapq.heappush(results, score_placement(grid, slots, placements))
+        if len(results) > top:
+            heapq.heappop(results)
+    return results
+
+def search_layout(task: tuple[int, int, int, list[str], int]) -> list[Result]:
+    """Generates a layout from a seed and returns its best `top` placements."""
+    width, height, seed, words, top = task
+    grid = generate_layout(width, height, words, random.Random(seed))
+    if grid is None:
+        return []
+    slots = extract_slots(grid)
+    results = []
+    for placements in find_placements(grid, words, slots):
+        heapq.heappush(results, score_placement(grid, slots, placements))
+        if len(results) > top:
+            heapq.heappop(results)
+    return results
+
+def is_valid_layout(open_: numpy.ndarray) -> bool:
+    """
+    Returns whether every white square is in an across and a down word of
+    at least MIN_WORD_LEN letters, and all white squares are connected.
+    """
+    for axis in (0, 1):
+        forward = run_lengths(open_, axis)
+        backward = numpy.flip(run_lengths(numpy.flip(open_, axis), axis), axis)
+        if ((forward + backward - 1)[open_] < MIN_WORD_LEN).any():
+            return False
+
+    # Flood fill from the first white square
+    cells = numpy.argwhere(open_)
+    if not len(cells):
+        return False
+    seen = numpy.zeros_like(open_)
+    stack = [tuple(cells[0])]
+    seen[stack[0]] = True
+    width, height = open_.shape
+    while stack:
+        x, y = stack.pop()
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= nx < width and 0 <= ny < height and open_[nx, ny] and not seen[nx, ny]:
+                seen[nx, ny] = True
+                stack.append((nx, ny))
+    return int(seen.sum()) == len(cells)
+
+def generate_layout(width: int, height: int, words: list[str],
+                    rng: random.Random) -> Union[numpy.ndarray, None]:
+    """
+    Returns a symmetric block layout with room for `words` across, or None
+    if the words could not be laid out. Entries of equal length are paired
+    on opposite rows; one entry may go in the middle row, if centered.
+    """
+    grid = numpy.full((width, height), grid_io.BLANK, dtype=numpy.uint8)
+    fixed = numpy.zeros((width, height), dtype=bool)
+
+    def block(x: int, y: int):
+        for bx, by in ((x, y), (width - 1 - x, height - 1 - y)):
+            if fixed[bx, by]:
+                return False
+        grid[x, y] = grid[width - 1 - x, height - 1 - y] = grid_io.DARK
+        return True
+
+    def reserve(x: int, y: int, length: int) -> bool:
+        """
+        Reserves an across entry and its mirror image, with blocks at their
+        ends. A gap too short for a word between an end and the edge of the
+        grid is blocked entirely. Nothing changes if the layout would become
+        invalid.
+        """
+        for rx, ry in ((x, y), (width - x - length, height - 1 - y)):
+            if fixed[rx:rx + length, ry].any() or (grid[rx:rx + length, ry] == grid_io.DARK).any():
+                return False
+        saved = grid.copy(), fixed.copy()
+        for rx, ry in ((x, y), (width - x - length, height - 1 - y)):
+            fixed[rx:rx + length, ry] = True
+        ends = list(range(x - 1, -1, -1) if x < MIN_WORD_LEN + 1 else [x - 1])
+        gap = width - x - length
+        ends += list(range(x + length, width) if gap < MIN_WORD_LEN + 1 else [x + length])
+        if all(block(ex, y) for ex in ends if 0 <= ex < width) and is_valid_layout(grid != grid_io.DARK):
+            return True
+        grid[:], fixed[:] = saved
+        return False
+
+    # Pair up entries of equal length; an unpaired one goes in the middle
+    by_length = dict()
+    for word in words:
+        by_length.setdefault(len(word), []).append(word)
+    middle = [w for ws in by_length.values() if len(ws) % 2 for w in ws[:1]]
+    if len(middle) > 1 or (middle and (height % 2 == 0 or (width - len(middle[0])) % 2)):
+        return None
+    if middle and not reserve((width - len(middle[0])) // 2, height // 2, len(middle[0])):
+        return None
+    pairs = [len(ws[i]) for ws in by_length.values() for i in range(len(ws) % 2, len(ws), 2)]
+    rows = [y for y in range(height // 2) if y % 2 == 0 or rng.random() < 0.3]
+    for length in pairs:
+        if length > width:
+            return None
+        rng.shuffle(rows)
+        for y in rows:
+            if reserve(rng.randint(0, width - length), y, length):
+                rows.remove(y)
+                break
+        else:
+            return None
+
+    # Add symmetric blocks around the entries for as long as the layout stays valid
+    target = int(width * height * BLOCK_DENSITY)
+    for _ in range(GENERATE_TRIES):
+        if int((grid == grid_io.DARK).sum()) >= target:
+            break
+        x, y = rng.randrange(width), rng.randrange(height)
+        if fixed[x, y] or fixed[width - 1 - x, height - 1 - y] or grid[x, y] == grid_io.DARK:
+            continue
+        saved = grid.copy()
+        block(x, y)
+        if not is_valid_layout(grid != grid_io.DARK):
+            grid[:] = saved
+    return grid if is_valid_layout(grid != grid_io.DARK) else None
+
+def chunked(placements: Iterator[list[Placement]], slots: list[Slot]) -> Iterator[list[list[tuple[str, int]]]]:
+    """Groups placements into chunks of (word, slot index) pairs, which pickle compactly."""
+    index_of = {id(slot): i for i, slot in enumerate(slots)}
+    chunk = []
+    for placements_ in placements:
+        chunk.append([(p.word, index_of[id(p.slot)]) for p in placements_])
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def optimize(words: list[str], index_path: str, grid: Union[numpy.ndarray, None] = None,
+             size: tuple[int, int] = (15, 15), layouts: int = 64, seed: int = 0,
+             top: int = 10, workers: int = os.cpu_count()) -> list[Result]:
+    """
+    Returns the `top` placements of `words`, best first, either in `grid`
+    or in `layouts` generated layouts of `size`.
+    """
+    best = []
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(index_path,)) as executor:
+        if grid is not None:
+            slots = extract_slots(grid)
+            tasks = ((grid, chunk, top) for chunk in chunked(find_placements(grid, words, slots), slots))
+            results = bounded_map(executor, score_chunk, tasks, workers * 2)
+        else:
+            tasks = ((size[0], size[1], seed + i, words, top) for i in range(layouts))
+            results = bounded_map(executor, search_layout, tasks, workers * 2)
+        for chunk_results in results:
+            for result in chunk_results:
+                heapq.heappush(best, result)
+                if len(best) > top:
+                    heapq.heappop(best)
+    return sorted(best, reverse=True)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.theme",
+                                     description="Find fillable symmetric placements of theme entries.")
+    parser.add_argument("words", nargs="+", help="theme entries")
+    parser.add_argument("--grid", help="block layout to place the entries in (any grid file)")
+    parser.add_argument("--generate", type=int, default=64, metavar="N",
+                        help="without --grid, generate N layouts (default: %(default)s)")
+    parser.add_argument("--size", default="15x15", help="size of generated layouts (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for generated layouts")
+    parser.add_argument("--top", type=int, default=5, help="number of placements to show")
+    parser.add_argument("--dict", default=str(DEFAULT_DICT), help="dictionary file (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--json", action="store_true", help="print the placements as JSON")
+    args = parser.parse_args()
+
+    words = []
+    for word in args.words:
+        normalized = normalize_word(word)
+        if normalized is None:
+            parser.error(f"{word!r} is not a usable entry")
+        words.append(normalized)
+
+    grid = None
+    if args.grid:
+        try:
+            grid = grid_io.read_grid(args.grid)
+        except (OSError, grid_io.GridFormatError) as e:
+            parser.error(f"Could not read {args.grid}: {e}")
+    try:
+        size = tuple(int(n) for n in args.size.lower().split("x"))
+    except ValueError:
+        parser.error(f"Invalid size {args.size!r}; expected WIDTHxHEIGHT")
+
+    _, index_path = WordIndex.cached(args.dict)
+    time_start = perf_counter()
+    results = optimize(words, str(index_path), grid, size, args.generate, args.seed, args.top, args.workers)
+    elapsed = perf_counter() - time_start
+
+    if args.json:
+        print(json.dumps([result.to_dict() for result in results], indent=2))
+    else:
+        for rank, result in enumerate(results, 1):
+            print(f"#{rank}: score {result.score:.3f}, tightest slot fits {result.min_count} word(s)")
+            for placement in result.placements:
+                slot = placement.slot
+                print(f"  {placement.word} at {slot.number} {DIR_NAMES[slot.direction]}")
+            for row in grid_io.to_rows(result.grid):
+                print("  " + row)
+    print(f"Found {len(results)} placement(s) in {elapsed:.2f} s", file=sys.stderr)
+    sys.exit(0 if results else 1)
+
+if __name__ == "__main__":
+    main()
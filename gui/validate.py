@@ -0,0 +1,219 @@
+"""
+Whole-grid validation for `uint8` grids (see gui.grid_io), without pygame.
+
+    python -m gui.validate puzzle.cwg
+
+Checks a grid for the problems that make it unpublishable:
+
+    unknown_word  a complete entry that is not in the dictionary
+    duplicate     the same complete entry appearing more than once
+    too_short     an entry shorter than MIN_WORD_LEN letters
+    unchecked     an open tile that belongs to only one entry, or to none
+
+Every problem carries the coordinates of the tiles involved. The entries are
+gathered from the grid in one fancy-indexing pass per entry length rather
+than slot by slot, and all the complete entries of a length are looked up
+in the dictionary's shared `WordIndex` with a single binary search, so a
+full 20x20 grid validates in about a millisecond without the dictionary
+being copied into every process.
+`validate()` is used by the editor when saving and loading, and by gui.batch.
+"""
+from __future__ import annotations
+import sys
+import argparse
+from pathlib import Path
+from collections import Counter
+from typing import Union
+
+import numpy
+
+from gui import grid_io
+from gui.slots import Slot, DIR_NAMES, ACROSS, extract_slots, run_lengths
+from gui.wordlist import WordIndex, DEFAULT_DICT
+
+MIN_WORD_LEN = 3
+
+UNKNOWN_WORD = "unknown_word"
+DUPLICATE = "duplicate"
+TOO_SHORT = "too_short"
+UNCHECKED = "unchecked"
+
+class Problem:
+    """A problem with a grid, on the tiles at `cells`."""
+    def __init__(self, kind: str, message: str, cells: list[tuple[int, int]],
+                 slot: Union[Slot, None] = None, word: Union[str, None] = None):
+        self.kind = kind
+        self.message = message
+        self.cells = cells
+        self.slot = slot
+        self.word = word
+
+    def __repr__(self) -> str:
+        return f"Problem({self.kind}: {self.message})"
+
+    def __str__(self) -> str:
+        return self.message
+
+    def to_dict(self) -> dict:
+        result = {"kind": self.kind, "message": self.message, "cells": [list(cell) for cell in self.cells]}
+        if self.slot is not None:
+            result["slot"] = self.slot.to_dict()
+        if self.word is not None:
+            result["word"] = self.word
+        return result
+
+class WordSet:
+    """
+    The words of some dictionaries, less the words of others. Words are
+    looked up in the dictionaries' shared, memory-mapped `WordIndex` files
+    rather than copied into this process.
+    """
+    def __init__(self, included: list[WordIndex], excluded: Union[list[WordIndex], None] = None):
+        self.included = included
+        self.excluded = excluded or []
+
+    @classmethod
+    def from_index(cls, index: WordIndex) -> WordSet:
+        return cls([index])
+
+    @classmethod
+    def from_dictionaries(cls, dictionaries: list[str], stack: Union[list[str], None] = None) -> WordSet:
+        """
+        Returns the set the suggester would suggest from, given dictionaries
+        as passed to `suggester.init()` and a stack as passed to
+        `suggester.set_stack()`. Raises OSError if a dictionary is missing.
+        """
+        stack = stack or []
+        paths = dict()
+        for entry in dictionaries:
+            name, sep, path = str(entry).partition("=")
+            if not sep:
+                name, path = Path(entry).stem, entry
+            paths[name] = path
+        included = [name[1:] for name in stack if name.startswith("+")] or list(paths)
+        excluded = [name[1:] for name in stack if name.startswith("-")]
+
+        def indexes_of(names: list[str]) -> list[WordIndex]:
+            return [WordIndex.cached(paths[name])[0] for name in names if name in paths]
+
+        return cls(indexes_of(included), indexes_of(excluded))
+
+    def contains_rows(self, rows: numpy.ndarray) -> numpy.ndarray:
+        """Returns which rows of a (count, length) uint8 matrix of letters are words."""
+        found = numpy.zeros(len(rows), dtype=bool)
+        for index in self.included:
+            found |= index.contains_rows(rows)
+        for index in self.excluded:
+            found &= ~index.contains_rows(rows)
+        return found
+
+    def __contains__(self, word: Union[str, bytes]) -> bool:
+        if isinstance(word, str):
+            word = word.encode("ascii", errors="replace")
+        rows = numpy.frombuffer(word.upper(), dtype=numpy.uint8)[None, :]
+        return bool(self.contains_rows(rows)[0])
+
+def gather_entries(grid: numpy.ndarray, slots: list[Slot]) -> dict[int, tuple[list[Slot], numpy.ndarray]]:
+    """
+    Returns, for every slot length, the slots of that length and a
+    (count, length) matrix of their tiles, gathered in a single indexing
+    operation.
+    """
+    by_length = dict()
+    for slot in slots:
+        by_length.setdefault(slot.length, []).append(slot)
+
+    entries = dict()
+    for length, group in by_length.items():
+        steps = numpy.arange(length)
+        xs = numpy.array([slot.x for slot in group])[:, None]
+        ys = numpy.array([slot.y for slot in group])[:, None]
+        across = numpy.array([slot.direction == ACROSS for slot in group])[:, None]
+        entries[length] = group, grid[xs + steps * across, ys + steps * ~across]
+    return entries
+
+def validate(grid: numpy.ndarray, words: Union[WordSet, None] = None,
+             slots: Union[list[Slot], None] = None) -> list[Problem]:
+    """
+    Returns every problem with `grid`, grouped by kind and in clue order
+    within each kind. Complete entries are only checked against the
+    dictionary if `words` is given. `slots` may be passed if already
+    extracted.
+    """
+    if slots is None:
+        slots = extract_slots(grid)
+    problems = []
+
+    # Entry lengths through every tile, across and down
+    open_ = grid != grid_io.DARK
+    spans = []
+    for axis in (0, 1):
+        forward = run_lengths(open_, axis)
+        backward = numpy.flip(run_lengths(numpy.flip(open_, axis), axis), axis)
+        spans.append(forward + backward - 1)
+
+    unknown = []
+    complete = []
+    for length, (group, tiles) in gather_entries(grid, slots).items():
+        is_complete = (tiles != grid_io.BLANK).all(axis=1)
+        keys = numpy.ascontiguousarray(tiles).view(f"S{length}")[:, 0]
+        known = words.contains_rows(tiles) if words is not None else None
+        for i in numpy.flatnonzero(is_complete):
+            complete.append((group[i], keys[i]))
+            if known is not None and not known[i]:
+                unknown.append((group[i], keys[i]))
+    complete.sort(key=lambda entry: (entry[0].number, entry[0].direction))
+    unknown.sort(key=lambda entry: (entry[0].number, entry[0].direction))
+
+    for slot, key in unknown:
+        word = key.decode("ascii")
+        problems.append(Problem(UNKNOWN_WORD, f"{slot_name(slot)}: {word} is not in the dictionary",
+                                list(slot.positions()), slot, word))
+
+    counts = Counter(key for _, key in complete)
+    for key in [key for key, count in counts.items() if count > 1]:
+        repeats = [slot for slot, other in complete if other == key]
+        word = key.decode("ascii")
+        names = ", ".join(map(slot_name, repeats))
+        cells = [cell for slot in repeats for cell in slot.positions()]
+        problems.append(Problem(DUPLICATE, f"{word} appears {len(repeats)} times: {names}",
+                                cells, repeats[0], word))
+
+    for slot in slots:
+        if slot.length < MIN_WORD_LEN:
+            problems.append(Problem(TOO_SHORT, f"{slot_name(slot)} has only {slot.length} letters",
+                                    list(slot.positions()), slot))
+
+    unchecked = open_ & ((spans[0] < 2) | (spans[1] < 2))
+    for y, x in numpy.argwhere(unchecked.T):
+        problems.append(Problem(UNCHECKED, f"Tile ({x}, {y}) is not crossed by another entry", [(int(x), int(y))]))
+    return problems
+
+def slot_name(slot: Slot) -> str:
+    return f"{slot.number} {DIR_NAMES[slot.direction]}"
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m gui.validate", description="Check grid files for problems.")
+    parser.add_argument("paths", nargs="+", help="grid files")
+    parser.add_argument("--dict", default=str(DEFAULT_DICT), help="dictionary file (default: %(default)s)")
+    args = parser.parse_args()
+
+    index, _ = WordIndex.cached(args.dict)
+    words = WordSet.from_index(index)
+    failed = 0
+    for path in args.paths:
+        try:
+            grid = grid_io.read_grid(path)
+        except (OSError, grid_io.GridFormatError) as e:
+            print(f"{path}: {e}")
+            failed += 1
+            continue
+        problems = validate(grid, words)
+        print(f"{path}: {len(problems)} problem(s)")
+        for problem in problems:
+            print(f"  {problem}")
+        failed += bool(problems)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,13 @@ from __future__ import annotations
 from math import floor, ceil
 
 from typing import Union
-from numpy import iterable
+
+def iterable(obj) -> bool:
+    try:
+        iter(obj)
+    except TypeError:
+        return False
+    return True
 
 class Vec:
     def __init__(self, X: Union[float, None] = None, Y: Union[float, None] = None):
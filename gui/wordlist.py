@@ -0,0 +1,240 @@
+"""
+Pure-Python (NumPy) word index, for tools that run without the C++ word
+suggester, such as batch jobs.
+
+Words are stored uppercase in a `uint8` matrix with one row per word, padded
+with zeros, and sorted by length and then alphabetically. Each length
+therefore occupies a contiguous block of rows, and a pattern is matched by
+comparing the columns of its fixed letters within that block.
+
+A built index can be saved to a file and attached from any number of
+processes with `WordIndex.attach()`, which maps the file read-only instead of
+copying it, so every process shares one physical copy of the index.
+`WordIndex.cached()` does both, reusing the file of an earlier build while
+the dictionary is unchanged.
+"""
+from __future__ import annotations
+import os
+import struct
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Iterable, Union
+
+import numpy
+
+MAX_WORD_LEN = 31
+DATA_DIR = Path(__file__).parent.parent.joinpath("word-suggester", "data")
+DEFAULT_DICT = DATA_DIR.joinpath("american.txt")
+WILDCARD = ord("*")
+PHRASE_PUNCTUATION = " '-."
+_DROP_PUNCTUATION = str.maketrans("", "", PHRASE_PUNCTUATION)
+
+# Saved index files: header, then `offsets` as int64, then the word matrix
+INDEX_HEADER = struct.Struct("<4sIQ")
+INDEX_MAGIC = b"CWIX"
+INDEX_EXT = ".cwix"
+CACHE_DIR = Path(tempfile.gettempdir()).joinpath(
+    f"crossword-index-{os.getuid() if hasattr(os, 'getuid') else 0}")
+
+def normalize_word(word: str) -> Union[str, None]:
+    """
+    Returns the uppercase letters of a dictionary entry, or None if it is
+    not usable. Phrases keep only their letters, so "cat's-paw" becomes
+    "CATSPAW", and a trailing part-of-speech tag such as "(p)" is dropped,
+    as in the C++ word suggester.
+    """
+    word = word.strip()
+    if word.endswith(")") and "(" in word:
+        word = word[:word.rindex("(")]
+    if not word.isascii():
+        return None
+    letters = word.translate(_DROP_PUNCTUATION).upper()
+    if 0 < len(letters) <= MAX_WORD_LEN and letters.isalpha():
+        return letters
+    return None
+
+def read_words(path: Union[str, Path]) -> list[str]:
+    """Reads a dictionary file, one word per line, dropping unusable entries."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return [word for word in map(normalize_word, f) if word is not None]
+
+class WordIndex:
+    def __init__(self, words: numpy.ndarray, offsets: numpy.ndarray):
+        """
+        Use `from_words()` or `from_file()` to build an index.
+
+        Parameters
+        ----------
+        words: uint8 matrix of shape (count, MAX_WORD_LEN), sorted by length
+        offsets: offsets[L] is the first row of words of length L, and
+                 offsets[MAX_WORD_LEN + 1] the number of words
+        """
+        self.words = words
+        self.offsets = offsets
+
+    @classmethod
+    def from_words(cls, words: Iterable[str]) -> WordIndex:
+        unique = sorted(set(words), key=lambda w: (len(w), w))
+        matrix = numpy.zeros((len(unique), MAX_WORD_LEN), dtype=numpy.uint8)
+        if unique:
+            lengths = numpy.fromiter(map(len, unique), dtype=numpy.int64, count=len(unique))
+            flat = numpy.frombuffer("".join(unique).encode("ascii"), dtype=numpy.uint8)
+            rows = numpy.repeat(numpy.arange(len(unique)), lengths)
+            cols = numpy.arange(len(flat)) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+            matrix[rows, cols] = flat
+        else:
+            lengths = numpy.zeros(0, dtype=numpy.int64)
+        counts = numpy.bincount(lengths, minlength=MAX_WORD_LEN + 1)
+        offsets = numpy.zeros(MAX_WORD_LEN + 2, dtype=numpy.int64)
+        offsets[1:] = numpy.cumsum(counts)
+        return cls(matrix, offsets)
+
+    @classmethod
+    def from_file(cls, path: Union[str, Path] = DEFAULT_DICT) -> WordIndex:
+        return cls.from_words(read_words(path))
+
+    def save(self, path: Union[str, Path]):
+        """
+        Writes the index to `path` for `attach()`. The file is replaced
+        atomically, so processes attached to an older version keep working.
+        """
+        path = Path(path)
+        path_tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(path_tmp, "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, MAX_WORD_LEN, len(self)))
+            f.write(self.offsets.astype("<i8").tobytes())
+            f.write(numpy.ascontiguousarray(self.words).tobytes())
+        os.replace(path_tmp, path)
+
+    @classmethod
+    def attach(cls, path: Union[str, Path]) -> WordIndex:
+        """
+        Maps an index written by `save()`. Nothing is copied: the pages are
+        shared with every other process attached to the same file.
+        """
+        data = numpy.memmap(path, dtype=numpy.uint8, mode="r")
+        magic, max_len, count = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or max_len != MAX_WORD_LEN:
+            raise ValueError(f"{path} is not a word index")
+        start = INDEX_HEADER.size
+        end = start + 8 * (MAX_WORD_LEN + 2)
+        offsets = data[start:end].view("<i8")
+        words = data[end:end + count * MAX_WORD_LEN].reshape(count, MAX_WORD_LEN)
+        return cls(words, offsets)
+
+    @classmethod
+    def cached(cls, dict_path: Union[str, Path] = DEFAULT_DICT,
+               cache_dir: Union[str, Path] = CACHE_DIR) -> tuple[WordIndex, Path]:
+        """
+        Attaches to the saved index of `dict_path`, building and saving it
+        first if the dictionary is new or has changed since. Returns the index
+        and the path of the file, which other processes can `attach()`.
+        """
+        stat = os.stat(dict_path)
+        key = f"{Path(dict_path).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+        path = Path(cache_dir).joinpath(hashlib.sha1(key.encode("utf-8")).hexdigest() + INDEX_EXT)
+        try:
+            return cls.attach(path), path
+        except (OSError, ValueError):
+            pass
+        path.parent.mkdir(parents=True, exist_ok=True)
+        cls.from_file(dict_path).save(path)
+        return cls.attach(path), path
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def bucket(self, length: int) -> numpy.ndarray:
+        """Returns a view of the rows holding words of exactly `length` letters."""
+        if not 0 < length <= MAX_WORD_LEN:
+            return self.words[:0, :0]
+        return self.words[self.offsets[length]:self.offsets[length + 1], :length]
+
+    def match_mask(self, pattern: str) -> numpy.ndarray:
+        """
+        Returns a boolean mask over `bucket(len(pattern))` of the words that
+        match `pattern`, where '*' is a wildcard.
+        """
+        bucket = self.bucket(len(pattern))
+        codes = numpy.frombuffer(pattern.upper().encode("ascii"), dtype=numpy.uint8)
+        fixed = numpy.flatnonzero(codes != WILDCARD)
+        mask = numpy.ones(len(bucket), dtype=bool)
+        for pos in fixed:
+            mask &= bucket[:, pos] == codes[pos]
+        return mask
+
+    def match(self, pattern: str) -> list[str]:
+        """Returns every word matching `pattern`, in alphabetical order."""
+        rows = self.bucket(len(pattern))[self.match_mask(pattern)]
+        return [row.tobytes().decode("ascii") for row in rows]
+
+    def count(self, pattern: str) -> int:
+        return int(numpy.count_nonzero(self.match_mask(pattern)))
+
+    def match_near(self, pattern: str, max_mismatches: int) -> list[tuple[str, list[int]]]:
+        """
+        Returns every word differing from `pattern` in at most
+        `max_mismatches` of its letters, with the positions that differ,
+        fewest differences first and alphabetically within each count.
+        """
+        bucket = self.bucket(len(pattern))
+        codes = numpy.frombuffer(pattern.upper().encode("ascii"), dtype=numpy.uint8)
+        fixed = numpy.flatnonzero(codes != WILDCARD)
+        differs = bucket[:, fixed] != codes[fixed]
+        counts = differs.sum(axis=1)
+        rows = numpy.flatnonzero(counts <= max_mismatches)
+        rows = rows[numpy.argsort(counts[rows], kind="stable")]
+        return [(bucket[row].tobytes().decode("ascii"), fixed[differs[row]].tolist()) for row in rows]
+
+    def match_affixes(self, prefix: str = "", suffix: str = "", min_length: int = 1,
+                      max_length: int = MAX_WORD_LEN) -> list[str]:
+        """
+        Returns every word that starts with `prefix`, ends with `suffix` and
+        is from `min_length` to `max_length` letters long, shortest first and
+        alphabetically within each length.
+        """
+        prefix, suffix = prefix.upper(), suffix.upper()
+        words = []
+        for length in range(max(min_length, len(prefix), len(suffix), 1), min(max_length, MAX_WORD_LEN) + 1):
+            pattern = ["*"] * length
+            pattern[:len(prefix)] = prefix
+            tail = pattern[length - len(suffix):]
+            # A prefix and suffix that overlap must agree where they do
+            if any(have not in ("*", want) for have, want in zip(tail, suffix)):
+                continue
+            pattern[length - len(suffix):] = suffix
+            words.extend(self.match("".join(pattern)))
+        return words
+
+    def __contains__(self, word: str) -> bool:
+        # Binary search within the length's block, which is sorted
+        length = len(word)
+        if not 0 < length <= MAX_WORD_LEN:
+            return False
+        rows = self.words[self.offsets[length]:self.offsets[length + 1]]
+        keys = rows.view(f"S{MAX_WORD_LEN}")[:, 0]
+        key = word.upper().encode("ascii", errors="replace")
+        idx = int(numpy.searchsorted(keys, key))
+        return idx < len(keys) and keys[idx] == key
+
+    def contains_rows(self, rows: numpy.ndarray) -> numpy.ndarray:
+        """
+        Returns a boolean mask of which rows of a (count, length) uint8
+        matrix of letters are words, with one binary search for all of them.
+        """
+        count, length = rows.shape
+        if not 0 < length <= MAX_WORD_LEN or self.offsets[length] == self.offsets[length + 1]:
+            return numpy.zeros(count, dtype=bool)
+        keys = self.words[self.offsets[length]:self.offsets[length + 1]].view(f"S{MAX_WORD_LEN}")[:, 0]
+        padded = numpy.zeros((count, MAX_WORD_LEN), dtype=numpy.uint8)
+        padded[:, :length] = rows
+        queries = padded.view(f"S{MAX_WORD_LEN}")[:, 0]
+        idx = numpy.minimum(numpy.searchsorted(keys, queries), len(keys) - 1)
+        return keys[idx] == queries
+
+    def all_words(self) -> list[str]:
+        words = []
+        for length in range(1, MAX_WORD_LEN + 1):
+            words.extend(row.tobytes().decode("ascii") for row in self.bucket(length))
+        return words
@@ -0,0 +1,103 @@
+#include "CApi.h"
+#include "Protocol.h"
+
+#include <cstring>
+#include <ostream>
+#include <stdexcept>
+
+struct SuggesterHandle
+{
+    Library library;
+    Session session;
+};
+
+// Writes into a caller's buffer, and counts whatever does not fit
+class BufferWriter : public std::streambuf
+{
+public:
+    BufferWriter(char* buffer, int64_t size)
+        : buffer(buffer), size(size)
+    {}
+
+    int64_t length() const
+    {
+        return written;
+    }
+
+protected:
+    std::streamsize xsputn(const char* s, std::streamsize n) override
+    {
+        if (written < size)
+        {
+            memcpy(buffer + written, s, std::min<int64_t>(n, size - written));
+        }
+        written += n;
+        return n;
+    }
+
+    int_type overflow(int_type c) override
+    {
+        if (c != traits_type::eof())
+        {
+            char ch = c;
+            xsputn(&ch, 1);
+        }
+        return c;
+    }
+
+private:
+    char* buffer;
+    int64_t size;
+    int64_t written = 0;
+};
+
+SuggesterHandle* suggester_create(const char* const* dicts, int count)
+{
+    SuggesterHandle* handle = new SuggesterHandle;
+    try
+    {
+        for (int i = 0; i < count; i++)
+        {
+            std::string name, path;
+            splitDictArg(dicts[i], name, path);
+            handle->library.load(name, path);
+        }
+    }
+    catch (const std::runtime_error&)
+    {
+        delete handle;
+        return nullptr;
+    }
+    handle->library.startWatching();
+    return handle;
+}
+
+int64_t suggester_word_count(const SuggesterHandle* handle)
+{
+    return handle->library.get()->size();
+}
+
+int64_t suggester_query(SuggesterHandle* handle, const char* request, char* buffer, int64_t size)
+{
+    BufferWriter writer(buffer, size);
+    std::ostream out(&writer);
+    // No exception may cross into the caller, which is not C++
+    try
+    {
+        if (!handleRequest(handle->library, handle->session, request, out))
+        {
+            return -1;
+        }
+    }
+    catch (const std::exception& e)
+    {
+        out << "# Error: " << e.what() << '\n';
+    }
+    out.flush();
+    return writer.length();
+}
+
+void suggester_free(SuggesterHandle* handle)
+{
+    delete handle;
+}
@@ -0,0 +1,46 @@
+#ifndef CAPI_H
+#define CAPI_H
+
+#include <stdint.h>
+
+// C interface to the word suggester, for loading it as a shared library
+// (see `make lib`) from other languages. Several threads may query one
+// handle at once, with a buffer each, except with "!S", which changes the
+// stack used by every thread.
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#if defined(_WIN32)
+#define SUGGESTER_API __declspec(dllexport)
+#else
+#define SUGGESTER_API __attribute__((visibility("default")))
+#endif
+
+typedef struct SuggesterHandle SuggesterHandle;
+
+// @param dicts 'count' dictionary files, each a path or "name=path", as
+//        on the suggester's command line. They are reloaded in the
+//        background when they change on disk.
+// @return A new handle, or NULL if a dictionary could not be read.
+SUGGESTER_API SuggesterHandle* suggester_create(const char* const* dicts, int count);
+
+// @return The number of distinct words loaded.
+SUGGESTER_API int64_t suggester_word_count(const SuggesterHandle* handle);
+
+// Answers one request of the suggester's line protocol, such as "C*T" or
+// "!F 1 +american C*T", writing the lines of the answer to 'buffer'
+// without the "---" terminator.
+// @return The length of the whole answer, which was only written in full
+//         if it is at most 'size'; otherwise call again with a buffer at
+//         least that large. Returns -1 for "!Q".
+SUGGESTER_API int64_t suggester_query(SuggesterHandle* handle, const char* request, char* buffer, int64_t size);
+
+SUGGESTER_API void suggester_free(SuggesterHandle* handle);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif
@@ -0,0 +1,210 @@
+#include "Library.h"
+
+#include <algorithm>
+#include <fstream>
+#include <iostream>
+#include <stdexcept>
+
+static std::vector<std::string> readWords(const std::string& filepath)
+{
+    std::ifstream is(filepath);
+    if (!is)
+    {
+        throw std::runtime_error("Couldn't open input file at " + filepath);
+    }
+
+    std::vector<std::string> list;
+    std::string word;
+    while (getline(is, word))
+    {
+        // Handles CRLF line endings
+        if (!word.empty() && word.back() == '\r')
+        {
+            word.pop_back();
+        }
+        list.push_back(word);
+    }
+
+    return list;
+}
+
+static std::filesystem::file_time_type modifiedTime(const std::string& path)
+{
+    std::error_code err;
+    auto mtime = std::filesystem::last_write_time(path, err);
+    return err ? std::filesystem::file_time_type::min() : mtime;
+}
+
+Library::Library(std::chrono::milliseconds pollPeriod)
+    : pollPeriod(pollPeriod), current(std::make_shared<Suggester>(std::vector<Suggester::Dictionary>{}))
+{}
+
+Library::~Library()
+{
+    stopWatching();
+}
+
+size_t Library::load(const std::string& name, const std::string& path)
+{
+    Entry entry{name, path, modifiedTime(path)};
+    std::vector<std::string> words = readWords(path);
+    size_t count = words.size();
+
+    std::lock_guard<std::mutex> lock(entriesMutex);
+    bool replaced = false;
+    for (Entry& old : entries)
+    {
+        if (old.name == name)
+        {
+            old = std::move(entry);
+            replaced = true;
+            break;
+        }
+    }
+    if (!replaced)
+    {
+        if (entries.size() == Suggester::MAX_DICTS)
+        {
+            throw std::runtime_error("Too many dictionaries loaded");
+        }
+        entries.push_back(std::move(entry));
+    }
+    rebuild({{name, std::move(words)}});
+    return count;
+}
+
+bool Library::unload(const std::string& name)
+{
+    std::lock_guard<std::mutex> lock(entriesMutex);
+    for (auto it = entries.begin(); it != entries.end(); it++)
+    {
+        if (it->name == name)
+        {
+            entries.erase(it);
+            rebuild();
+            return true;
+        }
+    }
+    return false;
+}
+
+std::vector<std::string> Library::names() const
+{
+    std::lock_guard<std::mutex> lock(entriesMutex);
+    std::vector<std::string> result;
+    for (const Entry& entry : entries)
+    {
+        result.push_back(entry.name);
+    }
+    return result;
+}
+
+std::shared_ptr<const Suggester> Library::get() const
+{
+    std::lock_guard<std::mutex> lock(currentMutex);
+    return current;
+}
+
+void Library::rebuild(std::vector<Suggester::Dictionary> fresh)
+{
+    std::shared_ptr<const Suggester> old = get();
+    std::vector<Suggester::Dictionary> dicts;
+    for (const Entry& entry : entries)
+    {
+        auto it = std::find_if(fresh.begin(), fresh.end(),
+                               [&](const Suggester::Dictionary& dict) { return dict.name == entry.name; });
+        if (it != fresh.end())
+        {
+            dicts.push_back(std::move(*it));
+        }
+        else
+        {
+            dicts.push_back({entry.name, old->dictWords(entry.name)});
+        }
+    }
+    auto sug = std::make_shared<const Suggester>(dicts);
+
+    std::lock_guard<std::mutex> lock(currentMutex);
+    current = std::move(sug);
+}
+
+void Library::startWatching()
+{
+    if (!watcher.joinable())
+    {
+        stopping = false;
+        watcher = std::thread(&Library::watchMain, this);
+    }
+}
+
+void Library::stopWatching()
+{
+    if (watcher.joinable())
+    {
+        {
+            std::lock_guard<std::mutex> lock(stopMutex);
+            stopping = true;
+        }
+        stopCond.notify_all();
+        watcher.join();
+    }
+}
+
+void Library::watchMain()
+{
+    std::unique_lock<std::mutex> stopLock(stopMutex);
+    while (!stopCond.wait_for(stopLock, pollPeriod, [this] { return stopping; }))
+    {
+        std::lock_guard<std::mutex> lock(entriesMutex);
+        std::vector<Suggester::Dictionary> fresh;
+        for (Entry& entry : entries)
+        {
+            auto mtime = modifiedTime(entry.path);
+            if (mtime == entry.mtime)
+            {
+                continue;
+            }
+
+            // Keep the words already indexed if the file is unreadable,
+            // e.g. while it is being replaced or after it was deleted, and
+            // try again once it changes
+            entry.mtime = mtime;
+            try
+            {
+                fresh.push_back({entry.name, readWords(entry.path)});
+                std::cerr << "Reloaded dictionary " << entry.name << " from " << entry.path << '\n';
+            }
+            catch (const std::runtime_error& e)
+            {
+                std::cerr << e.what() << " -- keeping the words of " << entry.name << '\n';
+            }
+        }
+        if (!fresh.empty())
+        {
+            rebuild(std::move(fresh));
+        }
+    }
+}
+
+bool Library::resolveStack(const Suggester& sug, const std::vector<std::string>& stack,
+                           Suggester::DictMask& include, Suggester::DictMask& exclude,
+                           std::string& error)
+{
+    include = 0;
+    exclude = 0;
+    for (const std::string& item : stack)
+    {
+        Suggester::DictMask mask = (item.size() > 1) ? sug.dictMask(item.substr(1)) : 0;
+        if (!mask || (item[0] != '+' && item[0] != '-'))
+        {
+            error = item;
+            return false;
+        }
+        (item[0] == '+' ? include : exclude) |= mask;
+    }
+    if (!include)
+    {
+        include = Suggester::ALL_DICTS;
+    }
+    return true;
+}
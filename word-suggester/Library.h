@@ -0,0 +1,89 @@
+#ifndef LIBRARY_H
+#define LIBRARY_H
+
+#include "Suggester.h"
+
+#include <string>
+#include <vector>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <chrono>
+#include <condition_variable>
+#include <filesystem>
+
+// A set of named dictionary files, indexed together by a single Suggester.
+// Dictionaries can be loaded and unloaded at runtime, and a background
+// thread reloads any dictionary whose file changes on disk. Every change
+// builds a new Suggester and swaps it in; queries keep using the Suggester
+// they started with until they finish, so no query is ever interrupted.
+class Library
+{
+public:
+    // @param pollPeriod how often the watcher checks files for changes.
+    Library(std::chrono::milliseconds pollPeriod = std::chrono::seconds(1));
+    ~Library();
+
+    // Reads the word list at 'path' and makes it available as 'name',
+    // replacing any dictionary with that name.
+    // @return The number of lines read. Throws std::runtime_error if the
+    //         file cannot be opened.
+    size_t load(const std::string& name, const std::string& path);
+
+    // @return Whether a dictionary called 'name' was loaded.
+    bool unload(const std::string& name);
+
+    // @return The names of the loaded dictionaries, in load order.
+    std::vector<std::string> names() const;
+
+    // @return The current index. Hold on to it for the length of a query.
+    std::shared_ptr<const Suggester> get() const;
+
+    // Starts or stops the background thread reloading changed files.
+    void startWatching();
+    void stopWatching();
+
+    // Resolves a stack such as "+american +house -blocked" into the masks
+    // for Suggester::matchPattern(). Dictionaries prefixed with '+' are
+    // included and those prefixed with '-' excluded; with no '+' entries,
+    // every dictionary is included.
+    // @return false, with the offending entry in 'error', if an entry is
+    //         malformed or names an unknown dictionary.
+    static bool resolveStack(const Suggester& sug, const std::vector<std::string>& stack,
+                             Suggester::DictMask& include, Suggester::DictMask& exclude,
+                             std::string& error);
+
+private:
+    struct Entry
+    {
+        std::string name;
+        std::string path;
+        std::filesystem::file_time_type mtime;
+    };
+
+    // Builds a new Suggester from 'entries' and swaps it in. Word lists are
+    // not kept between rebuilds: those in 'fresh', just read by the caller,
+    // are used as they are, and every other dictionary's words are taken
+    // from the current Suggester, so its file is never read again until it
+    // changes. Must hold 'entriesMutex'.
+    void rebuild(std::vector<Suggester::Dictionary> fresh = {});
+
+    void watchMain();
+
+    std::chrono::milliseconds pollPeriod;
+
+    // Guards 'entries', and serializes rebuilds
+    mutable std::mutex entriesMutex;
+    std::vector<Entry> entries;
+
+    // Guards 'current' only, so readers never wait for a rebuild
+    mutable std::mutex currentMutex;
+    std::shared_ptr<const Suggester> current;
+
+    std::thread watcher;
+    std::mutex stopMutex;
+    std::condition_variable stopCond;
+    bool stopping = false;
+};
+
+#endif
@@ -0,0 +1,240 @@
+#include "Protocol.h"
+
+#include <sstream>
+#include <filesystem>
+#include <stdexcept>
+
+static const bool enforceLength = true;
+
+void splitDictArg(const std::string& arg, std::string& name, std::string& path)
+{
+    size_t eq = arg.find('=');
+    if (eq != arg.npos)
+    {
+        name = arg.substr(0, eq);
+        path = arg.substr(eq + 1);
+    }
+    else
+    {
+        name = std::filesystem::path(arg).stem().string();
+        path = arg;
+    }
+}
+
+static void printDisplayForm(const char* word, std::ostream& out)
+{
+    const char* display = Suggester::displayForm(word);
+    if (display)
+    {
+        out << '\t' << display;
+    }
+}
+
+static std::vector<std::string> splitWords(const std::string& line)
+{
+    std::istringstream is(line);
+    std::vector<std::string> words;
+    std::string word;
+    while (is >> word)
+    {
+        words.push_back(word);
+    }
+    return words;
+}
+
+static bool isStackEntry(const std::string& arg)
+{
+    return arg[0] == '+' || arg[0] == '-';
+}
+
+// Parses a length range such as "6-9", "6-", "-9" or "7".
+// @return false if 'arg' is not one.
+static bool parseLengthRange(const std::string& arg, int& minLen, int& maxLen)
+{
+    size_t dash = arg.find('-');
+    std::string low = arg.substr(0, dash);
+    std::string high = (dash == arg.npos) ? low : arg.substr(dash + 1);
+    for (const std::string* part : {&low, &high})
+    {
+        if (part->size() > 2 || part->find_first_not_of("0123456789") != part->npos)
+        {
+            return false;
+        }
+    }
+    minLen = low.empty() ? 1 : std::stoi(low);
+    maxLen = high.empty() ? Suggester::MAX_WORD_LEN : std::stoi(high);
+    return true;
+}
+
+static void runCommand(Library& library, const std::vector<std::string>& args,
+                       std::vector<std::string>& defaultStack, std::ostream& out)
+{
+    const std::string& cmd = args[0];
+    if (cmd == "!L" && args.size() == 3)
+    {
+        try
+        {
+            size_t count = library.load(args[1], args[2]);
+            out << "# Loaded " << args[1] << " with " << count << " words\n";
+        }
+        catch (const std::runtime_error& e)
+        {
+            out << "# Error: " << e.what() << '\n';
+        }
+    }
+    else if (cmd == "!U" && args.size() == 2)
+    {
+        try
+        {
+            if (library.unload(args[1]))
+                out << "# Unloaded " << args[1] << '\n';
+            else
+                out << "# Error: Unknown dictionary " << args[1] << '\n';
+        }
+        catch (const std::runtime_error& e)
+        {
+            out << "# Error: " << e.what() << '\n';
+        }
+    }
+    else if (cmd == "!S")
+    {
+        std::vector<std::string> stack(args.begin() + 1, args.end());
+        Suggester::DictMask include, exclude;
+        std::string error;
+        if (Library::resolveStack(*library.get(), stack, include, exclude, error))
+            defaultStack = stack;
+        else
+            out << "# Error: Unknown dictionary " << error << '\n';
+    }
+    else if (cmd == "!F" && args.size() >= 3)
+    {
+        std::shared_ptr<const Suggester> sug = library.get();
+        std::vector<std::string> stack(args.begin() + 2, args.end() - 1);
+        if (stack.empty())
+        {
+            stack = defaultStack;
+        }
+
+        Suggester::DictMask include, exclude;
+        std::string error;
+        if (args[1].find_first_not_of("0123456789") != args[1].npos || args[1].size() > 2)
+        {
+            out << "# Error: Invalid mismatch count " << args[1] << '\n';
+        }
+        else if (Library::resolveStack(*sug, stack, include, exclude, error))
+        {
+            for (const auto& miss : sug->matchFuzzy(args.back(), std::stoi(args[1]), include, exclude))
+            {
+                out << miss.text;
+                for (int pos : miss.mismatches)
+                {
+                    out << ' ' << pos;
+                }
+                printDisplayForm(miss.text, out);
+                out << '\n';
+            }
+        }
+        else
+        {
+            out << "# Error: Unknown dictionary " << error << '\n';
+        }
+    }
+    else if (cmd == "!R")
+    {
+        std::shared_ptr<const Suggester> sug = library.get();
+        std::vector<std::string> stack;
+        std::string prefix, suffix;
+        int minLen = 1, maxLen = Suggester::MAX_WORD_LEN;
+        for (size_t i = 1; i < args.size(); i++)
+        {
+            const std::string& arg = args[i];
+            if (isStackEntry(arg))
+                stack.push_back(arg);
+            else if (arg.rfind("prefix=", 0) == 0)
+                prefix = arg.substr(7);
+            else if (arg.rfind("suffix=", 0) == 0)
+                suffix = arg.substr(7);
+            else if (arg.rfind("len=", 0) != 0 || !parseLengthRange(arg.substr(4), minLen, maxLen))
+            {
+                out << "# Error: Invalid option " << arg << '\n';
+                return;
+            }
+        }
+        if (stack.empty())
+        {
+            stack = defaultStack;
+        }
+
+        Suggester::DictMask include, exclude;
+        std::string error;
+        if (Library::resolveStack(*sug, stack, include, exclude, error))
+        {
+            for (auto word : sug->matchAffixes(prefix, suffix, minLen, maxLen, include, exclude))
+            {
+                out << word;
+                printDisplayForm(word, out);
+                out << '\n';
+            }
+        }
+        else
+        {
+            out << "# Error: Unknown dictionary " << error << '\n';
+        }
+    }
+    else if (cmd == "!D")
+    {
+        for (const std::string& name : library.names())
+        {
+            out << name << '\n';
+        }
+    }
+    else
+    {
+        out << "# Error: Unknown command " << cmd << '\n';
+    }
+}
+
+bool handleRequest(Library& library, Session& session, const std::string& line, std::ostream& out)
+{
+    std::vector<std::string> args = splitWords(line);
+    if (args.empty())
+    {
+    }
+    else if (args[0] == "!Q")
+    {
+        return false;
+    }
+    else if (args[0][0] == '!')
+    {
+        runCommand(library, args, session.defaultStack, out);
+    }
+    else
+    {
+        // Keep this index alive for the whole query, even if a reload
+        // swaps in a new one meanwhile
+        std::shared_ptr<const Suggester> sug = library.get();
+        std::vector<std::string> stack(args.begin(), args.end() - 1);
+        if (stack.empty())
+        {
+            stack = session.defaultStack;
+        }
+
+        Suggester::DictMask include, exclude;
+        std::string error;
+        if (Library::resolveStack(*sug, stack, include, exclude, error))
+        {
+            std::vector<const char*> result = sug->matchPattern(args.back(), enforceLength, include, exclude);
+            for (auto word : result)
+            {
+                out << word;
+                printDisplayForm(word, out);
+                out << '\n';
+            }
+        }
+        else
+        {
+            out << "# Error: Unknown dictionary " << error << '\n';
+        }
+    }
+    return true;
+}
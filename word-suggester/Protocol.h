@@ -0,0 +1,49 @@
+#ifndef PROTOCOL_H
+#define PROTOCOL_H
+
+#include "Library.h"
+
+#include <string>
+#include <vector>
+#include <ostream>
+
+// The line protocol spoken by the suggester program and its library.
+//
+// A request is an optional stack of dictionaries followed by a pattern,
+// e.g. "+american -blocked C*T", and is answered with the matching words,
+// one per line. Words that are phrases in the dictionary, such as
+// "cat's-paw", are matched by their letters only and followed by a tab and
+// their display form, e.g. "CATSPAW\tCAT'S-PAW". Lines starting with '#'
+// are comments. Commands:
+//   !L name path   loads (or reloads) a dictionary
+//   !U name        unloads a dictionary
+//   !S +a -b ...   sets the stack used by requests that don't give one
+//   !D             lists the loaded dictionaries, one name per line
+//   !F k [+a -b ...] pattern
+//                  lists words differing from the pattern in at most k
+//                  letters, one per line, each followed by the positions
+//                  (from 0) of the letters that differ
+//   !R [+a -b ...] [prefix=UN] [suffix=ING] [len=6-9]
+//                  lists words by prefix, suffix and length, shortest first
+//                  and then alphabetically. The length is a number or an
+//                  inclusive range, either end of which may be left open
+//                  ("6-", "-9"); by default, any length.
+//   !Q             ends the session
+
+// The settings of one client
+struct Session
+{
+    std::vector<std::string> defaultStack;
+};
+
+// @param arg either "name=path", or just a path, in which case the
+//        dictionary is named after the file, e.g. "american" for
+//        "data/american.txt".
+void splitDictArg(const std::string& arg, std::string& name, std::string& path);
+
+// Answers one request, writing the lines of the answer to 'out'. The
+// caller writes the terminating "---" line, if any.
+// @return false if the request ends the session.
+bool handleRequest(Library& library, Session& session, const std::string& line, std::ostream& out);
+
+#endif
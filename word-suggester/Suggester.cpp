@@ -5,6 +5,8 @@
 #include <iostream>
 #include <stdexcept>
 #include <limits>
+#include <cctype>
+#include <numeric>
 
 class WordError : public std::runtime_error
 {
@@ -29,57 +31,252 @@ static void makeUpper(std::string& word, char allow = '\0')
     }
 }
 
-Suggester::Suggester(std::vector<std::string> list)
+// Compares the last 'len' letters of 'a' and 'b', from the end backwards.
+// @return Less than, equal to or greater than 0, like strcmp().
+static int compareBackwards(const char* a, int lenA, const char* b, int lenB, int len)
 {
-    for (std::string word : list)
+    for (int i = 1; i <= len; i++)
     {
-        try
+        if (a[lenA - i] != b[lenB - i])
         {
-            makeUpper(word);
+            return (a[lenA - i] < b[lenB - i]) ? -1 : 1;
         }
-        catch (const WordError& e)
+    }
+    return 0;
+}
+
+// Splits a dictionary entry into the uppercase letters used for matching
+// and the uppercase form to display, e.g. "cat's-paw" into "CATSPAW" and
+// "CAT'S-PAW". A trailing part-of-speech tag such as "(p)" is dropped.
+// @return false if the entry has characters other than letters and the
+//         punctuation found in phrases.
+static bool splitEntry(const std::string& entry, std::string& letters, std::string& display)
+{
+    size_t end = entry.size();
+    if (end && entry[end - 1] == ')')
+    {
+        size_t tag = entry.rfind('(');
+        end = (tag != entry.npos) ? tag : end;
+    }
+    while (end && entry[end - 1] == ' ')
+    {
+        end--;
+    }
+
+    letters.clear();
+    display.clear();
+    for (size_t i = 0; i < end; i++)
+    {
+        unsigned char c = entry[i];
+        if (isalpha(c) && c < 128)
         {
-            std::cerr << e.what() << '\n';
-            continue;
+            letters.push_back(toupper(c));
+            display.push_back(toupper(c));
+        }
+        else if (c == ' ' || c == '\'' || c == '-' || c == '.')
+        {
+            display.push_back(c);
         }
-
-        // Check for duplicates
-        if (wordSet.count(word))
-            continue;
         else
-            wordSet.insert(word);
+        {
+            return false;
+        }
+    }
+    return true;
+}
 
-        // Check word size
-        size_t len = word.size();
-        if (len > MAX_WORD_LEN)
+Suggester::Suggester(std::vector<std::string> list)
+    : Suggester(std::vector<Dictionary>{{"", std::move(list)}})
+{}
+
+Suggester::Suggester(const std::vector<Dictionary>& dicts)
+{
+    if (dicts.size() > MAX_DICTS)
+    {
+        throw std::invalid_argument("Too many dictionaries, at most " + std::to_string(MAX_DICTS) + " are supported");
+    }
+
+    struct Entry
+    {
+        std::string letters;
+        std::string display;
+        DictMask dicts;
+    };
+    std::vector<Entry> entries;
+    for (size_t d = 0; d < dicts.size(); d++)
+    {
+        dictNames.push_back(dicts[d].name);
+        for (const std::string& word : dicts[d].words)
         {
-            std::cerr << "Word is too long, will be ignored: " << word << '\n';
+            Entry entry{{}, {}, DictMask(1) << d};
+            if (!splitEntry(word, entry.letters, entry.display) || entry.letters.size() > MAX_WORD_LEN)
+            {
+                if (!skipped++)
+                {
+                    skippedExample = word;
+                }
+            }
+            else if (!entry.letters.empty())
+            {
+                entries.push_back(std::move(entry));
+            }
+        }
+    }
+
+    // Sort by length and then alphabetically, keeping the first display
+    // form of a duplicated word
+    std::stable_sort(entries.begin(), entries.end(), [](const Entry& a, const Entry& b)
+    {
+        if (a.letters.size() != b.letters.size())
+            return a.letters.size() < b.letters.size();
+        return a.letters < b.letters;
+    });
+
+    for (Entry& entry : entries)
+    {
+        // A duplicate only needs to learn which dictionaries it is also in
+        if (!wordVec.empty() && entry.letters == wordVec.back().text)
+        {
+            wordVec.back().dicts |= entry.dicts;
             continue;
         }
 
-        // Add word to 'wordVec'
-        size_t idx = wordVec.size();
-        wordVec.resize(idx + 1);
-        wordVec.back().len = len;
-        strcpy(wordVec.back().text, word.c_str());
+        wordVec.emplace_back();
+        Word& word = wordVec.back();
+        word.len = entry.letters.size();
+        word.dicts = entry.dicts;
+        word.display = nullptr;
+        strcpy(word.text, entry.letters.c_str());
+        if (entry.display != entry.letters)
+        {
+            displayForms.push_back(std::move(entry.display));
+            word.display = displayForms.back().c_str();
+        }
+    }
+    wordVec.shrink_to_fit();
+    entries.clear();
+
+    buildIndex();
+
+    if (skipped)
+    {
+        std::cerr << "Skipped " << skipped << " entries that are too long or have unsupported characters, such as '"
+                  << skippedExample << "'\n";
+    }
+}
+
+void Suggester::buildIndex()
+{
+    // Words are sorted by length, so each length is a contiguous range
+    std::fill(std::begin(lengthStart), std::end(lengthStart), 0);
+    for (const Word& word : wordVec)
+    {
+        lengthStart[word.len + 1]++;
+    }
+    for (int len = 1; len <= WORD_ALLOC_SIZE; len++)
+    {
+        lengthStart[len] += lengthStart[len - 1];
+    }
+
+    // Suffix order: each length's words sorted by their reversed text
+    suffixOrder.resize(wordVec.size());
+    std::iota(suffixOrder.begin(), suffixOrder.end(), 0);
+    for (int len = 1; len <= MAX_WORD_LEN; len++)
+    {
+        std::sort(suffixOrder.begin() + lengthStart[len], suffixOrder.begin() + lengthStart[len + 1],
+                  [this, len](uint32_t a, uint32_t b)
+                  {
+                      return compareBackwards(wordVec[a].text, len, wordVec[b].text, len, len) < 0;
+                  });
+    }
 
-        // Index word in all relevant sets
-        for (size_t i = 0; i < len; i++)
+    // Posting lists, by counting sort. Words are visited in index order, so
+    // every list comes out sorted.
+    postingStart.assign(postingKey(WORD_ALLOC_SIZE, 0, 'A') + 1, 0);
+    for (const Word& word : wordVec)
+    {
+        for (int pos = 0; pos < word.len; pos++)
+        {
+            postingStart[postingKey(word.len, pos, word.text[pos]) + 1]++;
+        }
+    }
+    for (size_t key = 1; key < postingStart.size(); key++)
+    {
+        postingStart[key] += postingStart[key - 1];
+    }
+    postings.resize(postingStart.back());
+    std::vector<uint32_t> fill(postingStart.begin(), postingStart.end() - 1);
+    for (uint32_t idx = 0; idx < wordVec.size(); idx++)
+    {
+        const Word& word = wordVec[idx];
+        for (int pos = 0; pos < word.len; pos++)
         {
-            char letter = word[i];
-            auto& lvec = indices[letter - 'A'];
-            if (lvec.size() < i + 1)
+            postings[fill[postingKey(word.len, pos, word.text[pos])]++] = idx;
+        }
+    }
+
+    // The same sets as bitmaps, for dense posting lists and fuzzy matching
+    for (int len = 1; len <= MAX_WORD_LEN; len++)
+    {
+        size_t count = lengthStart[len + 1] - lengthStart[len];
+        size_t blocks = (count + 63) / 64;
+        std::vector<uint64_t>& bits = letterBits[len];
+        bits.assign(26 * len * blocks, 0);
+        for (size_t i = 0; i < count; i++)
+        {
+            const char* text = wordVec[lengthStart[len] + i].text;
+            for (int pos = 0; pos < len; pos++)
             {
-                lvec.resize(i + 1);
+                bits[(pos * 26 + text[pos] - 'A') * blocks + i / 64] |= uint64_t(1) << (i % 64);
             }
-            lvec[i].insert(idx);
         }
     }
+}
 
-    std::cout << "# Initialized word suggester with " << wordVec.size() << " words!" << std::endl;
+Suggester::DictMask Suggester::dictMask(const std::string& name) const
+{
+    for (size_t d = 0; d < dictNames.size(); d++)
+    {
+        if (dictNames[d] == name)
+        {
+            return DictMask(1) << d;
+        }
+    }
+    return 0;
+}
+
+size_t Suggester::size() const
+{
+    return wordVec.size();
 }
 
-std::vector<const char*> Suggester::matchPattern(std::string pattern, bool enforceLength) const
+std::vector<std::string> Suggester::dictWords(const std::string& name) const
+{
+    std::vector<std::string> words;
+    DictMask mask = dictMask(name);
+    if (!mask)
+    {
+        return words;
+    }
+    for (const Word& word : wordVec)
+    {
+        if (word.dicts & mask)
+        {
+            words.push_back(word.display ? word.display : word.text);
+        }
+    }
+    return words;
+}
+
+const char* Suggester::displayForm(const char* text)
+{
+    // Words are standard-layout with 'text' first, so a pointer to the text
+    // is also a pointer to its Word
+    return reinterpret_cast<const Word*>(text)->display;
+}
+
+std::vector<const char*> Suggester::matchPattern(std::string pattern, bool enforceLength,
+                                                 DictMask include, DictMask exclude) const
 {
     try
     {
@@ -92,73 +289,346 @@ std::vector<const char*> Suggester::matchPattern(std::string pattern, bool enfor
     }
     
     int len = pattern.size();
+    int maxLen = (enforceLength) ? len : MAX_WORD_LEN;
 
     // If just a string of asterisks, use matchLength() instead
-    size_t idx_letter = pattern.find_first_not_of('*');
-    if (idx_letter == pattern.npos)
+    if (pattern.find_first_not_of('*') == pattern.npos)
     {
-        return matchLength(len, (enforceLength) ? len : std::numeric_limits<int>::max());
+        return matchLength(len, maxLen, include, exclude);
     }
 
-    // Initialize search set
-    char letter = pattern[idx_letter];
-    std::set<uint32_t> set;
-    std::vector<uint32_t> intersection;
-    if (idx_letter < indices[letter - 'A'].size())
+    std::vector<const char*> result;
+    std::vector<uint32_t> candidates;
+    for (int wordLen = len; wordLen <= maxLen; wordLen++)
     {
-        for (uint32_t idx : indices[letter - 'A'][idx_letter])
+        matchInLength(pattern, wordLen, candidates);
+        for (uint32_t idx : candidates)
         {
-            if (wordVec[idx].len == len || (!enforceLength && wordVec[idx].len > len))
+            if (isSelected(wordVec[idx], include, exclude))
             {
-                set.insert(idx);
+                result.push_back(wordVec[idx].text);
             }
         }
     }
-    idx_letter = pattern.find_first_not_of('*', idx_letter + 1);
+    return result;
+}
 
-    // Main search loop
-    while (idx_letter != pattern.npos && set.size())
+// @return The first element of the sorted range [first, last) that is not
+//         less than 'value', searching forward from 'first' in steps that
+//         double, so that nearby elements are found in few comparisons.
+static const uint32_t* gallop(const uint32_t* first, const uint32_t* last, uint32_t value)
+{
+    size_t step = 1;
+    const uint32_t* lo = first;
+    while (first + step < last && first[step] < value)
     {
-        letter = pattern[idx_letter];
-        if (idx_letter < indices[letter - 'A'].size())
+        lo = first + step;
+        step *= 2;
+    }
+    return std::lower_bound(lo, std::min(first + step + 1, last), value);
+}
+
+void Suggester::matchInLength(const std::string& pattern, int len, std::vector<uint32_t>& candidates) const
+{
+    candidates.clear();
+    if (len > MAX_WORD_LEN)
+    {
+        return;
+    }
+
+    // Plan the query: visit the pattern's letters from the one with the
+    // fewest words to the one with the most
+    struct Term
+    {
+        int pos;
+        const uint32_t* begin;
+        const uint32_t* end;
+    };
+    Term terms[MAX_WORD_LEN];
+    int numTerms = 0;
+    for (int pos = 0; pos < int(pattern.size()); pos++)
+    {
+        if (pattern[pos] != '*')
         {
-            // Compute set intersection
-            const std::set<uint32_t>* reqSet = &indices[letter - 'A'][idx_letter];
-            intersection.clear();
-            std::set_intersection(set.begin(), set.end(),
-                                  reqSet->begin(), reqSet->end(),
-                                  std::back_inserter(intersection));
-            set = std::set<uint32_t>(intersection.begin(), intersection.end());
+            size_t key = postingKey(len, pos, pattern[pos]);
+            terms[numTerms++] = {pos, &postings[0] + postingStart[key], &postings[0] + postingStart[key + 1]};
+        }
+    }
+    if (numTerms == 0)
+    {
+        return;
+    }
+    std::sort(terms, terms + numTerms, [](const Term& a, const Term& b)
+    {
+        return a.end - a.begin < b.end - b.begin;
+    });
 
-            // Update the next letter for the next iteration
-            idx_letter = pattern.find_first_not_of('*', idx_letter + 1);
+    candidates.assign(terms[0].begin, terms[0].end);
+    uint32_t first = lengthStart[len];
+    size_t count = lengthStart[len + 1] - first;
+    size_t blocks = (count + 63) / 64;
+    for (int t = 1; t < numTerms && !candidates.empty(); t++)
+    {
+        const Term& term = terms[t];
+        size_t kept = 0;
+        if (size_t(term.end - term.begin) * DENSE_RATIO >= count)
+        {
+            // Dense list: test each candidate's bit
+            const uint64_t* bits = &letterBits[len][(term.pos * 26 + pattern[term.pos] - 'A') * blocks];
+            for (uint32_t idx : candidates)
+            {
+                uint32_t i = idx - first;
+                if ((bits[i / 64] >> (i % 64)) & 1)
+                {
+                    candidates[kept++] = idx;
+                }
+            }
         }
         else
         {
-            set.clear();
+            // Sparse list: gallop through it, since it is longer than the
+            // candidates but both are sorted
+            const uint32_t* it = term.begin;
+            for (uint32_t idx : candidates)
+            {
+                it = gallop(it, term.end, idx);
+                if (it == term.end)
+                {
+                    break;
+                }
+                if (*it == idx)
+                {
+                    candidates[kept++] = idx;
+                }
+            }
         }
+        candidates.resize(kept);
     }
-    
-    // Create result vector
+}
+
+std::vector<const char*> Suggester::matchLength(int minLen, int maxLen,
+                                                DictMask include, DictMask exclude) const
+{
     std::vector<const char*> result;
-    for (uint32_t idx : set)
+
+    minLen = std::max(minLen, 0);
+    maxLen = std::min(maxLen, MAX_WORD_LEN);
+    if (minLen > maxLen)
     {
-        result.push_back(wordVec[idx].text);
+        return result;
     }
+    for (uint32_t idx = lengthStart[minLen]; idx < lengthStart[maxLen + 1]; idx++)
+    {
+        if (isSelected(wordVec[idx], include, exclude))
+        {
+            result.push_back(wordVec[idx].text);
+        }
+    }
+
     return result;
 }
 
-std::vector<const char*> Suggester::matchLength(int minLen, int maxLen) const
+std::pair<uint32_t, uint32_t> Suggester::prefixRange(const std::string& prefix, int len) const
 {
+    // Each length's words are in alphabetical order
+    auto first = wordVec.begin() + lengthStart[len];
+    auto last = wordVec.begin() + lengthStart[len + 1];
+    first = std::partition_point(first, last, [&](const Word& word)
+    {
+        return strncmp(word.text, prefix.c_str(), prefix.size()) < 0;
+    });
+    last = std::partition_point(first, last, [&](const Word& word)
+    {
+        return strncmp(word.text, prefix.c_str(), prefix.size()) == 0;
+    });
+    return {uint32_t(first - wordVec.begin()), uint32_t(last - wordVec.begin())};
+}
+
+std::pair<uint32_t, uint32_t> Suggester::suffixRange(const std::string& suffix, int len) const
+{
+    int suffixLen = suffix.size();
+    auto first = suffixOrder.begin() + lengthStart[len];
+    auto last = suffixOrder.begin() + lengthStart[len + 1];
+    first = std::partition_point(first, last, [&](uint32_t idx)
+    {
+        return compareBackwards(wordVec[idx].text, len, suffix.c_str(), suffixLen, suffixLen) < 0;
+    });
+    last = std::partition_point(first, last, [&](uint32_t idx)
+    {
+        return compareBackwards(wordVec[idx].text, len, suffix.c_str(), suffixLen, suffixLen) == 0;
+    });
+    return {uint32_t(first - suffixOrder.begin()), uint32_t(last - suffixOrder.begin())};
+}
+
+std::vector<const char*> Suggester::matchAffixes(std::string prefix, std::string suffix, int minLen, int maxLen,
+                                                 DictMask include, DictMask exclude) const
+{
+    try
+    {
+        makeUpper(prefix);
+        makeUpper(suffix);
+    }
+    catch (const WordError& e)
+    {
+        std::cerr << e.what() << '\n';
+        return {};
+    }
+
     std::vector<const char*> result;
+    std::vector<uint32_t> candidates;
+    minLen = std::max({minLen, 1, int(prefix.size()), int(suffix.size())});
+    maxLen = std::min(maxLen, MAX_WORD_LEN);
+    for (int len = minLen; len <= maxLen; len++)
+    {
+        auto [first, last] = prefixRange(prefix, len);
+        if (suffix.empty())
+        {
+            for (uint32_t idx = first; idx < last; idx++)
+            {
+                if (isSelected(wordVec[idx], include, exclude))
+                {
+                    result.push_back(wordVec[idx].text);
+                }
+            }
+            continue;
+        }
 
-    for (const Word& word : wordVec)
+        // Check the other affix on whichever range is smaller
+        auto [suffixFirst, suffixLast] = suffixRange(suffix, len);
+        candidates.clear();
+        if (suffixLast - suffixFirst < last - first)
+        {
+            for (uint32_t i = suffixFirst; i < suffixLast; i++)
+            {
+                if (suffixOrder[i] >= first && suffixOrder[i] < last)
+                {
+                    candidates.push_back(suffixOrder[i]);
+                }
+            }
+            std::sort(candidates.begin(), candidates.end());
+        }
+        else
+        {
+            for (uint32_t idx = first; idx < last; idx++)
+            {
+                if (compareBackwards(wordVec[idx].text, len, suffix.c_str(), suffix.size(), suffix.size()) == 0)
+                {
+                    candidates.push_back(idx);
+                }
+            }
+        }
+        for (uint32_t idx : candidates)
+        {
+            if (isSelected(wordVec[idx], include, exclude))
+            {
+                result.push_back(wordVec[idx].text);
+            }
+        }
+    }
+    return result;
+}
+
+std::vector<Suggester::NearMiss> Suggester::matchFuzzy(std::string pattern, int maxMismatches,
+                                                       DictMask include, DictMask exclude) const
+{
+    try
+    {
+        makeUpper(pattern, '*');
+    }
+    catch (const WordError& e)
+    {
+        std::cerr << e.what() << '\n';
+        return {};
+    }
+
+    int len = pattern.size();
+    if (len == 0 || len > MAX_WORD_LEN)
+    {
+        return {};
+    }
+
+    std::vector<int> fixed;
+    for (int pos = 0; pos < len; pos++)
     {
-        if (word.len >= minLen && word.len <= maxLen)
+        if (pattern[pos] != '*')
         {
-            result.push_back(word.text);
+            fixed.push_back(pos);
         }
     }
+    int minMatches = std::max(0, int(fixed.size()) - std::max(0, maxMismatches));
 
+    uint32_t first = lengthStart[len];
+    size_t count = lengthStart[len + 1] - first;
+    const std::vector<uint64_t>& bits = letterBits[len];
+    size_t blocks = (count + 63) / 64;
+
+    std::vector<NearMiss> result;
+    for (size_t b = 0; b < blocks; b++)
+    {
+        // Count the matching letters of 64 words at once, in bit-sliced
+        // counters: bit i of planes[j] is bit j of word i's count. Five
+        // planes are enough for MAX_WORD_LEN letters.
+        uint64_t planes[5] = {};
+        for (int pos : fixed)
+        {
+            uint64_t carry = bits[(pos * 26 + pattern[pos] - 'A') * blocks + b];
+            for (int j = 0; j < 5 && carry; j++)
+            {
+                uint64_t next = planes[j] & carry;
+                planes[j] ^= carry;
+                carry = next;
+            }
+        }
+
+        // Select the words whose count is at least 'minMatches', comparing
+        // the counters from their most significant bit down
+        uint64_t greater = 0;
+        uint64_t equal = ~uint64_t(0);
+        for (int j = 4; j >= 0; j--)
+        {
+            if ((minMatches >> j) & 1)
+            {
+                equal &= planes[j];
+            }
+            else
+            {
+                greater |= equal & planes[j];
+                equal &= ~planes[j];
+            }
+        }
+        uint64_t hits = greater | equal;
+        if (b == blocks - 1 && count % 64)
+        {
+            hits &= (uint64_t(1) << (count % 64)) - 1;
+        }
+
+        while (hits)
+        {
+            int i = __builtin_ctzll(hits);
+            hits &= hits - 1;
+            const Word& word = wordVec[first + b * 64 + i];
+            if (!isSelected(word, include, exclude))
+            {
+                continue;
+            }
+
+            NearMiss miss{word.text, {}};
+            for (int pos : fixed)
+            {
+                if (word.text[pos] != pattern[pos])
+                {
+                    miss.mismatches.push_back(pos);
+                }
+            }
+            result.push_back(std::move(miss));
+        }
+    }
+
+    std::sort(result.begin(), result.end(), [](const NearMiss& a, const NearMiss& b)
+    {
+        if (a.mismatches.size() != b.mismatches.size())
+            return a.mismatches.size() < b.mismatches.size();
+        return strcmp(a.text, b.text) < 0;
+    });
     return result;
 }
@@ -4,14 +4,50 @@
 #include <string>
 #include <vector>
 #include <cstdint>
-#include <unordered_set>
-#include <set>
+#include <deque>
 
 class Suggester
 {
 public:
+    // A set of dictionaries, one bit per dictionary in the order they
+    // were given to the constructor.
+    typedef uint32_t DictMask;
+
+    static constexpr int MAX_DICTS = 32;
+    static constexpr DictMask ALL_DICTS = ~DictMask(0);
+
+    // A single word list, and the name used to select it in queries.
+    struct Dictionary
+    {
+        std::string name;
+        std::vector<std::string> words;
+    };
+
     Suggester(std::vector<std::string> list);
 
+    // @param dicts up to MAX_DICTS word lists. A word appearing in several
+    //        lists is indexed once and remembers which lists it came from.
+    Suggester(const std::vector<Dictionary>& dicts);
+
+    // @return The mask of the dictionary called 'name', or 0 if there is none.
+    DictMask dictMask(const std::string& name) const;
+
+    // @return The number of distinct words across all dictionaries.
+    size_t size() const;
+
+    // @return The entries of the dictionary called 'name' in their display
+    //         form, which index to the same words if given to the
+    //         constructor again, or nothing if there is no such dictionary.
+    std::vector<std::string> dictWords(const std::string& name) const;
+
+    // Entries may be phrases, such as "cat's-paw", which are matched by
+    // their letters only ("CATSPAW").
+    // @param text a word returned by one of the match functions.
+    // @return The entry as it appeared in the dictionary, uppercased and
+    //         without any trailing part-of-speech tag such as "(p)", or
+    //         nullptr if that is just 'text'.
+    static const char* displayForm(const char* text);
+
     // @param pattern a pattern consisting of letters (lowercase & 
     //        uppercase treated equally) and asterisks. Asterisks
     //        will be treated as wildcards.
@@ -19,31 +55,119 @@ public:
     //        returned will all be the exact same length as the
     //        pattern string. When false, they will all be *at least*
     //        as long as the pattern string.
-    // @return All words that match the pattern.
-    std::vector<const char*> matchPattern(std::string pattern, bool enforceLength) const;
+    // @param include only words in at least one of these dictionaries are
+    //        returned.
+    // @param exclude words in any of these dictionaries are never returned,
+    //        even if they are also in an included one.
+    // @return All words that match the pattern, shortest first and then in
+    //         alphabetical order.
+    std::vector<const char*> matchPattern(std::string pattern, bool enforceLength,
+                                          DictMask include = ALL_DICTS, DictMask exclude = 0) const;
 
     // @return All words whose length fall in the inclusive range [minLen, maxLen]
-    std::vector<const char*> matchLength(int minLen, int maxLen) const;
+    std::vector<const char*> matchLength(int minLen, int maxLen,
+                                         DictMask include = ALL_DICTS, DictMask exclude = 0) const;
+
+    // @param prefix letters the words must start with, or "" for any.
+    // @param suffix letters the words must end with, or "" for any.
+    // @return All words whose length falls in the inclusive range
+    //         [minLen, maxLen] and that start with 'prefix' and end with
+    //         'suffix', shortest first and then in alphabetical order.
+    std::vector<const char*> matchAffixes(std::string prefix, std::string suffix, int minLen, int maxLen,
+                                          DictMask include = ALL_DICTS, DictMask exclude = 0) const;
+
+    // A word that matches a pattern except at a few of its letters.
+    struct NearMiss
+    {
+        const char* text;
+        // Positions of the pattern's letters that the word differs in
+        std::vector<int> mismatches;
+    };
+
+    // @param pattern as for matchPattern(). Only words of the same length
+    //        are returned.
+    // @param maxMismatches the most letters of the pattern that a word may
+    //        differ in. Blanks never count as mismatches.
+    // @return Matching words, fewest mismatches first and then in
+    //         alphabetical order. Exact matches come first, with no
+    //         mismatches.
+    std::vector<NearMiss> matchFuzzy(std::string pattern, int maxMismatches,
+                                     DictMask include = ALL_DICTS, DictMask exclude = 0) const;
 
     static constexpr int MAX_WORD_LEN = 31;
     static constexpr int WORD_ALLOC_SIZE = MAX_WORD_LEN + 1;
 
 private:
+    // 'text' must stay the first member, see displayForm()
     struct Word
     {
         char text[WORD_ALLOC_SIZE];
         int len;
+        DictMask dicts;
+        const char* display;
     };
 
-    // For keeping track of duplicates
-    std::unordered_set<std::string> wordSet;
+    void buildIndex();
+
+    // Sets 'candidates' to the indices of the words of length 'len' that
+    // match 'pattern', which must have at least one letter.
+    void matchInLength(const std::string& pattern, int len, std::vector<uint32_t>& candidates) const;
+
+    // @return The range of indices into 'wordVec' of the words of length
+    //         'len' that start with 'prefix'.
+    std::pair<uint32_t, uint32_t> prefixRange(const std::string& prefix, int len) const;
+
+    // @return The range of indices into 'suffixOrder' of the words of
+    //         length 'len' that end with 'suffix', which is no longer.
+    std::pair<uint32_t, uint32_t> suffixRange(const std::string& suffix, int len) const;
+
+    static size_t postingKey(int len, int pos, char letter)
+    {
+        return (size_t(len) * MAX_WORD_LEN + pos) * 26 + (letter - 'A');
+    }
+
+    // Posting lists with at least 1 / DENSE_RATIO of the words of their
+    // length are intersected through their bitmap instead
+    static constexpr size_t DENSE_RATIO = 32;
 
-    // For indexing all words during a 'match' request
+    bool isSelected(const Word& word, DictMask include, DictMask exclude) const
+    {
+        return (word.dicts & include) && !(word.dicts & exclude);
+    }
+
+    std::vector<std::string> dictNames;
+
+    // Display forms of phrase entries. A deque never moves its elements, so
+    // Word::display can point into it.
+    std::deque<std::string> displayForms;
+
+    // Entries that could not be indexed, reported once after loading
+    size_t skipped = 0;
+    std::string skippedExample;
+
+    // All words, sorted by length and then alphabetically. The words of
+    // length L are those from index lengthStart[L] up to lengthStart[L + 1].
     std::vector<Word> wordVec;
+    uint32_t lengthStart[WORD_ALLOC_SIZE + 1];
+
+    // Indices into 'wordVec' sorted by length and then by the word spelled
+    // backwards, so that the words ending in any suffix are a contiguous
+    // range. Partitioned by 'lengthStart' like 'wordVec'.
+    std::vector<uint32_t> suffixOrder;
+
+    // Posting lists, partitioned by word length. The indices of the words of
+    // length L that contain the letter 'LET' at index 'pos' are, in
+    // increasing order, postings[postingStart[k]] up to
+    // postings[postingStart[k + 1]], where k = postingKey(L, pos, LET).
+    std::vector<uint32_t> postings;
+    std::vector<uint32_t> postingStart;
 
-    // indices[LET - 'A'][IDX] refers to the set of indices of Words whose
-    // that contain the letter 'LET' at index 'IDX'.
-    std::vector<std::set<uint32_t>> indices[26];
+    // The same sets as bitmaps, for dense lists and for fuzzy matching, which
+    // counts matching letters 64 words at a time.
+    // letterBits[L][(pos * 26 + LET - 'A') * blocks + b] has bit i set if
+    // word lengthStart[L] + 64 * b + i has the letter 'LET' at index 'pos',
+    // where 'blocks' is the number of 64-word blocks of length L.
+    std::vector<uint64_t> letterBits[WORD_ALLOC_SIZE];
 
 };
 
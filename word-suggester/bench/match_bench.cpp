@@ -0,0 +1,103 @@
+// Micro-benchmark for Suggester::matchPattern() across pattern shapes.
+//
+// Build with `make bench`, then run:
+//     ./word-suggester/match_bench word-suggester/data/american.txt
+#include "../Suggester.h"
+
+#include <chrono>
+#include <fstream>
+#include <iomanip>
+#include <iostream>
+#include <string>
+#include <vector>
+
+static std::vector<std::string> readWords(const std::string& filepath)
+{
+    std::ifstream is(filepath);
+    std::vector<std::string> list;
+    std::string word;
+    while (getline(is, word))
+    {
+        if (!word.empty() && word.back() == '\r')
+        {
+            word.pop_back();
+        }
+        list.push_back(word);
+    }
+    return list;
+}
+
+// @return This process's resident memory in kB, or -1 where unavailable.
+static long residentKB()
+{
+    std::ifstream is("/proc/self/status");
+    std::string line;
+    while (getline(is, line))
+    {
+        if (line.rfind("VmRSS:", 0) == 0)
+        {
+            return std::stol(line.substr(6));
+        }
+    }
+    return -1;
+}
+
+struct Shape
+{
+    const char* name;
+    std::vector<std::string> patterns;
+};
+
+int main(int argc, char** argv)
+{
+    if (argc < 2)
+    {
+        std::cout << "Usage: ./match_bench dictionary.txt [repetitions]" << std::endl;
+        return 0;
+    }
+    int reps = (argc > 2) ? std::stoi(argv[2]) : 200;
+
+    long rssBefore = residentKB();
+    auto timeStart = std::chrono::steady_clock::now();
+    std::vector<std::string> words = readWords(argv[1]);
+    Suggester sug(words);
+    double buildMs = std::chrono::duration<double, std::milli>(std::chrono::steady_clock::now() - timeStart).count();
+    words.clear();
+    words.shrink_to_fit();
+    long rssAfter = residentKB();
+
+    std::cout << "words: " << sug.size() << ", build: " << std::fixed << std::setprecision(1) << buildMs << " ms";
+    if (rssBefore >= 0)
+    {
+        std::cout << ", index resident: " << (rssAfter - rssBefore) << " kB";
+    }
+    std::cout << '\n';
+
+    std::vector<Shape> shapes = {
+        {"one common letter", {"S****", "*A***", "****S", "E******"}},
+        {"one rare letter", {"Q****", "**Z**", "****X", "J******"}},
+        {"common then rare", {"S***Q", "E**Z*", "A****J", "T*****X"}},
+        {"rare then common", {"Q***S", "Z**E*", "J****A", "X*****T"}},
+        {"two common letters", {"*A*E*", "S***S", "**E*E*", "T****E"}},
+        {"most letters fixed", {"CRO**W*RD", "PU**LE", "S*ARE", "AN*WER"}},
+        {"long and sparse", {"*******E***", "C*********N", "**T*****I**S"}},
+        {"all blanks", {"***", "*****", "********"}},
+    };
+
+    for (const Shape& shape : shapes)
+    {
+        size_t results = 0;
+        auto start = std::chrono::steady_clock::now();
+        for (int r = 0; r < reps; r++)
+        {
+            for (const std::string& pattern : shape.patterns)
+            {
+                results += sug.matchPattern(pattern, true).size();
+            }
+        }
+        double us = std::chrono::duration<double, std::micro>(std::chrono::steady_clock::now() - start).count();
+        std::cout << std::setw(20) << shape.name << ": "
+                  << std::setw(9) << std::setprecision(2) << us / (reps * shape.patterns.size()) << " us/query, "
+                  << results / reps << " results\n";
+    }
+}
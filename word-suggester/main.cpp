@@ -1,72 +1,45 @@
-#include "Suggester.h"
+#include "Protocol.h"
 
-#include <vector>
 #include <string>
 #include <iostream>
-#include <fstream>
-
-std::vector<std::string> loadDict(std::string filepath);
-
-bool enforceLength = true;
+#include <stdexcept>
 
 int main(int argc, char** argv)
 {
-    if (argc != 2)
+    if (argc < 2)
     {
-        std::cout << "# Usage: ./suggester dictionary.txt" << std::endl;
+        std::cout << "# Usage: ./suggester dictionary.txt [name=more.txt ...]" << std::endl;
         exit(0);
     }
 
-    Suggester sug(loadDict(argv[1]));
-    std::string input;
-    while (true)
+    Library library;
+    for (int i = 1; i < argc; i++)
     {
-        std::cout << "# Please enter a pattern, or !Q to quit:\n# -> " << std::endl;
-        std::getline(std::cin, input);
-
-        if (input.empty())
+        std::string name, path;
+        splitDictArg(argv[i], name, path);
+        try
         {
-            std::cout << "---" << std::endl;
+            library.load(name, path);
         }
-        else if (input == "!Q")
+        catch (const std::runtime_error& e)
         {
-            break;
-        }
-        else
-        {
-            std::vector<const char*> result = sug.matchPattern(input, enforceLength);
-            for (auto word : result)
-            {
-                std::cout << word << '\n';
-            }
-            std::cout << "---" << std::endl;
+            std::cerr << "Error: " << e.what() << std::endl;
+            exit(1);
         }
     }
-}
+    library.startWatching();
+    std::cout << "# Initialized word suggester with " << library.get()->size() << " words!" << std::endl;
 
-std::vector<std::string> loadDict(std::string filepath)
-{
-    std::ifstream is(filepath);
-    if (!is)
-    {
-        std::cerr << "Error: Couldn't open input file at " << filepath << std::endl;
-        exit(1);
-    }
-
-    std::vector<std::string> list;
-    std::string word;
-    while (getline(is, word))
+    Session session;
+    std::string input;
+    while (true)
     {
-        // Handles CRLF line endings
-        if (word.back() == '\r')
-        {
-            list.push_back(word.substr(0, word.size() - 1));
-        }
-        else
+        std::cout << "# Please enter a pattern, or !Q to quit:\n# -> " << std::endl;
+        if (!std::getline(std::cin, input) || !handleRequest(library, session, input, std::cout))
         {
-            list.push_back(word);
+            break;
         }
+        std::cout << "---" << std::endl;
     }
-
-    return list;
+    library.stopWatching();
 }